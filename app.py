@@ -24,6 +24,7 @@ from frontend.components.layout import render_footer
 from frontend.components.menu import render_sidebar
 from frontend.components.login import check_authentication, logout
 from frontend.config import get_config
+from frontend.supabase_client import prazo_pagina, pagina_atual, SupabaseIndisponivel
 
 # ============================================================
 # 🔇 CONFIGURAÇÃO DE LOGGING (Suprimir mensagens HTTP)
@@ -104,14 +105,23 @@ try:
                 st.warning(f"⚠️ Erro ao carregar página '{row['nm_pagina']}': {str(e)}")
 
 except OSError as e:
-    # ✅ Tratamento específico para [Errno 11] — reseta o client inline
-    import frontend.supabase_client as sc
-    sc._supabase_client = None
+    # ✅ Tratamento específico para [Errno 11] — reseta o client da sessão
+    from frontend.supabase_client import reset_supabase_client
+    reset_supabase_client()
     st.warning("⚠️ Conexão temporariamente indisponível. Recarregue a página.")
 
 except Exception as e:
     st.error(f"❌ Erro ao carregar páginas: {str(e)}")
 
+# Página oculta de diagnóstico das consultas (fora do menu): ?pagina=consultas
+from frontend.pages import admin_consultas
+
+if admin_consultas.pode_acessar(usuario_logado):
+    page_map[admin_consultas.NOME_PAGINA] = admin_consultas.page_admin_consultas
+    if st.query_params.get("pagina") == admin_consultas.PARAMETRO:
+        st.session_state["current_page"] = admin_consultas.NOME_PAGINA
+        del st.query_params["pagina"]
+
 # ============================================================
 # 🎯 RENDERIZA A PÁGINA ATUAL
 # ============================================================
@@ -122,7 +132,11 @@ if has_access(current_page):
     
     if page_function:
         try:
-            page_function()
+            # Retries do Supabase limitados ao prazo da página (sem travar em pane)
+            with prazo_pagina(), pagina_atual(current_page):
+                page_function()
+        except SupabaseIndisponivel:
+            st.warning("⚠️ Banco de dados temporariamente indisponível. Tente novamente em alguns segundos.")
         except Exception as e:
             st.error(f"❌ Erro ao renderizar página: {str(e)}")
             import traceback
@@ -0,0 +1,78 @@
+# ============================================================
+# 🔁 backend/api/workflows.py
+# Fluxos de gravação com vários passos executados como uma única função
+# Postgres (supabase.rpc): uma requisição, tudo ou nada. SQL em
+# scripts/supabase_schema.sql (seção "Fluxos atômicos").
+# ============================================================
+from datetime import date, time
+
+from frontend.supabase_client import supabase_execute, registrar_rpc
+
+
+TABLE_AGENDAMENTOS     = "tab_app_agendamentos"
+TABLE_LOG_AGENDAMENTOS = "tab_app_log_agendamentos"
+TABLE_LOG_ETAPAS       = "tab_app_log_etapas"
+TABLE_MODELO_KITS      = "tab_app_modelo_kits"
+TABLE_MOVS             = "tab_app_farmacia_movimentacoes"
+TABLE_SALDOS           = "tab_app_farmacia_saldos"
+
+RPC_GRAVAR_DISPENSACAO    = "fn_app_gravar_dispensacao"
+RPC_CONFIRMAR_AGENDAMENTO = "fn_app_confirmar_agendamento"
+RPC_EXCLUIR_AGENDAMENTO   = "fn_app_excluir_agendamento"
+
+# Tabelas gravadas por cada função (invalidação de cache em supabase_execute)
+registrar_rpc(RPC_GRAVAR_DISPENSACAO, TABLE_MODELO_KITS, TABLE_MOVS, TABLE_SALDOS)
+registrar_rpc(RPC_CONFIRMAR_AGENDAMENTO, TABLE_AGENDAMENTOS, TABLE_LOG_AGENDAMENTOS)
+registrar_rpc(RPC_EXCLUIR_AGENDAMENTO, TABLE_AGENDAMENTOS, TABLE_LOG_AGENDAMENTOS, TABLE_LOG_ETAPAS)
+
+
+def gravar_dispensacao(supabase, linhas: list[dict], movimentos: list[dict]) -> int:
+    """
+    Upsert das linhas da matriz de kits (chave uq_modelo_kits_chave) e insert das
+    movimentações da farmácia na mesma transação. Devolve quantas linhas da
+    matriz foram gravadas; se algo falhar, nada é gravado.
+    """
+    if not linhas:
+        return 0
+    resp = supabase_execute(
+        lambda: supabase.rpc(RPC_GRAVAR_DISPENSACAO, {
+            "p_linhas": linhas,
+            "p_movimentos": movimentos,
+        }).execute()
+    )
+    return int(resp.data or 0)
+
+
+def confirmar_agendamento(
+    supabase,
+    agendamento_id: int,
+    status: str,
+    *,
+    usuario_id: int | None,
+    usuario_nome: str,
+    nova_data: date | None = None,
+    novo_horario: time | None = None,
+) -> int | None:
+    """
+    Troca o status de confirmação e registra o log. Com `nova_data` (reagendamento),
+    cria também a cópia do agendamento na nova data/horário, sem status, e registra
+    o log "reagendamento" nela. Devolve o id do novo agendamento (ou None).
+    """
+    resp = supabase_execute(
+        lambda: supabase.rpc(RPC_CONFIRMAR_AGENDAMENTO, {
+            "p_agendamento_id": int(agendamento_id),
+            "p_status": status,
+            "p_usuario_id": usuario_id,
+            "p_usuario_nome": usuario_nome,
+            "p_nova_data": nova_data.isoformat() if nova_data else None,
+            "p_novo_horario": novo_horario.strftime("%H:%M") if novo_horario else None,
+        }).execute()
+    )
+    return int(resp.data) if resp.data else None
+
+
+def excluir_agendamento(supabase, agendamento_id: int) -> None:
+    """Apaga o agendamento com seus logs de etapas e de alterações, tudo ou nada."""
+    supabase_execute(
+        lambda: supabase.rpc(RPC_EXCLUIR_AGENDAMENTO, {"p_agendamento_id": int(agendamento_id)}).execute()
+    )
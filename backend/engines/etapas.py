@@ -0,0 +1,145 @@
+# ============================================================
+# ⏱️ backend/engines/etapas.py
+# Tempo aberto e último status por (agendamento, etapa) a partir de
+# tab_app_log_etapas — vetorizado e memoizado por conjunto de logs
+# ============================================================
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+
+# Status que abrem a contagem de tempo da etapa (fecha no próximo log da mesma etapa)
+STATUS_INICIO = frozenset({"Atendendo", "Em atendimento"})
+
+COLUNAS_LOG = ["agendamento_id", "nome_etapa", "status_etapa", "data_hora_etapa"]
+COLUNAS_ETAPAS = ["agendamento_id", "nome_etapa", "tempo_sec", "ultimo_status"]
+
+_MEMO_MAX = 32
+_memo: "OrderedDict[tuple, pd.DataFrame]" = OrderedDict()
+_memo_lock = threading.Lock()
+
+
+def _para_utc(valores: pd.Series) -> pd.Series:
+    """data_hora_etapa -> Timestamp UTC (NaT quando inválido)."""
+    ts = pd.to_datetime(valores, errors="coerce", utc=True, format="ISO8601")
+    # Formatos fora do ISO: parse individual, como o cálculo antigo
+    falhos = ts.isna() & valores.notna()
+    if falhos.any():
+        ts[falhos] = valores[falhos].map(lambda v: pd.to_datetime(v, errors="coerce", utc=True))
+    return ts
+
+
+def _chave_logs(df_logs: pd.DataFrame) -> str:
+    """Hash do conteúdo relevante dos logs (independe da ordem das colunas extras)."""
+    h = pd.util.hash_pandas_object(df_logs.reindex(columns=COLUNAS_LOG), index=False)
+    return hashlib.blake2b(h.to_numpy().tobytes(), digest_size=16).hexdigest()
+
+
+def _calcular(df_logs: pd.DataFrame, agora: pd.Timestamp) -> pd.DataFrame:
+    ts = _para_utc(df_logs["data_hora_etapa"])
+    validos = (ts.notna() & df_logs["agendamento_id"].notna() & df_logs["nome_etapa"].notna()).to_numpy()
+    if not validos.any():
+        return pd.DataFrame(columns=COLUNAS_ETAPAS)
+
+    ag_cod, ag_val = pd.factorize(df_logs["agendamento_id"][validos], sort=True)
+    et_cod, et_val = pd.factorize(df_logs["nome_etapa"][validos], sort=True)
+    ts = ts[validos].to_numpy(dtype="datetime64[ns]")
+    status = df_logs["status_etapa"].to_numpy(dtype=object)[validos]
+
+    # Ordena por (agendamento, etapa, ts) e marca fronteiras de grupo
+    ordem = np.lexsort((ts, et_cod, ag_cod))
+    ag_cod, et_cod, ts, status = ag_cod[ordem], et_cod[ordem], ts[ordem], status[ordem]
+    n = len(ordem)
+    inicio = np.ones(n, dtype=bool)
+    inicio[1:] = (ag_cod[1:] != ag_cod[:-1]) | (et_cod[1:] != et_cod[:-1])
+    ultimo = np.ones(n, dtype=bool)
+    ultimo[:-1] = inicio[1:]
+
+    # Cada log fecha no seguinte da mesma etapa; o último fecha em `agora`
+    fim = np.empty_like(ts)
+    fim[:-1] = ts[1:]
+    fim[ultimo] = np.datetime64(agora.tz_convert("UTC").tz_localize(None), "ns")
+    segundos = (fim - ts) / np.timedelta64(1, "s")
+    aberto = pd.Series(status).isin(STATUS_INICIO).to_numpy()
+    tempo = np.where(aberto, np.clip(segundos, 0, None), 0.0)
+
+    inicios = np.flatnonzero(inicio)
+    fins = np.flatnonzero(ultimo)
+
+    # Último status não nulo do grupo (mesma regra de groupby().last())
+    pos = np.maximum.accumulate(np.where(pd.notna(status), np.arange(n), -1))[fins]
+    ultimo_status = np.where(pos >= inicios, status[np.maximum(pos, 0)], None)
+
+    return pd.DataFrame({
+        "agendamento_id": np.asarray(ag_val)[ag_cod[inicios]],
+        "nome_etapa": np.asarray(et_val)[et_cod[inicios]],
+        "tempo_sec": np.add.reduceat(tempo, inicios),
+        "ultimo_status": ultimo_status,
+    })
+
+
+def calcular_etapas(df_logs: pd.DataFrame, agora: pd.Timestamp | None = None) -> pd.DataFrame:
+    """
+    Uma linha por (agendamento_id, nome_etapa) com:
+      - tempo_sec: soma dos intervalos iniciados por um status de STATUS_INICIO,
+        até o próximo log da etapa (ou `agora`, se ainda aberta);
+      - ultimo_status: status do log mais recente da etapa.
+
+    O resultado fica memoizado pelo hash dos logs e pelo minuto de `agora`,
+    então a mesma página não recalcula o mesmo conjunto de logs.
+    """
+    if df_logs is None or df_logs.empty:
+        return pd.DataFrame(columns=COLUNAS_ETAPAS)
+
+    df_logs = df_logs.rename(columns=str.lower)
+    if agora is None:
+        agora = pd.Timestamp(datetime.now(timezone.utc)).floor("min")
+    chave = (_chave_logs(df_logs), agora)
+
+    with _memo_lock:
+        if chave in _memo:
+            _memo.move_to_end(chave)
+            return _memo[chave].copy()
+
+    resultado = _calcular(df_logs, agora)
+
+    with _memo_lock:
+        _memo[chave] = resultado
+        while len(_memo) > _MEMO_MAX:
+            _memo.popitem(last=False)
+    return resultado.copy()
+
+
+def tempo_por_etapa(df_etapas: pd.DataFrame) -> pd.DataFrame:
+    """Tempo total (segundos) por nome_etapa, somando todos os agendamentos."""
+    return df_etapas.groupby("nome_etapa")["tempo_sec"].sum().reset_index()
+
+
+def pivot_tempos(df_etapas: pd.DataFrame, etapas: list) -> pd.DataFrame:
+    """agendamento_id x etapas com tempo_sec (0 quando a etapa não tem log)."""
+    if df_etapas.empty:
+        return pd.DataFrame(0.0, columns=etapas, index=pd.Index([], name="agendamento_id"))
+    return (
+        df_etapas.pivot_table(
+            index="agendamento_id", columns="nome_etapa",
+            values="tempo_sec", aggfunc="sum", fill_value=0.0,
+        )
+        .reindex(columns=etapas, fill_value=0.0)
+    )
+
+
+def pivot_ultimo_status(df_etapas: pd.DataFrame, etapas: list) -> pd.DataFrame:
+    """agendamento_id x etapas com o último status (NaN quando a etapa não tem log)."""
+    if df_etapas.empty:
+        return pd.DataFrame(columns=etapas, index=pd.Index([], name="agendamento_id"))
+    return (
+        df_etapas.pivot_table(
+            index="agendamento_id", columns="nome_etapa",
+            values="ultimo_status", aggfunc="last",
+        )
+        .reindex(columns=etapas)
+    )
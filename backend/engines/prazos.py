@@ -0,0 +1,180 @@
+# ============================================================
+# 📅 backend/engines/prazos.py
+# Prazo de revisão/transcrição, farol e status de atuação (Dados - Agenda),
+# vetorizados com dias úteis do NumPy e calendário de feriados configurável
+# ============================================================
+import re
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+
+# Uso em tab_app_variaveis com as regras de feriado (uma por linha)
+USO_FERIADOS = "feriados"
+
+# Estudo sem resolucao_dias: prazo padrão em dias úteis
+PRAZO_PADRAO_UTEIS = 5
+# Farol amarelo quando faltam até DIAS_ALERTA dias corridos
+DIAS_ALERTA = 3
+
+# Calendário nacional + município de São Paulo, usado enquanto "feriados" não
+# estiver cadastrado. Regras aceitas:
+#   DD/MM            feriado fixo (todo ano)
+#   DD/MM/AAAA       data avulsa (também AAAA-MM-DD)
+#   pascoa+N/-N      móvel, relativo ao domingo de Páscoa
+FERIADOS_PADRAO = (
+    "01/01",      # Confraternização Universal
+    "25/01",      # Aniversário de São Paulo
+    "pascoa-48",  # Carnaval (segunda)
+    "pascoa-47",  # Carnaval (terça)
+    "pascoa-2",   # Sexta-feira Santa
+    "21/04",      # Tiradentes
+    "01/05",      # Dia do Trabalho
+    "pascoa+60",  # Corpus Christi
+    "09/07",      # Revolução Constitucionalista (SP)
+    "07/09",      # Independência
+    "12/10",      # Nossa Senhora Aparecida
+    "02/11",      # Finados
+    "15/11",      # Proclamação da República
+    "20/11",      # Consciência Negra
+    "25/12",      # Natal
+)
+
+_RE_PASCOA = re.compile(r"^p[aá]scoa\s*(?:([+-])\s*(\d+))?$")
+_RE_FIXO = re.compile(r"^(\d{1,2})/(\d{1,2})$")
+
+_UTEIS = ("úteis", "uteis")
+
+
+def _pascoa(ano: int) -> date:
+    """Domingo de Páscoa (calendário gregoriano, algoritmo de Meeus/Jones/Butcher)."""
+    a, b, c = ano % 19, ano // 100, ano % 100
+    d, e = b // 4, b % 4
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    mes = (h + l - 7 * m + 114) // 31
+    dia = (h + l - 7 * m + 114) % 31 + 1
+    return date(ano, mes, dia)
+
+
+def calendario_feriados(regras, anos) -> np.ndarray:
+    """Expande as regras de feriado para os anos pedidos (datetime64[D] ordenado, sem repetição)."""
+    datas = set()
+    for regra in regras or ():
+        r = str(regra).split("#", 1)[0].strip().lower()
+        if not r:
+            continue
+
+        m = _RE_PASCOA.match(r)
+        if m:
+            desloc = int(m.group(2) or 0) * (-1 if m.group(1) == "-" else 1)
+            datas.update(_pascoa(ano) + timedelta(days=desloc) for ano in anos)
+            continue
+
+        m = _RE_FIXO.match(r)
+        if m:
+            dia, mes = int(m.group(1)), int(m.group(2))
+            for ano in anos:
+                try:
+                    datas.add(date(ano, mes, dia))
+                except ValueError:
+                    pass
+            continue
+
+        dt = pd.to_datetime(r, dayfirst="/" in r, errors="coerce")
+        if not pd.isna(dt):
+            datas.add(dt.date())
+
+    return np.array(sorted(datas), dtype="datetime64[D]")
+
+
+def _dias(valores: pd.Series) -> np.ndarray:
+    return pd.to_datetime(valores, errors="coerce").to_numpy(dtype="datetime64[ns]").astype("datetime64[D]")
+
+
+def _texto(valores: pd.Series) -> pd.Series:
+    return valores.fillna("").astype(str).str.strip()
+
+
+def calcular_prazos(data_visita: pd.Series, resolucao_dias: pd.Series, resolucao_modelo: pd.Series, feriados) -> pd.Series:
+    """
+    Prazo = data da visita + resolucao_dias (corridos, ou úteis quando
+    resolucao_modelo é "Úteis"/"uteis", sem diferenciar maiúsculas); sem resolucao_dias, PRAZO_PADRAO_UTEIS úteis.
+    Dias úteis pulam fins de semana e `feriados` (datetime64[D]). NaT sem data válida.
+    """
+    dv = _dias(data_visita)
+    valido = ~np.isnat(dv)
+
+    dias = pd.to_numeric(resolucao_dias, errors="coerce").fillna(0).to_numpy()
+    padrao = dias == 0
+    dias = np.where(padrao, PRAZO_PADRAO_UTEIS, dias).astype(np.int64)
+    uteis = padrao | _texto(resolucao_modelo).str.lower().isin(_UTEIS).to_numpy()
+
+    prazo = np.full(len(dv), np.datetime64("NaT"), dtype="datetime64[D]")
+    m = valido & uteis
+    # roll="backward": visita em fim de semana/feriado recua para o dia útil
+    # anterior antes de somar os dias (igual ao _add_business_days antigo; não
+    # trocar por "forward", que daria um dia útil a mais nesses casos)
+    prazo[m] = np.busday_offset(dv[m], dias[m], roll="backward", holidays=feriados)
+    m = valido & ~uteis
+    prazo[m] = dv[m] + dias[m].astype("timedelta64[D]")
+
+    return pd.Series(prazo.astype("datetime64[ns]"), index=data_visita.index)
+
+
+def calcular_farol(prazo: pd.Series, desfecho: pd.Series, hoje: date | None = None) -> pd.Series:
+    """⚪ sem prazo ou não finalizado; 🔴 vencido; 🟡 vence em até DIAS_ALERTA dias; 🟢 no prazo."""
+    hoje = np.datetime64(hoje or date.today(), "D")
+    p = prazo.to_numpy(dtype="datetime64[ns]").astype("datetime64[D]")
+    finalizado = (_texto(desfecho) == "Finalizado").to_numpy()
+
+    farol = np.select(
+        [~finalizado | np.isnat(p), p < hoje, p <= hoje + np.timedelta64(DIAS_ALERTA, "D")],
+        ["⚪", "🔴", "🟡"],
+        default="🟢",
+    )
+    return pd.Series(farol, index=prazo.index)
+
+
+def calcular_status_atuacao(desfecho: pd.Series, status_revisao: pd.Series, status_transcricao: pd.Series) -> pd.Series:
+    """N/A (não finalizado), Concluído (revisão e transcrição), Em andamento (uma delas) ou Pendente."""
+    def preenchido(s: pd.Series) -> np.ndarray:
+        return (~_texto(s).isin(["", "None", "nan", "NaN"])).to_numpy()
+
+    finalizado = (_texto(desfecho) == "Finalizado").to_numpy()
+    rev, tran = preenchido(status_revisao), preenchido(status_transcricao)
+
+    status = np.select(
+        [~finalizado, rev & tran, rev | tran],
+        ["N/A", "Concluído", "Em andamento"],
+        default="Pendente",
+    )
+    return pd.Series(status, index=desfecho.index)
+
+
+def calcular_prazos_agenda(df: pd.DataFrame, regras_feriados=None, hoje: date | None = None) -> pd.DataFrame:
+    """
+    prazo, farol e status_atuacao para todo o frame de agendamentos de uma vez.
+    Usa as colunas data_visita, resolucao_dias, resolucao_modelo,
+    desfecho_atendimento, status_revisao e status_transcricao (ausentes = vazias).
+    """
+    def col(nome: str) -> pd.Series:
+        return df[nome] if nome in df.columns else pd.Series(None, index=df.index, dtype=object)
+
+    anos_visita = pd.to_datetime(col("data_visita"), errors="coerce").dt.year.dropna()
+    anos = range(int(anos_visita.min()), int(anos_visita.max()) + 2) if not anos_visita.empty else ()
+    feriados = calendario_feriados(regras_feriados or FERIADOS_PADRAO, anos)
+
+    prazo = calcular_prazos(col("data_visita"), col("resolucao_dias"), col("resolucao_modelo"), feriados)
+    return pd.DataFrame({
+        "prazo": prazo,
+        "farol": calcular_farol(prazo, col("desfecho_atendimento"), hoje),
+        "status_atuacao": calcular_status_atuacao(
+            col("desfecho_atendimento"), col("status_revisao"), col("status_transcricao")
+        ),
+    }, index=df.index)
@@ -0,0 +1,469 @@
+# ============================================================
+# 🗂️ frontend/agenda_store.py
+# Store único (por processo) de tab_app_agendamentos: índices em memória
+# e sincronização incremental pela coluna dt_atualizacao
+# ============================================================
+import os
+import time
+import logging
+import threading
+from dataclasses import dataclass, fields
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from postgrest.exceptions import APIError
+
+from frontend import cache_disco, tipos
+from frontend.supabase_client import fetch_all, registrar_cache, depende_de, cache_swr, IN_CHUNK_MAX
+
+logger = logging.getLogger(__name__)
+
+TABELA = "tab_app_agendamentos"
+
+# Carimbo de alteração mantido pelo banco (DEFAULT NOW() + trigger; ver supabase_schema.sql)
+COLUNA_WATERMARK = os.getenv("AGENDA_COLUNA_WATERMARK", "dt_atualizacao")
+
+# Delta no máximo a cada AGENDA_SYNC_S s (gravações deste processo forçam antes)
+AGENDA_SYNC_S = int(os.getenv("AGENDA_SYNC_S", "15"))
+# Sem a coluna de watermark: recarga completa a cada AGENDA_RECARGA_S s
+AGENDA_RECARGA_S = int(os.getenv("AGENDA_RECARGA_S", "300"))
+# Exclusões não aparecem no delta: varredura de (id, watermark) a cada AGENDA_RECONCILIAR_S s
+AGENDA_RECONCILIAR_S = int(os.getenv("AGENDA_RECONCILIAR_S", "300"))
+# Sobreposição da janela do delta. O trigger carimba a hora da gravação, não a do
+# commit: uma transação que leva mais que isso para comitar deixa a linha abaixo
+# da watermark e o delta não a vê mais. A margem cobre o caso comum; o resto
+# (transação longa) só entra na próxima reconciliação, que compara os carimbos.
+AGENDA_MARGEM = pd.Timedelta(seconds=int(os.getenv("AGENDA_MARGEM_S", "60")))
+# AGENDA_STORE=0 desliga o store: cada consulta vai ao PostgREST só com as linhas filtradas
+AGENDA_STORE = os.getenv("AGENDA_STORE", "1") != "0"
+# Snapshot da tabela no cache em disco no máximo a cada AGENDA_DISCO_S s (processo novo parte dele)
+AGENDA_DISCO_S = int(os.getenv("AGENDA_DISCO_S", "300"))
+DISCO_NOME = "agenda"
+
+_ORDEM_PADRAO = ("data_visita", "id")
+_DATA_NULA = "\uffff"  # data_visita nula fica no fim da chave de busca
+_VAZIO = np.array([], dtype=np.intp)
+
+
+def _tupla(valores) -> tuple | None:
+    if valores is None:
+        return None
+    if isinstance(valores, (str, int, np.integer)):
+        valores = [valores]
+    return tuple(sorted(set(valores), key=str))
+
+
+@dataclass(frozen=True)
+class FiltroAgenda:
+    """
+    Filtro declarativo de agendamentos: intervalo de data_visita (inclusivo),
+    estudo_ids, coordenações, status_confirmacao e ids. None = sem filtro;
+    tupla vazia = nenhuma linha.
+
+    Imutável e normalizado (datas ISO, tuplas ordenadas): serve como chave de
+    cache estável. Compila para os índices do AgendaStore (kwargs) ou para
+    cláusulas PostgREST .gte/.lte/.in_ (aplicar).
+    """
+
+    data_ini: str | None = None
+    data_fim: str | None = None
+    estudo_ids: tuple | None = None
+    coordenacoes: tuple | None = None
+    status: tuple | None = None
+    ids: tuple | None = None
+
+    @classmethod
+    def criar(cls, *, data=None, data_ini=None, data_fim=None, estudo_ids=None, coordenacoes=None, status=None, ids=None) -> "FiltroAgenda":
+        if data is not None:
+            data_ini = data_fim = data
+        return cls(
+            data_ini=None if data_ini is None else str(data_ini),
+            data_fim=None if data_fim is None else str(data_fim),
+            estudo_ids=_tupla(None if estudo_ids is None else [int(e) for e in _tupla(estudo_ids)]),
+            coordenacoes=_tupla(coordenacoes),
+            status=_tupla(status),
+            ids=_tupla(None if ids is None else [int(i) for i in _tupla(ids)]),
+        )
+
+    def kwargs(self) -> dict:
+        """Filtros não nulos, no formato de AgendaStore.consultar(**filtros)."""
+        return {f.name: getattr(self, f.name) for f in fields(self) if getattr(self, f.name) is not None}
+
+    def aplicar(self, query):
+        """Acrescenta as cláusulas PostgREST equivalentes ao builder `query`."""
+        if self.data_ini is not None:
+            query = query.gte("data_visita", self.data_ini)
+        if self.data_fim is not None:
+            query = query.lte("data_visita", self.data_fim)
+        for coluna, valores in (
+            ("estudo_id", self.estudo_ids),
+            ("coordenacao", self.coordenacoes),
+            ("status_confirmacao", self.status),
+            ("id", self.ids),
+        ):
+            if valores is None:
+                continue
+            query = query.eq(coluna, valores[0]) if len(valores) == 1 else query.in_(coluna, list(valores))
+        return query
+
+
+def _indices(df: pd.DataFrame, coluna: str) -> dict:
+    if coluna not in df.columns:
+        return {}
+    return df.groupby(coluna, sort=False, dropna=True, observed=True).indices
+
+
+@dataclass(frozen=True)
+class _Snapshot:
+    """Tabela + índices, imutável. Cada sincronização monta um snapshot novo."""
+
+    df: pd.DataFrame      # ordenado por (data_visita, id), RangeIndex, tipos de tipos.ESQUEMAS
+    datas: np.ndarray     # data_visita ordenada (busca binária)
+    por_id: pd.Index
+    por_estudo: dict      # estudo_id -> posições
+    por_coordenacao: dict  # coordenacao -> posições
+    por_status: dict      # status_confirmacao -> posições
+
+    @classmethod
+    def montar(cls, df: pd.DataFrame) -> "_Snapshot":
+        # Depois de concat/filtro as categorias podem ter virado object: tipa de novo
+        df = tipos.tipar(df, TABELA)
+        if df.empty or "data_visita" not in df.columns:
+            df = df.reset_index(drop=True)
+            return cls(df, np.array([], dtype=object), pd.Index([]), {}, {}, {})
+
+        df = df.sort_values(list(_ORDEM_PADRAO), na_position="last", kind="stable").reset_index(drop=True)
+        return cls(
+            df=df,
+            datas=df["data_visita"].fillna(_DATA_NULA).astype(str).to_numpy(),
+            por_id=pd.Index(df["id"]),
+            por_estudo=_indices(df, "estudo_id"),
+            por_coordenacao=_indices(df, "coordenacao"),
+            por_status=_indices(df, "status_confirmacao"),
+        )
+
+    def filtrar(
+        self, *, data=None, data_ini=None, data_fim=None, estudo_ids=None, coordenacoes=None, status=None, ids=None
+    ) -> pd.DataFrame:
+        pos = None
+
+        if data is not None:
+            data_ini = data_fim = data
+        if data_ini is not None or data_fim is not None:
+            lo = 0 if data_ini is None else np.searchsorted(self.datas, str(data_ini), side="left")
+            fim = _DATA_NULA if data_fim is None else str(data_fim)
+            hi = np.searchsorted(self.datas, fim, side="left" if data_fim is None else "right")
+            pos = np.arange(lo, hi)
+
+        for indice, valores in (
+            (self.por_estudo, estudo_ids),
+            (self.por_coordenacao, coordenacoes),
+            (self.por_status, status),
+        ):
+            if valores is None:
+                continue
+            achados = [indice[v] for v in valores if v in indice]
+            sel = np.concatenate(achados) if achados else _VAZIO
+            pos = sel if pos is None else np.intersect1d(pos, sel, assume_unique=True)
+
+        if ids is not None:
+            sel = self.por_id.get_indexer(list(ids))
+            sel = sel[sel >= 0]
+            pos = sel if pos is None else np.intersect1d(pos, sel)
+
+        if pos is None:
+            return self.df
+        return self.df.iloc[np.sort(pos)]
+
+
+class AgendaStore:
+    """
+    Cópia em memória de tab_app_agendamentos compartilhada por todas as sessões.
+
+    A primeira consulta carrega a tabela inteira (ou, num processo novo, o último
+    snapshot do cache em disco); as seguintes trazem só as linhas com
+    dt_atualizacao >= watermark. Gravações via supabase_execute() marcam o
+    store como sujo (barramento de invalidação), então quem gravou já lê o dado novo.
+    Sem a coluna de watermark, cai para recarga completa periódica.
+    """
+
+    def __init__(self):
+        self._snap = _Snapshot.montar(pd.DataFrame())
+        self._lock = threading.Lock()
+        self._carregado = False
+        self._sujo = False
+        self._delta = True
+        self._watermark: pd.Timestamp | None = None
+        self._ultimo_sync = 0.0
+        self._ultima_reconciliacao = 0.0
+        self._ultimo_disco = float("-inf")
+
+    # Chamado pelo barramento (registrar_cache) quando a tabela é gravada
+    def clear(self) -> None:
+        self._sujo = True
+
+    def remover(self, ids) -> None:
+        """Retira do store linhas excluídas por este processo (o delta não enxerga exclusões)."""
+        with self._lock:
+            df = self._snap.df
+            if not df.empty:
+                self._snap = _Snapshot.montar(df[~df["id"].isin(list(ids))])
+
+    def _precisa_sync(self) -> bool:
+        intervalo = AGENDA_SYNC_S if self._delta else AGENDA_RECARGA_S
+        return not self._carregado or self._sujo or time.monotonic() - self._ultimo_sync >= intervalo
+
+    def sincronizar(self, supabase, *, forcar: bool = False) -> None:
+        if not forcar and not self._precisa_sync():
+            return
+        with self._lock:
+            # Outra sessão pode ter sincronizado enquanto esperávamos o lock
+            if not forcar and not self._precisa_sync():
+                return
+            self._sujo = False
+            try:
+                if not self._carregado:
+                    self._carga_inicial(supabase)
+                elif not self._delta or self._watermark is None:
+                    self._carga_completa(supabase)
+                else:
+                    self._atualizar(supabase)
+            except Exception as e:
+                self._sujo = True
+                if not self._carregado:
+                    raise
+                # Falha passageira: as páginas seguem com o snapshot atual e a
+                # próxima consulta tenta de novo (_sujo)
+                logger.warning(f"⚠️ AgendaStore: sincronização falhou, servindo o snapshot atual ({e})")
+                return
+            self._ultimo_sync = time.monotonic()
+            self._salvar_disco()
+
+    def _atualizar(self, supabase) -> None:
+        self._aplicar_delta(supabase)
+        if time.monotonic() - self._ultima_reconciliacao >= AGENDA_RECONCILIAR_S:
+            self._reconciliar(supabase)
+
+    def _carga_inicial(self, supabase) -> None:
+        """
+        Processo novo: parte do snapshot do cache em disco (do processo anterior
+        ou de outro worker) e aplica o delta desde ele. Sem snapshot, um worker
+        só faz a carga completa e grava o snapshot; os outros esperam e usam o dele.
+        """
+        def buscar():
+            self._carga_completa(supabase)
+            self._salvar_disco(esperar=True)
+            return False
+
+        if cache_disco.uma_vez(DISCO_NOME, self._carregar_disco, buscar):
+            self._atualizar(supabase)
+
+    def _carregar_disco(self) -> bool | None:
+        """True se o store foi montado a partir do snapshot em disco."""
+        salvo = cache_disco.carregar(DISCO_NOME)
+        if salvo is None:
+            return None
+        df, meta = salvo
+        if not meta.get("watermark") or COLUNA_WATERMARK not in df.columns:
+            return None
+        self._snap = _Snapshot.montar(df)
+        self._watermark = pd.Timestamp(meta["watermark"])
+        self._carregado = True
+        # Exclusões feitas enquanto o processo estava parado: reconcilia já no primeiro delta
+        self._ultima_reconciliacao = float("-inf")
+        return True
+
+    def _salvar_disco(self, *, esperar: bool = False) -> None:
+        # Sem watermark não há delta para completar o snapshot: não vale gravar
+        if not self._delta or self._watermark is None:
+            return
+        if time.monotonic() - self._ultimo_disco < AGENDA_DISCO_S:
+            return
+        self._ultimo_disco = time.monotonic()
+        gravacao = cache_disco.salvar(DISCO_NOME, self._snap.df, watermark=self._watermark.isoformat())
+        if esperar and gravacao is not None:
+            gravacao.result()
+
+    def _carga_completa(self, supabase) -> None:
+        df = fetch_all(lambda: supabase.table(TABELA).select("*").order("id"), esquema=TABELA)
+        self._snap = _Snapshot.montar(df)
+        self._watermark = self._max_watermark(df)
+        self._carregado = True
+        self._ultima_reconciliacao = time.monotonic()
+        logger.info(f"🗂️ AgendaStore: carga completa ({len(df)} linhas)")
+
+    def _aplicar_delta(self, supabase) -> None:
+        desde = (self._watermark - AGENDA_MARGEM).isoformat()
+        try:
+            delta = fetch_all(
+                lambda: supabase.table(TABELA)
+                .select("*")
+                .gte(COLUNA_WATERMARK, desde)
+                .order(COLUNA_WATERMARK)
+                .order("id"),
+                esquema=TABELA,
+            )
+        except APIError as e:
+            # Coluna ausente/sem permissão: segue com recarga completa periódica
+            logger.warning(f"⚠️ AgendaStore sem delta por {COLUNA_WATERMARK} ({e}); usando recarga completa")
+            self._delta = False
+            self._carga_completa(supabase)
+            return
+
+        if delta.empty:
+            return
+        base = self._snap.df
+
+        # A janela sobreposta devolve de novo as últimas linhas já aplicadas
+        novos = delta.set_index("id")[COLUNA_WATERMARK]
+        if not base.empty and base.set_index("id")[COLUNA_WATERMARK].reindex(novos.index).eq(novos).all():
+            return
+
+        self._mesclar(delta)
+        logger.info(f"🗂️ AgendaStore: delta de {len(delta)} linha(s)")
+
+    def _mesclar(self, linhas: pd.DataFrame) -> None:
+        """Substitui/acrescenta `linhas` no snapshot (por id) e avança a watermark."""
+        base = self._snap.df
+        base = base[~base["id"].isin(linhas["id"])]
+        self._snap = _Snapshot.montar(tipos.concatenar([base, linhas], TABELA))
+        maximo = self._max_watermark(linhas)
+        if maximo is not None and self._watermark is not None:
+            self._watermark = max(self._watermark, maximo)
+
+    def _reconciliar(self, supabase) -> None:
+        """
+        Varredura de (id, watermark): retira as linhas excluídas e rebusca as que
+        faltam ou estão com carimbo diferente (commits que chegaram depois da
+        margem do delta).
+        """
+        vivos = fetch_all(
+            lambda: supabase.table(TABELA).select(f"id, {COLUNA_WATERMARK}").order("id"), esquema=TABELA
+        )
+        df = self._snap.df
+        if not df.empty:
+            excluidos = ~df["id"].isin(vivos["id"] if not vivos.empty else [])
+            if excluidos.any():
+                self._snap = _Snapshot.montar(df[~excluidos])
+                df = self._snap.df
+
+        if not vivos.empty:
+            remotos = vivos.set_index("id")[COLUNA_WATERMARK]
+            locais = df.set_index("id")[COLUNA_WATERMARK].reindex(remotos.index) if not df.empty else None
+            divergentes = remotos.index if locais is None else remotos.index[remotos.notna() & ~remotos.eq(locais)]
+            ids = [int(i) for i in divergentes]
+            frames = [
+                fetch_all(
+                    lambda lote=ids[i:i + IN_CHUNK_MAX]: supabase.table(TABELA).select("*").in_("id", lote).order("id"),
+                    esquema=TABELA,
+                )
+                for i in range(0, len(ids), IN_CHUNK_MAX)
+            ]
+            frames = [f for f in frames if not f.empty]
+            if frames:
+                self._mesclar(tipos.concatenar(frames, TABELA))
+                logger.info(f"🗂️ AgendaStore: reconciliação rebuscou {len(ids)} linha(s)")
+        self._ultima_reconciliacao = time.monotonic()
+
+    def _max_watermark(self, df: pd.DataFrame) -> pd.Timestamp | None:
+        if df.empty:
+            return None
+        if COLUNA_WATERMARK not in df.columns:
+            self._delta = False
+            return None
+        maximo = pd.to_datetime(df[COLUNA_WATERMARK], errors="coerce", utc=True).max()
+        return None if pd.isna(maximo) else maximo
+
+    def consultar(
+        self,
+        supabase,
+        filtro: FiltroAgenda | None = None,
+        *,
+        colunas: list | None = None,
+        ordem: tuple = _ORDEM_PADRAO,
+        desc: bool = False,
+        limit: int | None = None,
+        **filtros,
+    ) -> pd.DataFrame:
+        """
+        Agendamentos filtrados pelos índices (FiltroAgenda ou data/data_ini/data_fim,
+        estudo_ids, coordenacoes, status, ids), ordenados e opcionalmente limitados.
+        Devolve uma cópia no contrato das páginas (tipos.para_pagina), com
+        data_visita_dt já convertida.
+
+        Com `limit`, df.attrs["truncated"] indica se havia mais linhas
+        (mesmo contrato de fetch_all / avisar_truncamento).
+        """
+        self.sincronizar(supabase)
+        if filtro is not None:
+            filtros = {**filtro.kwargs(), **filtros}
+        df = self._snap.filtrar(**filtros)
+
+        if tuple(ordem) != _ORDEM_PADRAO or desc:
+            df = df.sort_values(list(ordem), ascending=not desc, na_position="last", kind="stable")
+        total = len(df)
+        if limit is not None:
+            df = df.head(limit)
+
+        if colunas:
+            df = df.reindex(columns=[*colunas, *tipos.colunas_dt(TABELA, colunas)])
+        else:
+            df = df.drop(columns=[COLUNA_WATERMARK], errors="ignore")
+        df = tipos.para_pagina(df.reset_index(drop=True).copy())
+
+        if limit is not None:
+            df.attrs["truncated"] = total > limit
+            df.attrs["limit"] = limit
+        return df
+
+
+@st.cache_resource(show_spinner=False)
+def agenda_store() -> AgendaStore:
+    """AgendaStore do processo, já registrado no barramento de invalidação."""
+    store = AgendaStore()
+    registrar_cache(store, TABELA)
+    return store
+
+
+@depende_de(TABELA)
+@cache_swr(ttl=60, disco="agenda_direto")
+def _consultar_direto(
+    _supabase, filtro: FiltroAgenda, colunas: tuple | None, ordem: tuple, desc: bool, limit: int | None
+) -> pd.DataFrame:
+    def _query():
+        query = filtro.aplicar(_supabase.table(TABELA).select(", ".join(colunas) if colunas else "*"))
+        for coluna in ordem:
+            query = query.order(coluna, desc=desc)
+        return query
+
+    return fetch_all(_query, limit=limit, esquema=TABELA)
+
+
+def consultar_agendamentos(
+    supabase,
+    filtro: FiltroAgenda | None = None,
+    *,
+    colunas: list | None = None,
+    ordem: tuple = _ORDEM_PADRAO,
+    desc: bool = False,
+    limit: int | None = None,
+    **filtros,
+) -> pd.DataFrame:
+    """
+    Atalho para agenda_store().consultar(supabase, ...). Com AGENDA_STORE=0, o
+    filtro é compilado para PostgREST e só as linhas filtradas são buscadas.
+    """
+    if AGENDA_STORE:
+        return agenda_store().consultar(
+            supabase, filtro, colunas=colunas, ordem=ordem, desc=desc, limit=limit, **filtros
+        )
+
+    if filtros:
+        filtro = FiltroAgenda.criar(**{**(filtro.kwargs() if filtro else {}), **filtros})
+    df = _consultar_direto(
+        supabase, filtro or FiltroAgenda(), tuple(colunas) if colunas else None, tuple(ordem), desc, limit
+    )
+    if colunas:
+        df = df.reindex(columns=[*colunas, *tipos.colunas_dt(TABELA, colunas)])
+    return tipos.para_pagina(df.drop(columns=[COLUNA_WATERMARK], errors="ignore"))
@@ -0,0 +1,383 @@
+# ============================================================
+# 💾 frontend/cache_disco.py
+# Cache em disco compartilhado pelos workers do host: snapshots em Parquet
+# e um SQLite em modo WAL com o manifesto, as versões por tabela e a "vez"
+# de cada busca. Sobrevive a deploys/restarts (o processo novo parte do
+# último snapshot) e evita que N workers busquem a mesma coisa no Supabase.
+# ============================================================
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, TypeVar
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# APP_CACHE_DISCO=0 desliga (nada é lido nem gravado)
+CACHE_DISCO = os.getenv("APP_CACHE_DISCO", "1") != "0"
+# Todos os workers do host devem apontar para o mesmo diretório
+CACHE_DIR = os.getenv("APP_CACHE_DIR", os.path.join(".cache", "app"))
+# Snapshot mais velho que isso é ignorado (processo parado por muito tempo)
+CACHE_DISCO_MAX_IDADE_S = int(os.getenv("APP_CACHE_DISCO_MAX_IDADE_S", str(24 * 3600)))
+# Quanto um worker espera pela busca que outro worker já está fazendo
+CACHE_VEZ_PRAZO_S = float(os.getenv("APP_CACHE_VEZ_PRAZO_S", "15"))
+
+# Muda quando o esquema do banco ou o layout dos arquivos mudar: tudo é recriado
+_FORMATO = 2
+_BANCO = "cache.sqlite3"
+_TABELAS_BANCO = {
+    "entradas": """
+        CREATE TABLE entradas (
+            nome       TEXT PRIMARY KEY,
+            arquivo    TEXT NOT NULL,
+            gravado_em REAL NOT NULL,
+            linhas     INTEGER NOT NULL,
+            tabelas    TEXT NOT NULL,
+            meta       TEXT NOT NULL
+        )""",
+    "versoes": """
+        CREATE TABLE versoes (
+            tabela TEXT PRIMARY KEY,
+            versao INTEGER NOT NULL
+        )""",
+    "vez": """
+        CREATE TABLE vez (
+            nome TEXT PRIMARY KEY,
+            dono TEXT NOT NULL,
+            ate  REAL NOT NULL
+        )""",
+}
+
+T = TypeVar("T")
+
+_lock = threading.Lock()
+# Um gravador só por processo: as páginas não esperam o disco
+_gravador = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cache-disco")
+_local = threading.local()
+_desligado = not CACHE_DISCO
+_vinculados: set[tuple[str, str]] = set()
+# prefixo -> epoch do último invalidar(): barra snapshot lido antes e gravado depois
+_invalidados: dict[str, float] = {}
+# Identifica este processo na tabela "vez"
+_DONO = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+def _caminho(arquivo: str) -> str:
+    return os.path.join(CACHE_DIR, arquivo)
+
+
+@contextmanager
+def _transacao(con: sqlite3.Connection):
+    """BEGIN IMMEDIATE ... COMMIT: um escritor por vez entre todos os workers."""
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        yield con
+        con.execute("COMMIT")
+    except BaseException:
+        con.execute("ROLLBACK")
+        raise
+
+
+def _abrir() -> sqlite3.Connection:
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    con = sqlite3.connect(_caminho(_BANCO), timeout=5, isolation_level=None)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA synchronous=NORMAL")
+    if con.execute("PRAGMA user_version").fetchone()[0] != _FORMATO:
+        with _transacao(con):
+            # Conferido de novo com o lock: outro worker pode ter acabado de criar
+            if con.execute("PRAGMA user_version").fetchone()[0] != _FORMATO:
+                for tabela, ddl in _TABELAS_BANCO.items():
+                    con.execute(f"DROP TABLE IF EXISTS {tabela}")
+                    con.execute(ddl)
+                con.execute(f"PRAGMA user_version = {_FORMATO}")
+    return con
+
+
+def _conexao() -> sqlite3.Connection | None:
+    """Conexão SQLite da thread; None (cache desligado) se o banco não puder ser aberto."""
+    global _desligado
+    if _desligado:
+        return None
+    con = getattr(_local, "con", None)
+    if con is None:
+        try:
+            con = _local.con = _abrir()
+        except (sqlite3.Error, OSError) as e:
+            _desligado = True
+            logger.warning(f"⚠️ Cache em disco desligado: não foi possível abrir {_caminho(_BANCO)} ({e})")
+            return None
+    return con
+
+
+def _remover_arquivo(arquivo: str) -> None:
+    try:
+        os.remove(_caminho(arquivo))
+    except OSError:
+        pass
+
+
+# ============================================================
+# 🔢 Versões por tabela (compartilhadas entre os workers)
+# ============================================================
+def publicar_versao(tabela: str, versao: int) -> None:
+    """Registra a gravação em `tabela` para os outros workers (versão só cresce)."""
+    con = _conexao()
+    if con is None:
+        return
+    try:
+        con.execute(
+            "INSERT INTO versoes (tabela, versao) VALUES (?, ?) "
+            "ON CONFLICT (tabela) DO UPDATE SET versao = max(versao, excluded.versao)",
+            (tabela, int(versao)),
+        )
+    except sqlite3.Error as e:
+        logger.warning(f"⚠️ Falha ao publicar versão de {tabela} no cache em disco: {e}")
+
+
+def versoes() -> dict[str, int]:
+    """{tabela: versão} publicadas por todos os workers do host."""
+    con = _conexao()
+    if con is None:
+        return {}
+    try:
+        return dict(con.execute("SELECT tabela, versao FROM versoes").fetchall())
+    except sqlite3.Error as e:
+        logger.warning(f"⚠️ Falha ao ler versões do cache em disco: {e}")
+        return {}
+
+
+def _descartado(con: sqlite3.Connection, nome: str, tabelas, gravado_em: float) -> bool:
+    """
+    Snapshot anterior a uma gravação nas tabelas de origem (feita por qualquer
+    worker do host ou, via CACHE_VERSOES_TABELA, por outra réplica) ou a um
+    invalidar() deste processo?
+    """
+    from frontend.supabase_client import alterada_em
+
+    limite = gravado_em * 1000
+    if any(alterada_em(t) > limite for t in tabelas):
+        return True
+    if tabelas:
+        marcas = ",".join("?" * len(tabelas))
+        maior = con.execute(f"SELECT max(versao) FROM versoes WHERE tabela IN ({marcas})", list(tabelas)).fetchone()[0]
+        if maior is not None and maior > limite:
+            return True
+    return any(nome.startswith(p) and quando >= gravado_em for p, quando in list(_invalidados.items()))
+
+
+class _Invalidador:
+    """Entrada do barramento de invalidação (registrar_cache): gravar a tabela apaga o snapshot."""
+
+    def __init__(self, nome: str):
+        self.nome = nome
+
+    def clear(self) -> None:
+        invalidar(self.nome)
+
+
+def _vincular(nome: str, tabelas) -> None:
+    """Liga o snapshot às tabelas uma vez por processo (vale também para snapshot só lido)."""
+    from frontend.supabase_client import registrar_cache
+
+    for tabela in tabelas:
+        with _lock:
+            if (nome, tabela) in _vinculados:
+                continue
+            _vinculados.add((nome, tabela))
+        registrar_cache(_Invalidador(nome), tabela)
+
+
+# ============================================================
+# 📥 Leitura / 📤 gravação
+# ============================================================
+def carregar(nome: str, *, max_idade: float = CACHE_DISCO_MAX_IDADE_S) -> tuple[pd.DataFrame, dict] | None:
+    """
+    Último snapshot `nome` gravado por salvar() em qualquer worker: (df, meta),
+    com meta["idade_s"] e meta["gravado_em"] (epoch) além do que foi passado em
+    salvar(). None se não houver, estiver velho demais ou se alguma tabela de
+    origem tiver sido gravada depois dele.
+    """
+    con = _conexao()
+    if con is None:
+        return None
+    try:
+        linha = con.execute(
+            "SELECT arquivo, gravado_em, tabelas, meta FROM entradas WHERE nome = ?", (nome,)
+        ).fetchone()
+        if linha is None:
+            return None
+        arquivo, gravado_em, tabelas, meta = linha[0], linha[1], json.loads(linha[2]), json.loads(linha[3])
+        _vincular(nome, tabelas)
+        idade = time.time() - gravado_em
+        if idade > max_idade or _descartado(con, nome, tabelas, gravado_em):
+            return None
+    except (sqlite3.Error, ValueError) as e:
+        logger.warning(f"⚠️ Cache em disco '{nome}': manifesto ilegível ({e})")
+        return None
+
+    inicio = time.perf_counter()
+    try:
+        df = pd.read_parquet(_caminho(arquivo))
+    except Exception as e:
+        # Inclusive arquivo trocado por outro worker entre o SELECT e a leitura
+        logger.warning(f"⚠️ Cache em disco '{nome}' ilegível, ignorando ({e})")
+        return None
+    logger.info(
+        f"💾 Cache em disco '{nome}': {len(df)} linha(s) de {idade / 60:.0f} min atrás "
+        f"em {(time.perf_counter() - inicio) * 1000:.0f} ms"
+    )
+    return df, {**meta, "idade_s": idade, "gravado_em": gravado_em}
+
+
+def salvar(nome: str, df: pd.DataFrame, *, tabelas=(), lido_em: float | None = None, **meta) -> Future | None:
+    """
+    Grava `df` como snapshot `nome` em segundo plano (devolve o Future da gravação).
+
+    `tabelas` são as tabelas de origem: gravações nelas descartam o snapshot.
+    `lido_em` (epoch de quando a consulta começou; padrão: agora) é a idade
+    registrada; se alguma tabela for gravada depois disso, ou se já houver um
+    snapshot mais novo de outro worker, este nem entra no manifesto. `meta`
+    precisa ser serializável em JSON.
+    """
+    if _desligado or not isinstance(df, pd.DataFrame):
+        return None
+    tabelas = list(tabelas)
+    _vincular(nome, tabelas)
+    return _gravador.submit(_gravar, nome, df, tabelas, time.time() if lido_em is None else lido_em, meta)
+
+
+def _gravar(nome: str, df: pd.DataFrame, tabelas: list, lido_em: float, meta: dict) -> None:
+    con = _conexao()
+    if con is None:
+        return
+    # Nome único: quem está lendo o arquivo anterior não vê troca no meio
+    arquivo = f"{nome}.{uuid.uuid4().hex[:12]}.parquet"
+    anterior = None
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        df.to_parquet(_caminho(arquivo), index=False)
+        with _lock, _transacao(con):
+            linha = con.execute("SELECT arquivo, gravado_em FROM entradas WHERE nome = ?", (nome,)).fetchone()
+            # Conferido dentro da transação: invalidar() não roda entre a conferência e o manifesto
+            if (linha is not None and linha[1] >= lido_em) or _descartado(con, nome, tabelas, lido_em):
+                anterior, arquivo = arquivo, None
+            else:
+                anterior = linha[0] if linha else None
+                con.execute(
+                    "INSERT OR REPLACE INTO entradas (nome, arquivo, gravado_em, linhas, tabelas, meta) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (nome, arquivo, lido_em, len(df), json.dumps(tabelas), json.dumps(meta)),
+                )
+    except Exception as e:
+        # Coluna com tipos misturados, disco cheio, sem permissão...: segue só com a memória
+        logger.warning(f"⚠️ Falha ao gravar cache em disco '{nome}': {e}")
+        anterior = arquivo
+    if anterior:
+        _remover_arquivo(anterior)
+
+
+def invalidar(*prefixos: str) -> None:
+    """Apaga, para todos os workers, os snapshots cujo nome começa com algum dos prefixos."""
+    con = _conexao()
+    if con is None or not prefixos:
+        return
+    try:
+        with _lock:
+            agora = time.time()
+            _invalidados.update((p, agora) for p in prefixos)
+            with _transacao(con):
+                apagados = [
+                    (nome, arquivo) for nome, arquivo in con.execute("SELECT nome, arquivo FROM entradas")
+                    if nome.startswith(prefixos)
+                ]
+                con.executemany("DELETE FROM entradas WHERE nome = ?", [(n,) for n, _ in apagados])
+    except sqlite3.Error as e:
+        logger.warning(f"⚠️ Falha ao invalidar cache em disco {prefixos}: {e}")
+        return
+    for _, arquivo in apagados:
+        _remover_arquivo(arquivo)
+
+
+def manifesto() -> dict:
+    """Entradas do manifesto (nome -> arquivo, gravado_em, linhas, tabelas, meta)."""
+    con = _conexao()
+    if con is None:
+        return {}
+    linhas = con.execute("SELECT nome, arquivo, gravado_em, linhas, tabelas, meta FROM entradas").fetchall()
+    return {
+        nome: {"arquivo": arquivo, "gravado_em": gravado_em, "linhas": n,
+               "tabelas": json.loads(tabelas), "meta": json.loads(meta)}
+        for nome, arquivo, gravado_em, n, tabelas, meta in linhas
+    }
+
+
+# ============================================================
+# 🚦 Uma busca por vez entre os workers
+# ============================================================
+def _pegar_vez(con: sqlite3.Connection, nome: str, prazo: float) -> bool:
+    agora = time.time()
+    with _transacao(con):
+        linha = con.execute("SELECT dono, ate FROM vez WHERE nome = ?", (nome,)).fetchone()
+        # Vez de outro worker ainda no prazo; vencida = o dono travou ou morreu
+        if linha is not None and linha[0] != _DONO and linha[1] > agora:
+            return False
+        con.execute("INSERT OR REPLACE INTO vez (nome, dono, ate) VALUES (?, ?, ?)", (nome, _DONO, agora + prazo))
+    return True
+
+
+def uma_vez(nome: str, pronto: Callable[[], T | None], buscar: Callable[[], T], *, prazo: float = CACHE_VEZ_PRAZO_S) -> T:
+    """
+    Single-flight entre os workers do host (o coalescer() do supabase_client
+    faz o mesmo entre as threads de um processo):
+
+        dados = uma_vez("dimensoes", pronto=ler_do_disco, buscar=buscar_e_gravar)
+
+    Se `pronto()` já devolve algo, é isso. Senão, só o worker que pegar a vez
+    executa `buscar()` (que deve gravar no disco antes de retornar); os outros
+    consultam `pronto()` até o resultado aparecer, por no máximo `prazo` s, e
+    depois buscam por conta própria.
+    """
+    valor = pronto()
+    if valor is not None:
+        return valor
+    con = _conexao()
+    if con is None:
+        return buscar()
+
+    try:
+        minha_vez = _pegar_vez(con, nome, prazo)
+    except sqlite3.Error:
+        minha_vez = False
+    if not minha_vez:
+        fim = time.monotonic() + prazo
+        while time.monotonic() < fim:
+            time.sleep(0.1)
+            valor = pronto()
+            if valor is not None:
+                return valor
+            # Vez liberada sem resultado (a busca do outro worker falhou): tenta aqui
+            try:
+                if _pegar_vez(con, nome, prazo):
+                    minha_vez = True
+                    break
+            except sqlite3.Error:
+                pass
+        else:
+            logger.warning(f"⚠️ Cache em disco '{nome}': outro worker não terminou em {prazo:.0f}s, buscando aqui")
+
+    try:
+        return buscar()
+    finally:
+        if minha_vez:
+            try:
+                con.execute("DELETE FROM vez WHERE nome = ? AND dono = ?", (nome, _DONO))
+            except sqlite3.Error:
+                pass
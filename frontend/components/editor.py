@@ -0,0 +1,15 @@
+# ============================================================
+# ✏️ frontend/components/editor.py
+# Apoio ao st.data_editor: só as linhas que o usuário tocou
+# ============================================================
+import streamlit as st
+
+
+def linhas_editadas(key: str) -> list[int]:
+    """
+    Posições (0..n-1, na ordem exibida) das linhas alteradas no st.data_editor
+    de chave `key`, lidas do change-set em st.session_state[key]["edited_rows"].
+    Use com .iloc ou com um frame de RangeIndex.
+    """
+    estado = st.session_state.get(key) or {}
+    return sorted(int(pos) for pos in estado.get("edited_rows", {}))
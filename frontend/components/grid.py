@@ -0,0 +1,121 @@
+# ============================================================
+# 🧮 frontend/components/grid.py
+# AgGrid paginado no servidor: busca, ordenação e paginação feitas em pandas
+# sobre o resultado (já cacheado) da consulta; só a página atual é
+# serializada para o navegador. Datas vão em ISO e são formatadas no grid.
+# ============================================================
+import math
+
+import pandas as pd
+import streamlit as st
+from st_aggrid import AgGrid, GridOptionsBuilder, JsCode
+
+
+TAMANHO_PAGINA = 100
+
+# "AAAA-MM-DD" -> "DD/MM/AAAA"; "AAAA-MM-DDTHH:MM" -> "DD/MM/AAAA HH:MM".
+# ISO já ordena como texto, então não precisa de comparator.
+DATA_BR_JS = JsCode("""
+function(params) {
+    if (!params.value) { return ''; }
+    var v = params.value.toString();
+    var d = v.substring(8, 10) + '/' + v.substring(5, 7) + '/' + v.substring(0, 4);
+    return v.length > 10 ? d + ' ' + v.substring(11, 16) : d;
+}
+""")
+
+
+def datas_iso(df: pd.DataFrame, colunas) -> pd.DataFrame:
+    """Converte as colunas de data para texto ISO (com hora só quando houver); vazio vira None."""
+    df = df.copy()
+    for col in colunas:
+        if col not in df.columns:
+            continue
+        dt = pd.to_datetime(df[col], errors="coerce")
+        if getattr(dt.dt, "tz", None) is not None:
+            dt = dt.dt.tz_convert(None)
+        com_hora = bool((dt.dropna() != dt.dropna().dt.normalize()).any())
+        iso = dt.dt.strftime("%Y-%m-%dT%H:%M" if com_hora else "%Y-%m-%d")
+        df[col] = iso.astype(object).where(dt.notna(), None)
+    return df
+
+
+def _filtrar_texto(df: pd.DataFrame, termo: str) -> pd.DataFrame:
+    """Linhas com `termo` (sem diferenciar maiúsculas) em qualquer coluna de texto."""
+    textos = df.select_dtypes(include=["object", "string"])
+    if textos.empty:
+        return df
+    mask = pd.Series(False, index=df.index)
+    for col in textos.columns:
+        mask |= textos[col].astype(str).str.contains(termo, case=False, regex=False, na=False)
+    return df[mask]
+
+
+def grid_paginado(
+    df: pd.DataFrame,
+    *,
+    key: str,
+    configurar=None,
+    colunas_data=(),
+    ordem_padrao: str | None = None,
+    desc: bool = False,
+    tamanho_pagina: int = TAMANHO_PAGINA,
+    **aggrid_kwargs,
+):
+    """
+    Mostra `df` num AgGrid uma página por vez.
+
+    Busca, ordenação e página são widgets do Streamlit (chaves derivadas de
+    `key`) aplicados ao frame inteiro no servidor; o grid recebe só as
+    `tamanho_pagina` linhas da página, com ordenação/filtro do grid desligados
+    para não ordenar só a página. `colunas_data` são ordenadas como datas e
+    enviadas em ISO com DATA_BR_JS. `configurar(gb)` recebe o
+    GridOptionsBuilder para larguras, estilos e seleção. Devolve a resposta do AgGrid.
+    """
+    colunas = list(df.columns)
+    c_busca, c_ordem, c_desc, c_pag = st.columns([3, 2, 1, 1])
+
+    with c_busca:
+        termo = st.text_input("🔎 Buscar", key=f"{key}_busca", placeholder="Texto em qualquer coluna")
+    with c_ordem:
+        ordem = st.selectbox(
+            "Ordenar por", colunas,
+            index=colunas.index(ordem_padrao) if ordem_padrao in colunas else 0,
+            key=f"{key}_ordem",
+        )
+    with c_desc:
+        st.write("")
+        decrescente = st.toggle("Decrescente", value=desc, key=f"{key}_desc")
+
+    dados = _filtrar_texto(df, termo.strip()) if termo and termo.strip() else df
+    if ordem in dados.columns:
+        chave_ordem = None
+        if ordem in colunas_data:
+            chave_ordem = lambda s: pd.to_datetime(s, errors="coerce")
+        dados = dados.sort_values(ordem, ascending=not decrescente, na_position="last", kind="stable", key=chave_ordem)
+
+    total = len(dados)
+    paginas = max(1, math.ceil(total / tamanho_pagina))
+    chave_pag = f"{key}_pagina"
+    if st.session_state.get(chave_pag, 1) > paginas:
+        st.session_state[chave_pag] = paginas
+    with c_pag:
+        pagina = st.number_input("Página", min_value=1, max_value=paginas, step=1, key=chave_pag)
+
+    inicio = (int(pagina) - 1) * tamanho_pagina
+    df_pagina = datas_iso(dados.iloc[inicio:inicio + tamanho_pagina], colunas_data)
+    st.caption(
+        f"Linhas {min(inicio + 1, total)}–{min(inicio + tamanho_pagina, total)} de {total}"
+        f" · página {int(pagina)} de {paginas}"
+    )
+
+    gb = GridOptionsBuilder.from_dataframe(df_pagina)
+    gb.configure_default_column(sortable=False, filter=False)
+    for col in colunas_data:
+        if col in df_pagina.columns:
+            gb.configure_column(col, valueFormatter=DATA_BR_JS)
+    if configurar:
+        configurar(gb)
+
+    aggrid_kwargs.setdefault("allow_unsafe_jscode", True)
+    return AgGrid(df_pagina, gridOptions=gb.build(), key=f"{key}_grid", **aggrid_kwargs)
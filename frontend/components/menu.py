@@ -5,9 +5,11 @@
 import streamlit as st
 import pandas as pd
 
-from frontend.supabase_client import get_supabase_client, supabase_execute
+from frontend.supabase_client import get_supabase_client, supabase_execute, reset_supabase_client, depende_de
+from frontend import projecoes
 
 
+@depende_de("tab_app_usuario_grupo", "tab_app_grupo_pagina", "tab_app_paginas")
 @st.cache_data(ttl=300)
 def load_pages_by_group(usuario: str):
     """
@@ -21,12 +23,6 @@ def load_pages_by_group(usuario: str):
     return _load_pages_by_group_internal(usuario, tentativa=1)
 
 
-def _reset_client():
-    """Reseta o client Supabase inline (sem depender de import separado)."""
-    import frontend.supabase_client as sc
-    sc._supabase_client = None
-
-
 def _load_pages_by_group_internal(usuario: str, tentativa: int = 1):
     """Lógica interna com retry em caso de falha de conexão."""
     try:
@@ -64,7 +60,7 @@ def _load_pages_by_group_internal(usuario: str, tentativa: int = 1):
         # 3️⃣ Buscar TODAS as páginas primeiro (com nr_ordem)
         resp_todas_paginas = supabase_execute(
             lambda: supabase.table("tab_app_paginas")
-            .select("*")
+            .select(projecoes.select("menu_paginas"))
             .eq("sn_ativo", True)
             .order("nr_ordem")
             .execute()
@@ -101,7 +97,7 @@ def _load_pages_by_group_internal(usuario: str, tentativa: int = 1):
     except OSError as e:
         # ✅ [Errno 11] Resource temporarily unavailable — reseta e tenta de novo
         if tentativa <= 2:
-            _reset_client()
+            reset_supabase_client()
             import time
             time.sleep(0.5 * tentativa)
             return _load_pages_by_group_internal(usuario, tentativa + 1)
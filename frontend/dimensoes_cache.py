@@ -0,0 +1,229 @@
+# ============================================================
+# 📚 frontend/dimensoes_cache.py
+# Cache único (por processo) das dimensões usadas por todas as páginas:
+# variáveis, estudos, usuários e produtos
+# ============================================================
+import time
+import logging
+import threading
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Mapping
+
+import streamlit as st
+import pandas as pd
+
+from frontend import cache_disco
+from frontend.supabase_client import supabase_execute, fetch_all, carregar_em_paralelo, depende_de
+
+logger = logging.getLogger(__name__)
+
+DIM_TTL = 600
+
+# Dimensão -> tabela de origem (cada uma vira um snapshot "dim_<dimensão>" no cache em disco)
+TABELAS_DIMENSOES = {
+    "variaveis": "tab_app_variaveis",
+    "estudos": "tab_app_estudos",
+    "usuarios": "tab_app_usuarios",
+    "produtos": "produtos",
+}
+
+COLUNAS_ESTUDOS = [
+    "id_estudo", "estudo", "cod_estudo", "disciplina", "coordenacao",
+    "resolucao_dias", "resolucao_modelo", "sn_ativo",
+]
+# ds_senha nunca é carregada aqui
+COLUNAS_USUARIOS = ["id_usuario", "nm_usuario", "nm_usuario_label", "sn_ativo"]
+COLUNAS_PRODUTOS = ["id", "nome", "estudo_id", "tipo_produto"]
+
+
+def parse_variaveis(valor_str: str) -> list:
+    """Parse de valores a partir de uma string - removendo aspas e normalizando."""
+    if not valor_str:
+        return []
+
+    valor_str = valor_str.strip('"').strip("'")
+
+    if ";" in valor_str:
+        valores = [v.strip() for v in valor_str.split(";") if v.strip()]
+    elif "\n" in valor_str:
+        valores = [v.strip() for v in valor_str.split("\n") if v.strip()]
+    elif "," in valor_str:
+        valores = [v.strip() for v in valor_str.split(",") if v.strip()]
+    else:
+        valores = [valor_str.strip()]
+
+    return valores
+
+
+@dataclass(frozen=True)
+class Dimensoes:
+    """Snapshot das dimensões. Não modificar: use os acessores abaixo (devolvem cópias)."""
+
+    variaveis: Mapping[str, tuple] = field(default_factory=dict)
+    estudos: pd.DataFrame = field(default_factory=pd.DataFrame)
+    usuarios: pd.DataFrame = field(default_factory=pd.DataFrame)
+    produtos: pd.DataFrame = field(default_factory=pd.DataFrame)
+    estudo_nome: Mapping[int, str] = field(default_factory=dict)
+    estudo_id: Mapping[str, int] = field(default_factory=dict)
+    usuario_nome: Mapping[int, str] = field(default_factory=dict)
+    usuario_id: Mapping[str, int] = field(default_factory=dict)
+    produto_nome: Mapping[int, str] = field(default_factory=dict)
+
+
+def _tipar(df: pd.DataFrame, colunas: list, pk: str, ordem: str) -> pd.DataFrame:
+    df = df.reindex(columns=colunas)
+    df = df[df[pk].notna()].copy()
+    df[pk] = df[pk].astype("int64")
+    if "sn_ativo" in df.columns:
+        df["sn_ativo"] = df["sn_ativo"].fillna(True).astype(bool)
+    return df.sort_values(ordem, na_position="last", kind="stable").reset_index(drop=True)
+
+
+def _mapa(df: pd.DataFrame, chave: str, valor: str) -> Mapping:
+    validos = df[df[chave].notna() & df[valor].notna()]
+    return MappingProxyType(dict(zip(validos[chave].tolist(), validos[valor].tolist())))
+
+
+def _buscar_dimensoes(_supabase) -> dict[str, pd.DataFrame]:
+    """As quatro tabelas em paralelo, como vieram do banco (tab_app_variaveis inteira numa consulta)."""
+    dados = carregar_em_paralelo({
+        "variaveis": lambda: supabase_execute(
+            lambda: _supabase.table("tab_app_variaveis").select("uso, valor").execute()
+        ),
+        "estudos": lambda: fetch_all(
+            lambda: _supabase.table("tab_app_estudos").select(", ".join(COLUNAS_ESTUDOS)).order("id_estudo")
+        ),
+        "usuarios": lambda: fetch_all(
+            lambda: _supabase.table("tab_app_usuarios").select(", ".join(COLUNAS_USUARIOS)).order("id_usuario")
+        ),
+        "produtos": lambda: fetch_all(
+            lambda: _supabase.table("produtos").select(", ".join(COLUNAS_PRODUTOS)).order("id")
+        ),
+    })
+    dados["variaveis"] = pd.DataFrame(dados["variaveis"].data or [], columns=["uso", "valor"])
+    return dados
+
+
+def _montar(dados: dict[str, pd.DataFrame]) -> Dimensoes:
+    variaveis = MappingProxyType({
+        r["uso"]: tuple(parse_variaveis(r.get("valor"))) for r in dados["variaveis"].to_dict("records")
+    })
+    df_estudos = _tipar(dados["estudos"], COLUNAS_ESTUDOS, "id_estudo", "estudo")
+    df_estudos = df_estudos.drop_duplicates(subset=["id_estudo"], keep="first")
+    df_usuarios = _tipar(dados["usuarios"], COLUNAS_USUARIOS, "id_usuario", "nm_usuario")
+    df_produtos = _tipar(dados["produtos"], COLUNAS_PRODUTOS, "id", "nome")
+
+    return Dimensoes(
+        variaveis=variaveis,
+        estudos=df_estudos,
+        usuarios=df_usuarios,
+        produtos=df_produtos,
+        estudo_nome=_mapa(df_estudos, "id_estudo", "estudo"),
+        estudo_id=_mapa(df_estudos, "estudo", "id_estudo"),
+        usuario_nome=_mapa(df_usuarios, "id_usuario", "nm_usuario"),
+        usuario_id=_mapa(df_usuarios, "nm_usuario", "id_usuario"),
+        produto_nome=_mapa(df_produtos, "id", "nome"),
+    )
+
+
+def _dimensoes_do_disco(max_idade: float = cache_disco.CACHE_DISCO_MAX_IDADE_S) -> tuple[dict[str, pd.DataFrame], float] | None:
+    """(frames, idade do mais velho em s) do cache em disco; None se faltar alguma dimensão."""
+    salvos = {nome: cache_disco.carregar(f"dim_{nome}", max_idade=max_idade) for nome in TABELAS_DIMENSOES}
+    if any(s is None for s in salvos.values()):
+        return None
+    return {nome: s[0] for nome, s in salvos.items()}, max(s[1]["idade_s"] for s in salvos.values())
+
+
+def _buscar_e_salvar(_supabase) -> dict[str, pd.DataFrame]:
+    """Busca no banco e só retorna depois de gravar o disco (os outros workers esperam por ele)."""
+    lido_em = time.time()
+    dados = _buscar_dimensoes(_supabase)
+    for nome, tabela in TABELAS_DIMENSOES.items():
+        gravacao = cache_disco.salvar(f"dim_{nome}", dados[nome], tabelas=(tabela,), lido_em=lido_em)
+        if gravacao is not None:
+            gravacao.result()
+    return dados
+
+
+def _buscar_uma_vez(_supabase, max_idade: float) -> dict[str, pd.DataFrame]:
+    """Entre os workers do host, um só busca; os outros leem o que ele gravou."""
+    def pronto():
+        salvo = _dimensoes_do_disco(max_idade)
+        return None if salvo is None else salvo[0]
+
+    return cache_disco.uma_vez("dimensoes", pronto, lambda: _buscar_e_salvar(_supabase))
+
+
+def _recarregar_em_segundo_plano(_supabase) -> None:
+    """Atualiza o disco (se nenhum outro worker já atualizou) e limpa o cache: a próxima chamada monta do disco."""
+    try:
+        _buscar_uma_vez(_supabase, DIM_TTL)
+        carregar_dimensoes.clear()
+    except Exception as e:
+        logger.warning(f"⚠️ Falha ao recarregar dimensões em segundo plano: {e}")
+
+
+@depende_de(*TABELAS_DIMENSOES.values())
+@st.cache_resource(ttl=DIM_TTL, show_spinner=False)
+def carregar_dimensoes(_supabase) -> Dimensoes:
+    """
+    Carrega todas as dimensões em paralelo, uma vez por processo (TTL DIM_TTL).
+    tab_app_variaveis vem inteira em uma única consulta, já com os valores parseados.
+
+    Parte do snapshot do cache em disco, compartilhado pelos workers do host; se
+    ele tiver mais de DIM_TTL s, é servido assim mesmo e recarregado em segundo plano.
+    """
+    salvo = _dimensoes_do_disco()
+    if salvo is None:
+        return _montar(_buscar_uma_vez(_supabase, DIM_TTL))
+
+    dados, idade = salvo
+    if idade >= DIM_TTL:
+        threading.Thread(
+            target=_recarregar_em_segundo_plano, args=(_supabase,), name="dimensoes-disco", daemon=True
+        ).start()
+    return _montar(dados)
+
+
+def limpar_cache_dimensoes() -> None:
+    """Força recarga das dimensões (chamar após gravar variáveis, estudos, usuários ou produtos)."""
+    carregar_dimensoes.clear()
+
+
+# ============================================================
+# Acessores (cópias — o snapshot é compartilhado entre sessões)
+# ============================================================
+def variavel(supabase, uso: str) -> list:
+    """Lista de valores de um 'uso' de tab_app_variaveis."""
+    return list(carregar_dimensoes(supabase).variaveis.get(uso, ()))
+
+
+def variaveis(supabase, usos: list) -> dict:
+    """{uso: [valores]} para os usos pedidos."""
+    todas = carregar_dimensoes(supabase).variaveis
+    return {uso: list(todas.get(uso, ())) for uso in usos}
+
+
+def estudos(supabase, colunas: list | None = None) -> pd.DataFrame:
+    """Estudos ordenados por nome (todas as colunas de COLUNAS_ESTUDOS ou só as pedidas)."""
+    df = carregar_dimensoes(supabase).estudos
+    return (df[colunas] if colunas else df).copy()
+
+
+def usuarios(supabase, colunas: list | None = None, apenas_ativos: bool = True) -> pd.DataFrame:
+    """Usuários ordenados por nm_usuario (sem ds_senha)."""
+    df = carregar_dimensoes(supabase).usuarios
+    if apenas_ativos:
+        df = df[df["sn_ativo"]]
+    return (df[colunas] if colunas else df).reset_index(drop=True).copy()
+
+
+def produtos(supabase, colunas: list | None = None, tipo_produto: str | None = None, estudo_id: int | None = None) -> pd.DataFrame:
+    """Produtos ordenados por nome, opcionalmente filtrados por tipo e estudo."""
+    df = carregar_dimensoes(supabase).produtos
+    if tipo_produto is not None:
+        df = df[df["tipo_produto"] == tipo_produto]
+    if estudo_id is not None:
+        df = df[df["estudo_id"] == estudo_id]
+    return (df[colunas] if colunas else df).reset_index(drop=True).copy()
@@ -0,0 +1,74 @@
+# ============================================================
+# 💊 frontend/farmacia_saldos.py
+# Saldos da farmácia por (estudo, produto, lote, validade), mantidos pelo banco:
+# trigger em tab_app_farmacia_movimentacoes (ver supabase_schema.sql)
+# ============================================================
+from datetime import date
+
+import pandas as pd
+
+from frontend.supabase_client import supabase_execute, fetch_all, depende_de, cache_swr
+
+
+TABLE_MOVS   = "tab_app_farmacia_movimentacoes"
+TABLE_SALDOS = "tab_app_farmacia_saldos"
+
+COLUNAS_SALDOS = ["estudo_id", "produto_id", "lote", "validade", "entradas", "saidas", "saldo"]
+
+
+def obter_saldo(supabase, estudo_id: int, produto_id: int, validade=None, lote=None) -> int:
+    """
+    Saldo atual (entradas - saídas) lido direto de tab_app_farmacia_saldos, sem cache.
+
+    Com os quatro campos é uma busca pela chave única; validade/lote vazios não
+    filtram (soma todos os lotes/validades do produto, como o cálculo antigo).
+    """
+    query = supabase.table(TABLE_SALDOS).select("saldo")
+
+    if estudo_id:
+        query = query.eq("estudo_id", estudo_id)
+    if produto_id:
+        query = query.eq("produto_id", produto_id)
+    if validade:
+        query = query.eq("validade", str(validade))
+    if lote:
+        query = query.eq("lote", lote)
+
+    resp = supabase_execute(lambda: query.execute())
+    return int(sum(float(r.get("saldo") or 0) for r in (resp.data or [])))
+
+
+@depende_de(TABLE_MOVS, TABLE_SALDOS)
+@cache_swr(ttl=600, disco="farmacia_saldos")
+def fetch_saldos(
+    _supabase,
+    produto_ids: tuple | None = None,
+    estudo_id: int | None = None,
+    apenas_nao_vencidos: bool = False,
+) -> pd.DataFrame:
+    """
+    Linhas de tab_app_farmacia_saldos (uma por estudo+produto+lote+validade com
+    alguma movimentação). lote vem como "" quando não informado; validade como
+    string ISO ou None. Quantidades já convertidas para int.
+    """
+    if produto_ids is not None and not produto_ids:
+        return pd.DataFrame(columns=COLUNAS_SALDOS)
+
+    def _query():
+        query = _supabase.table(TABLE_SALDOS).select(", ".join(COLUNAS_SALDOS))
+        if produto_ids is not None:
+            query = query.in_("produto_id", list(produto_ids))
+        if estudo_id is not None:
+            query = query.eq("estudo_id", estudo_id)
+        if apenas_nao_vencidos:
+            query = query.or_(f"validade.is.null,validade.gte.{date.today().isoformat()}")
+        return query.order("estudo_id").order("produto_id").order("lote").order("validade")
+
+    df = fetch_all(_query)
+    if df.empty:
+        return pd.DataFrame(columns=COLUNAS_SALDOS)
+
+    df["lote"] = df["lote"].fillna("")
+    for col in ["entradas", "saidas", "saldo"]:
+        df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0).round(0).astype(int)
+    return df[COLUNAS_SALDOS]
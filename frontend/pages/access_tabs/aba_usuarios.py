@@ -5,8 +5,9 @@
 import streamlit as st
 import pandas as pd
 import hashlib
-from frontend.supabase_client import get_supabase_client
+from frontend.supabase_client import get_supabase_client, invalidar_tabela
 from frontend.components.feedback import feedback
+from frontend import projecoes
 
 
 def hash_password(password: str) -> str:
@@ -20,8 +21,8 @@ def aba_usuarios(usuario_logado: str):
     try:
         supabase = get_supabase_client()
         
-        # Busca todos os usuários
-        response = supabase.table("tab_app_usuarios").select("*").execute()
+        # Busca todos os usuários (sem ds_senha)
+        response = supabase.table("tab_app_usuarios").select(projecoes.select("usuarios")).execute()
         df_usuarios = pd.DataFrame(response.data) if response.data else pd.DataFrame()
         
     except Exception as e:
@@ -103,6 +104,7 @@ def aba_usuarios(usuario_logado: str):
                         "tp_tema": "light"
                     }).execute()
                     
+                    invalidar_tabela("tab_app_usuarios")
                     feedback(f"✅ Usuário '{nm_usuario}' criado com sucesso!", "success", "🎉")
                     st.rerun()
                     
@@ -171,6 +173,7 @@ def aba_usuarios(usuario_logado: str):
                         
                         supabase.table("tab_app_usuarios").update(payload).eq("nm_usuario", usuario_sel).execute()
                         
+                        invalidar_tabela("tab_app_usuarios")
                         feedback(f"✅ Usuário '{usuario_sel}' atualizado!", "success", "💾")
                         st.rerun()
                         
@@ -0,0 +1,105 @@
+# ============================================================
+# 📊 frontend/pages/admin_consultas.py
+# Página oculta (fora do menu): métricas das consultas ao Supabase deste
+# processo — mais lentas, fetchers mais chamados e fan-out por página.
+# Acesso: ?pagina=consultas, para usuários em ADMIN_USUARIOS (ou em dev).
+# ============================================================
+import os
+
+import pandas as pd
+import streamlit as st
+
+from frontend.config import Config
+from frontend.supabase_client import metricas, limpar_metricas, estado_disjuntores, METRICAS_JSONL
+
+NOME_PAGINA = "Diagnóstico de Consultas"
+PARAMETRO = "consultas"
+
+ADMIN_USUARIOS = {u.strip() for u in os.getenv("ADMIN_USUARIOS", "").split(",") if u.strip()}
+
+
+def pode_acessar(usuario: str) -> bool:
+    """Usuários de ADMIN_USUARIOS; sem a variável, qualquer usuário em APP_ENV=dev."""
+    return usuario in ADMIN_USUARIOS if ADMIN_USUARIOS else Config.DEBUG
+
+
+def page_admin_consultas():
+    st.title("📊 Diagnóstico de Consultas")
+    st.caption(
+        "Registros deste processo (buffer em memória)"
+        + (f" · JSONL em `{METRICAS_JSONL}`" if METRICAS_JSONL else "")
+    )
+
+    col_a, col_b = st.columns([1, 5])
+    with col_a:
+        if st.button("🗑️ Limpar", use_container_width=True):
+            limpar_metricas()
+            st.rerun()
+    with col_b:
+        disjuntores = estado_disjuntores()
+        if disjuntores:
+            st.caption("Disjuntores: " + " · ".join(f"{k}: {v}" for k, v in disjuntores.items()))
+
+    df_consultas = metricas("consulta")
+    df_fetchers = metricas("fetcher")
+
+    if df_consultas.empty and df_fetchers.empty:
+        st.info("Nenhuma consulta registrada ainda.")
+        return
+
+    # =====================================================
+    # 🐢 CONSULTAS MAIS LENTAS
+    # =====================================================
+    st.markdown("### 🐢 Consultas mais lentas")
+    if not df_consultas.empty:
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("Consultas", len(df_consultas))
+        c2.metric("p50 (ms)", f"{df_consultas['ms'].quantile(0.5):.0f}")
+        c3.metric("p95 (ms)", f"{df_consultas['ms'].quantile(0.95):.0f}")
+        c4.metric("MB recebidos", f"{df_consultas['bytes'].sum() / 1e6:.1f}")
+
+        st.dataframe(
+            df_consultas.sort_values("ms", ascending=False).head(50)[
+                ["ts", "pagina", "fetcher", "tabela", "ms", "linhas", "bytes", "retries", "erro"]
+            ],
+            use_container_width=True,
+            hide_index=True,
+        )
+
+        st.markdown("#### Por tabela")
+        por_tabela = (
+            df_consultas.groupby(df_consultas["tabela"].fillna("?"))
+            .agg(consultas=("ms", "size"), ms_total=("ms", "sum"), ms_p95=("ms", lambda s: s.quantile(0.95)),
+                 linhas=("linhas", "sum"), bytes=("bytes", "sum"), retries=("retries", "sum"))
+            .sort_values("ms_total", ascending=False)
+        )
+        st.dataframe(por_tabela, use_container_width=True)
+
+    # =====================================================
+    # 🔥 FETCHERS MAIS CHAMADOS
+    # =====================================================
+    st.markdown("### 🔥 Fetchers mais chamados")
+    if not df_fetchers.empty:
+        cache = pd.crosstab(df_fetchers["fetcher"], df_fetchers["cache"])
+        resumo = (
+            df_fetchers.groupby("fetcher")
+            .agg(chamadas=("ms", "size"), ms_total=("ms", "sum"), ms_medio=("ms", "mean"), consultas=("consultas", "sum"))
+            .join(cache)
+            .sort_values("chamadas", ascending=False)
+        )
+        if "hit" in resumo.columns:
+            resumo["taxa_hit"] = (resumo["hit"] / resumo["chamadas"]).round(2)
+        st.dataframe(resumo, use_container_width=True)
+
+    # =====================================================
+    # 🌐 FAN-OUT POR PÁGINA
+    # =====================================================
+    st.markdown("### 🌐 Fan-out por página")
+    if not df_consultas.empty:
+        fanout = (
+            df_consultas.groupby(df_consultas["pagina"].fillna("(fora de página)"))
+            .agg(consultas=("ms", "size"), tabelas=("tabela", "nunique"), fetchers=("fetcher", "nunique"),
+                 ms_total=("ms", "sum"), bytes=("bytes", "sum"))
+            .sort_values("consultas", ascending=False)
+        )
+        st.dataframe(fanout, use_container_width=True)
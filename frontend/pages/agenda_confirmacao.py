@@ -3,78 +3,30 @@
 # Confirmação de Agendamentos
 # ============================================================
 import streamlit as st
-import pandas as pd
-from datetime import date
 from st_aggrid import AgGrid, GridOptionsBuilder, GridUpdateMode
 
-from frontend.supabase_client import get_supabase_client, supabase_execute, registrar_log_agendamento
+from frontend.supabase_client import get_supabase_client
+from frontend.agenda_store import FiltroAgenda, consultar_agendamentos
+from frontend import dimensoes_cache as dim
+from frontend import tipos
 from frontend.components.feedback import feedback
-
-
-def parse_variaveis(valor_str: str) -> list:
-    """Parse de valores a partir de uma string - removendo aspas e normalizando."""
-    if not valor_str:
-        return []
-
-    valor_str = valor_str.strip('"').strip("'")
-
-    if ";" in valor_str:
-        valores = [v.strip() for v in valor_str.split(";") if v.strip()]
-    elif "\n" in valor_str:
-        valores = [v.strip() for v in valor_str.split("\n") if v.strip()]
-    elif "," in valor_str:
-        valores = [v.strip() for v in valor_str.split(",") if v.strip()]
-    else:
-        valores = [valor_str.strip()]
-
-    return valores
+from backend.api.workflows import confirmar_agendamento
 
 
 # ============================================================
 # CACHED DATA FETCHING — evita reconexões em reruns de filtro
 # ============================================================
 
-@st.cache_data(ttl=600, show_spinner=False)
 def _fetch_status_confirmacao(_supabase):
-    resp = supabase_execute(
-        lambda: _supabase.table("tab_app_variaveis")
-        .select("valor")
-        .eq("uso", "status_confirmacao")
-        .execute()
-    )
-    return parse_variaveis(resp.data[0]["valor"]) if resp.data else []
+    return dim.variavel(_supabase, "status_confirmacao")
 
 
-@st.cache_data(ttl=120, show_spinner=False)
 def _fetch_estudos(_supabase):
-    resp = supabase_execute(
-        lambda: _supabase.table("tab_app_estudos")
-        .select("id_estudo, estudo")
-        .execute()
-    )
-    df = pd.DataFrame(resp.data) if resp.data else pd.DataFrame()
-    if not df.empty:
-        df.columns = [c.lower() for c in df.columns]
-    return df
-
-
-@st.cache_data(ttl=60, show_spinner=False)
-def _fetch_agendamentos(_supabase):
-    resp = supabase_execute(
-        lambda: _supabase.table("tab_app_agendamentos")
-        .select("*")
-        .order("data_visita", desc=True)
-        .limit(500)
-        .execute()
-    )
-    df = pd.DataFrame(resp.data) if resp.data else pd.DataFrame()
-    if not df.empty:
-        df.columns = [c.lower() for c in df.columns]
-    return df
-
-
-def _invalidar_cache():
-    _fetch_agendamentos.clear()
+    return dim.estudos(_supabase, ["id_estudo", "estudo"])
+
+
+def _fetch_agendamentos(_supabase, filtro: FiltroAgenda):
+    return consultar_agendamentos(_supabase, filtro, desc=True)
 
 
 def page_agenda_confirmacao():
@@ -111,16 +63,23 @@ def page_agenda_confirmacao():
                 "Status Confirmação", ["(Todos)"] + status_confirmacao_list, index=0
             )
 
-        # ✅ BUSCAR AGENDAMENTOS (cacheado 1 min)
-        df_agendamentos = _fetch_agendamentos(supabase)
+        # ✅ BUSCAR SÓ OS AGENDAMENTOS DOS FILTROS (sem corte nos 500 mais recentes)
+        filtro = FiltroAgenda.criar(
+            estudo_ids=None if estudo_sel == "(Todos)" else df_estudos.loc[df_estudos["estudo"] == estudo_sel, "id_estudo"],
+            data_ini=dt_ini if dt_ini and dt_fim else None,
+            data_fim=dt_fim if dt_ini and dt_fim else None,
+            status=None if status_sel == "(Todos)" else status_sel,
+        )
+        df_view = _fetch_agendamentos(supabase, filtro)
 
-        if df_agendamentos.empty:
-            st.warning("Nenhum agendamento encontrado.")
+        if df_view.empty:
+            st.info("Nenhum agendamento encontrado com os filtros aplicados.")
+            st.session_state.pop("_conf_selected_id", None)
             st.stop()
 
         # Merge com estudos
         if not df_estudos.empty:
-            df_agendamentos = df_agendamentos.merge(
+            df_view = df_view.merge(
                 df_estudos,
                 left_on="estudo_id",
                 right_on="id_estudo",
@@ -129,28 +88,8 @@ def page_agenda_confirmacao():
             ).rename(columns={"estudo": "nm_estudo"})
 
         # Converte datas
-        df_agendamentos["data_visita_dt"] = pd.to_datetime(df_agendamentos["data_visita"], errors="coerce")
-        df_agendamentos["data_visita_br"] = df_agendamentos["data_visita_dt"].dt.strftime("%d/%m/%Y")
-
-        # Aplicar filtros
-        df_view = df_agendamentos.copy()
-
-        if estudo_sel != "(Todos)":
-            df_view = df_view[df_view["nm_estudo"] == estudo_sel]
-
-        if dt_ini and dt_fim:
-            df_view = df_view[
-                (df_view["data_visita_dt"] >= pd.to_datetime(dt_ini)) &
-                (df_view["data_visita_dt"] <= pd.to_datetime(dt_fim))
-            ]
-
-        if status_sel != "(Todos)":
-            df_view = df_view[df_view["status_confirmacao"] == status_sel]
-
-        if df_view.empty:
-            st.info("Nenhum agendamento encontrado com os filtros aplicados.")
-            st.session_state.pop("_conf_selected_id", None)
-            st.stop()
+        df_view["data_visita_dt"] = tipos.data(df_view, "data_visita")
+        df_view["data_visita_br"] = df_view["data_visita_dt"].dt.strftime("%d/%m/%Y")
 
         # =====================================================
         # TABELA COM AGGRID PARA SELEÇÃO
@@ -283,56 +222,20 @@ def page_agenda_confirmacao():
                     feedback("⚠️ Informe a nova data para o reagendamento", "error", "⚠️")
                 else:
                     try:
-                        ag_id = agendamento_id
-                        ns = novo_status
-                        status_anterior = agendamento_data.get("status_confirmacao")
-                        usuario_id_conf = st.session_state.get("id_usuario")
-
-                        supabase_execute(
-                            lambda: supabase.table("tab_app_agendamentos")
-                            .update({"status_confirmacao": ns})
-                            .eq("id", ag_id)
-                            .execute()
-                        )
-                        registrar_log_agendamento(
-                            supabase, ag_id, usuario_id_conf, usuario_logado,
-                            "status_confirmacao", status_anterior, ns
+                        # Status + log (+ cópia reagendada e seu log) numa só transação
+                        confirmar_agendamento(
+                            supabase, agendamento_id, novo_status,
+                            usuario_id=st.session_state.get("id_usuario"),
+                            usuario_nome=usuario_logado,
+                            nova_data=nova_data_visita if novo_status == "Reagendado" else None,
+                            novo_horario=novo_horario if novo_status == "Reagendado" else None,
                         )
 
                         if novo_status == "Reagendado":
-                            resp_original = supabase_execute(
-                                lambda: supabase.table("tab_app_agendamentos")
-                                .select("*")
-                                .eq("id", ag_id)
-                                .execute()
-                            )
-
-                            if resp_original.data:
-                                novo_ag = dict(resp_original.data[0])
-                                novo_ag.pop("id", None)
-                                novo_ag.pop("data_cadastro", None)
-                                novo_ag["data_visita"] = str(nova_data_visita)
-                                novo_ag["hora_consulta"] = novo_horario.strftime("%H:%M") if novo_horario else None
-                                novo_ag["status_confirmacao"] = None
-
-                                payload = novo_ag
-                                resp_reag = supabase_execute(
-                                    lambda: supabase.table("tab_app_agendamentos")
-                                    .insert(payload)
-                                    .execute()
-                                )
-                                novo_id_reag = resp_reag.data[0]["id"] if resp_reag.data else None
-                                if novo_id_reag:
-                                    registrar_log_agendamento(
-                                        supabase, novo_id_reag, usuario_id_conf, usuario_logado,
-                                        "reagendamento", str(agendamento_data.get("data_visita", "")), str(nova_data_visita)
-                                    )
-
                             msg_ok = "✅ Status atualizado e novo agendamento criado com sucesso!"
                         else:
                             msg_ok = "✅ Status atualizado com sucesso!"
 
-                        _invalidar_cache()
                         st.session_state["_confirmacao_feedback"] = (msg_ok, "success")
                         st.rerun()
 
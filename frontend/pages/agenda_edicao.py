@@ -7,34 +7,23 @@ import pandas as pd
 from datetime import datetime, timezone
 from st_aggrid import AgGrid, GridOptionsBuilder, GridUpdateMode
 
-from frontend.supabase_client import get_supabase_client, supabase_execute, registrar_log_agendamento
+from frontend.supabase_client import (
+    get_supabase_client, supabase_execute, LogAlteracoes, avisar_truncamento, depende_de,
+)
+from frontend.agenda_store import agenda_store, consultar_agendamentos
+from frontend import dimensoes_cache as dim
+from frontend import projecoes
+from frontend import tipos
 from frontend.components.feedback import feedback
-
-
-def parse_variaveis(valor_str: str) -> list:
-    """Parse de valores a partir de uma string - removendo aspas e normalizando."""
-    if not valor_str:
-        return []
-
-    valor_str = valor_str.strip('"').strip("'")
-
-    if ";" in valor_str:
-        valores = [v.strip() for v in valor_str.split(";") if v.strip()]
-    elif "\n" in valor_str:
-        valores = [v.strip() for v in valor_str.split("\n") if v.strip()]
-    elif "," in valor_str:
-        valores = [v.strip() for v in valor_str.split(",") if v.strip()]
-    else:
-        valores = [valor_str.strip()]
-
-    return valores
+from backend.api.workflows import excluir_agendamento
 
 
 # ============================================================
 # CACHED DATA FETCHING — evita reconexões em reruns de filtro
 # ============================================================
 
-@st.cache_data(ttl=300, show_spinner=False)
+@depende_de("tab_app_usuarios")
+@st.cache_data(ttl=600, show_spinner=False)
 def _fetch_usuario_id(_supabase, usuario_logado: str):
     resp = supabase_execute(
         lambda: _supabase.table("tab_app_usuarios")
@@ -45,7 +34,8 @@ def _fetch_usuario_id(_supabase, usuario_logado: str):
     return resp.data[0]["id_usuario"] if resp.data else None
 
 
-@st.cache_data(ttl=60, show_spinner=False)
+@depende_de("tab_app_usuario_vinculo")
+@st.cache_data(ttl=600, show_spinner=False)
 def _fetch_coordenacoes(_supabase, usuario_id):
     resp = supabase_execute(
         lambda: _supabase.table("tab_app_usuario_vinculo")
@@ -58,63 +48,22 @@ def _fetch_coordenacoes(_supabase, usuario_id):
     return [c["vinculo"] for c in resp.data] if resp.data else []
 
 
-@st.cache_data(ttl=600, show_spinner=False)
 def _fetch_variaveis(_supabase):
-    usos = ["tipo_visita", "medico_responsavel", "consultorio", "jejum", "reembolso", "visita"]
-    result = {}
-    for uso in usos:
-        resp = supabase_execute(
-            lambda uso=uso: _supabase.table("tab_app_variaveis")
-            .select("valor")
-            .eq("uso", uso)
-            .execute()
-        )
-        result[uso] = parse_variaveis(resp.data[0]["valor"]) if resp.data else []
-    return result
+    return dim.variaveis(
+        _supabase, ["tipo_visita", "medico_responsavel", "consultorio", "jejum", "reembolso", "visita"]
+    )
 
 
-@st.cache_data(ttl=120, show_spinner=False)
 def _fetch_estudos(_supabase):
-    resp = supabase_execute(
-        lambda: _supabase.table("tab_app_estudos")
-        .select("id_estudo, estudo, coordenacao")
-        .execute()
-    )
-    df = pd.DataFrame(resp.data) if resp.data else pd.DataFrame()
-    if not df.empty:
-        df.columns = [c.lower() for c in df.columns]
-        df = df.drop_duplicates(subset=["id_estudo"], keep="first")
-    return df
+    return dim.estudos(_supabase, ["id_estudo", "estudo", "coordenacao"])
 
 
-@st.cache_data(ttl=300, show_spinner=False)
 def _fetch_usuarios(_supabase):
-    resp = supabase_execute(
-        lambda: _supabase.table("tab_app_usuarios")
-        .select("nm_usuario")
-        .eq("sn_ativo", True)
-        .execute()
-    )
-    return sorted([u["nm_usuario"] for u in resp.data]) if resp.data else []
+    return dim.usuarios(_supabase, ["nm_usuario"])["nm_usuario"].tolist()
 
 
-@st.cache_data(ttl=60, show_spinner=False)
 def _fetch_agendamentos(_supabase):
-    resp = supabase_execute(
-        lambda: _supabase.table("tab_app_agendamentos")
-        .select("*")
-        .order("data_visita", desc=False)
-        .limit(5000)
-        .execute()
-    )
-    df = pd.DataFrame(resp.data) if resp.data else pd.DataFrame()
-    if not df.empty:
-        df.columns = [c.lower() for c in df.columns]
-    return df
-
-
-def _invalidar_cache():
-    _fetch_agendamentos.clear()
+    return consultar_agendamentos(_supabase, colunas=projecoes.colunas("agenda_edicao"), limit=5000)
 
 
 def page_agenda_edicao():
@@ -157,6 +106,7 @@ def page_agenda_edicao():
         if df_agendamentos.empty:
             st.warning("Nenhum agendamento encontrado.")
             st.stop()
+        avisar_truncamento(df_agendamentos)
 
         # Merge com estudos
         if not df_estudos.empty:
@@ -169,7 +119,7 @@ def page_agenda_edicao():
             ).rename(columns={"estudo": "nm_estudo"})
 
         # Converte datas
-        df_agendamentos["data_visita_dt"] = pd.to_datetime(df_agendamentos["data_visita"], errors="coerce")
+        df_agendamentos["data_visita_dt"] = tipos.data(df_agendamentos, "data_visita")
         df_agendamentos["data_visita_br"] = df_agendamentos["data_visita_dt"].dt.strftime("%d/%m/%Y")
 
         # Filtrar por coordenação
@@ -480,12 +430,10 @@ def page_agenda_edicao():
                                     .eq("id", agendamento_id)
                                     .execute()
                                 )
-                                for campo, novo_valor in payload.items():
-                                    registrar_log_agendamento(
-                                        supabase, agendamento_id, usuario_id, usuario_logado,
-                                        campo, valores_anteriores.get(campo), novo_valor
-                                    )
-                                _invalidar_cache()
+                                # Um insert com o log de todos os campos alterados
+                                logs = LogAlteracoes(supabase, usuario_id, usuario_logado)
+                                logs.campos(agendamento_id, payload, valores_anteriores)
+                                logs.gravar()
                                 feedback("✅ Agendamento atualizado com sucesso!", "success", "💾")
                                 st.rerun()
                             except Exception as e:
@@ -514,25 +462,9 @@ def page_agenda_edicao():
                         key=f"btn_conf_del_{agendamento_id}",
                     ):
                         try:
-                            supabase_execute(
-                                lambda: supabase.table("tab_app_log_etapas")
-                                .delete()
-                                .eq("agendamento_id", agendamento_id)
-                                .execute()
-                            )
-                            supabase_execute(
-                                lambda: supabase.table("tab_app_log_agendamentos")
-                                .delete()
-                                .eq("agendamento_id", agendamento_id)
-                                .execute()
-                            )
-                            supabase_execute(
-                                lambda: supabase.table("tab_app_agendamentos")
-                                .delete()
-                                .eq("id", agendamento_id)
-                                .execute()
-                            )
-                            _invalidar_cache()
+                            # Logs de etapas, logs de alteração e o agendamento: tudo ou nada
+                            excluir_agendamento(supabase, agendamento_id)
+                            agenda_store().remover([agendamento_id])
                             st.session_state.pop("_edicao_selected_id", None)
                             st.session_state[f"confirmar_delecao_{agendamento_id}"] = False
                             feedback("✅ Agendamento deletado com sucesso!", "success", "🗑️")
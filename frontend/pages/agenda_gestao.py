@@ -5,55 +5,19 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime, timezone
-from st_aggrid import AgGrid, GridOptionsBuilder, GridUpdateMode, JsCode
-
-from frontend.supabase_client import get_supabase_client, supabase_execute, registrar_log_agendamento
+from st_aggrid import GridUpdateMode, JsCode
+
+from frontend.supabase_client import (
+    get_supabase_client, supabase_execute, LogAlteracoes,
+    fetch_in, carregar_em_paralelo, depende_de, cache_swr,
+)
+from frontend.agenda_store import FiltroAgenda, consultar_agendamentos
+from backend.engines.etapas import calcular_etapas, pivot_ultimo_status
+from frontend import dimensoes_cache as dim
+from frontend import projecoes
+from frontend import tipos
 from frontend.components.feedback import feedback
-
-
-# ============================================================
-# FUNÇÕES AUXILIARES
-# ============================================================
-def parse_ts_utc(val):
-    """Converte qualquer string para Timestamp com tz=UTC ou None."""
-    if val is None or (isinstance(val, float) and pd.isna(val)):
-        return None
-    ts = pd.to_datetime(val, errors="coerce", utc=True)
-    if pd.isna(ts):
-        return None
-    return ts
-
-
-def ensure_utc(ts):
-    """Garante tz=UTC (tz-aware)."""
-    if ts is None:
-        return None
-    if not isinstance(ts, pd.Timestamp):
-        ts = pd.to_datetime(ts, errors="coerce")
-    if ts is None or pd.isna(ts):
-        return None
-    if ts.tzinfo is None:
-        return ts.tz_localize("UTC")
-    return ts.tz_convert("UTC")
-
-
-def parse_variaveis(valor_str: str) -> list:
-    """Parse de valores a partir de uma string - removendo aspas e normalizando."""
-    if not valor_str:
-        return []
-
-    valor_str = valor_str.strip('"').strip("'")
-
-    if ";" in valor_str:
-        valores = [v.strip() for v in valor_str.split(";") if v.strip()]
-    elif "\n" in valor_str:
-        valores = [v.strip() for v in valor_str.split("\n") if v.strip()]
-    elif "," in valor_str:
-        valores = [v.strip() for v in valor_str.split(",") if v.strip()]
-    else:
-        valores = [valor_str.strip()]
-
-    return valores
+from frontend.components.grid import grid_paginado
 
 
 # ============================================================
@@ -82,7 +46,8 @@ ETAPAS_NOMES = {
 # CACHED DATA FETCHING — evita reconexões em reruns de filtro
 # ============================================================
 
-@st.cache_data(ttl=300, show_spinner=False)
+@depende_de("tab_app_usuarios")
+@st.cache_data(ttl=600, show_spinner=False)
 def _fetch_usuario_id(_supabase, usuario_logado: str):
     resp = supabase_execute(
         lambda: _supabase.table("tab_app_usuarios")
@@ -93,7 +58,8 @@ def _fetch_usuario_id(_supabase, usuario_logado: str):
     return resp.data[0]["id_usuario"] if resp.data else None
 
 
-@st.cache_data(ttl=60, show_spinner=False)
+@depende_de("tab_app_usuario_vinculo")
+@st.cache_data(ttl=600, show_spinner=False)
 def _fetch_coordenacoes(_supabase, usuario_id):
     resp = supabase_execute(
         lambda: _supabase.table("tab_app_usuario_vinculo")
@@ -106,71 +72,30 @@ def _fetch_coordenacoes(_supabase, usuario_id):
     return [c["vinculo"] for c in resp.data] if resp.data else []
 
 
-@st.cache_data(ttl=600, show_spinner=False)
 def _fetch_variaveis(_supabase):
-    usos = [
+    return dim.variaveis(_supabase, [
         "status_medico", "status_enfermagem", "status_farmacia",
         "status_espirometria", "status_nutricionista", "status_coordenacao",
         "desfecho_atendimento",
-    ]
-    result = {}
-    for uso in usos:
-        resp = supabase_execute(
-            lambda uso=uso: _supabase.table("tab_app_variaveis")
-            .select("valor")
-            .eq("uso", uso)
-            .execute()
-        )
-        result[uso] = parse_variaveis(resp.data[0]["valor"]) if resp.data else []
-    return result
+    ])
 
 
-@st.cache_data(ttl=120, show_spinner=False)
 def _fetch_estudos(_supabase):
-    resp = supabase_execute(
-        lambda: _supabase.table("tab_app_estudos")
-        .select("id_estudo, estudo, coordenacao")
-        .execute()
-    )
-    df = pd.DataFrame(resp.data) if resp.data else pd.DataFrame()
-    if not df.empty:
-        df.columns = [c.lower() for c in df.columns]
-        df = df.drop_duplicates(subset=["id_estudo"], keep="first")
-    return df
+    return dim.estudos(_supabase, ["id_estudo", "estudo", "coordenacao"])
 
 
-@st.cache_data(ttl=60, show_spinner=False)
-def _fetch_agendamentos(_supabase):
-    resp = supabase_execute(
-        lambda: _supabase.table("tab_app_agendamentos")
-        .select("*")
-        .order("data_visita", desc=False)
-        .limit(5000)
-        .execute()
-    )
-    df = pd.DataFrame(resp.data) if resp.data else pd.DataFrame()
-    if not df.empty:
-        df.columns = [c.lower() for c in df.columns]
-    return df
+def _fetch_agendamentos(_supabase, filtro: FiltroAgenda, colunas: list | None = None):
+    return consultar_agendamentos(_supabase, filtro, colunas=colunas or projecoes.colunas("agenda_gestao"))
 
 
-@st.cache_data(ttl=60, show_spinner=False)
+@depende_de("tab_app_log_etapas")
+@cache_swr(ttl=600)
 def _fetch_logs_etapas(_supabase, ag_ids: tuple):
-    if not ag_ids:
-        return []
-    resp = supabase_execute(
-        lambda: _supabase.table("tab_app_log_etapas")
-        .select("agendamento_id, nome_etapa, status_etapa, data_hora_etapa")
-        .in_("agendamento_id", list(ag_ids))
-        .execute()
+    return fetch_in(
+        _supabase, "tab_app_log_etapas", "agendamento_id", ag_ids,
+        "id, agendamento_id, nome_etapa, status_etapa, data_hora_etapa",
+        formato="csv",
     )
-    return resp.data if resp.data else []
-
-
-def _invalidar_cache_agendamentos():
-    """Limpa o cache das queries de agendamentos após uma gravação."""
-    _fetch_agendamentos.clear()
-    _fetch_logs_etapas.clear()
 
 
 # ============================================================
@@ -201,22 +126,32 @@ def page_agenda_gestao():
         supabase = get_supabase_client()
         usuario_logado = st.session_state.get("usuario_logado", "desconhecido")
 
-        # ✅ BUSCAR ID DO USUÁRIO (cacheado 5 min)
-        usuario_id = _fetch_usuario_id(supabase, usuario_logado)
+        # ✅ LEITURAS INICIAIS EM PARALELO (cada fetcher mantém seu cache)
+        def _usuario_e_coordenacoes():
+            uid = _fetch_usuario_id(supabase, usuario_logado)
+            return uid, (_fetch_coordenacoes(supabase, uid) if uid else [])
+
+        dados = carregar_em_paralelo({
+            "usuario": _usuario_e_coordenacoes,
+            "variaveis": lambda: _fetch_variaveis(supabase),
+            "estudos": lambda: _fetch_estudos(supabase),
+        })
+
+        # ✅ ID DO USUÁRIO (cacheado 5 min)
+        usuario_id, coordenacoes_usuario = dados["usuario"]
         if not usuario_id:
             st.error("❌ Usuário não encontrado no sistema")
             st.stop()
 
-        # ✅ BUSCAR COORDENAÇÕES (cacheado 5 min)
-        coordenacoes_usuario = _fetch_coordenacoes(supabase, usuario_id)
+        # ✅ COORDENAÇÕES (cacheado 1 min)
         if not coordenacoes_usuario:
             st.warning("⚠️ Você não está vinculado a nenhuma coordenação. Solicite à gerência.")
             st.stop()
 
         st.caption(f"👤 Coordenações: {', '.join(coordenacoes_usuario)}")
 
-        # ✅ BUSCAR VARIÁVEIS (cacheado 10 min)
-        variaveis = _fetch_variaveis(supabase)
+        # ✅ VARIÁVEIS (cacheado 10 min)
+        variaveis = dados["variaveis"]
         status_medico_list = variaveis["status_medico"]
         status_enfermagem_list = variaveis["status_enfermagem"]
         status_farmacia_list = variaveis["status_farmacia"]
@@ -225,66 +160,41 @@ def page_agenda_gestao():
         status_coordenacao_list = variaveis["status_coordenacao"]
         desfecho_list = variaveis["desfecho_atendimento"]
 
-        # ✅ BUSCAR ESTUDOS (cacheado 2 min)
-        df_estudos = _fetch_estudos(supabase)
-
-        # ✅ BUSCAR AGENDAMENTOS (cacheado 1 min)
-        df_agendamentos = _fetch_agendamentos(supabase)
-
-        if df_agendamentos.empty:
-            st.warning("Nenhum agendamento encontrado.")
-            st.stop()
-
-        # Merge com estudos
-        if not df_estudos.empty and "estudo_id" in df_agendamentos.columns:
-            df_agendamentos = df_agendamentos.merge(
-                df_estudos,
-                left_on="estudo_id",
-                right_on="id_estudo",
-                how="left",
-                suffixes=("", "_est"),
-            ).rename(columns={"estudo": "nm_estudo"})
-            df_agendamentos.columns = [c.lower() for c in df_agendamentos.columns]
-
-        # Converte datas
-        df_agendamentos["data_visita_dt"] = pd.to_datetime(df_agendamentos.get("data_visita"), errors="coerce")
-        df_agendamentos["data_visita_br"] = df_agendamentos["data_visita_dt"].dt.strftime("%d/%m/%Y")
+        # ✅ ESTUDOS (cacheado 2 min)
+        df_estudos = dados["estudos"]
+        estudo_nome = dict(zip(df_estudos["id_estudo"], df_estudos["estudo"])) if not df_estudos.empty else {}
 
         # =====================================================
-        # FILTRAR POR COORDENAÇÃO DO USUÁRIO
+        # FILTROS (aplicados no AgendaStore, não no DataFrame)
         # =====================================================
-        if "coordenacao" in df_agendamentos.columns:
-            df_view = df_agendamentos[df_agendamentos["coordenacao"].isin(coordenacoes_usuario)].copy()
-        else:
-            df_view = df_agendamentos.copy()
+        # Opções a partir dos agendamentos das coordenações do usuário (só 2 colunas)
+        filtro_coord = FiltroAgenda.criar(coordenacoes=coordenacoes_usuario)
+        df_opcoes = _fetch_agendamentos(supabase, filtro_coord, colunas=["estudo_id", "status_confirmacao"])
 
-        # =====================================================
-        # FILTROS
-        # =====================================================
         st.markdown("### 🔍 Filtros")
 
         fc1, fc2, fc3 = st.columns(3)
 
         with fc1:
-            estudos_vinculados = sorted([x for x in df_view.get("nm_estudo", pd.Series(dtype=str)).unique() if x])
+            estudos_vinculados = sorted({
+                estudo_nome[e] for e in df_opcoes["estudo_id"].dropna().unique() if estudo_nome.get(e)
+            })
             estudo_sel = st.selectbox("Estudo", ["(Todos)"] + estudos_vinculados, index=0)
 
         with fc2:
-            status_unicos = sorted([x for x in df_view.get("status_confirmacao", pd.Series(dtype=str)).dropna().unique() if x])
+            status_unicos = sorted([x for x in df_opcoes["status_confirmacao"].dropna().unique() if x])
             status_sel = st.selectbox("Status Confirmação", ["(Todos)"] + status_unicos, index=0)
 
         with fc3:
             dt_sel = st.date_input("Data", format="DD/MM/YYYY")
 
-        # Aplicar filtros
-        if estudo_sel != "(Todos)" and "nm_estudo" in df_view.columns:
-            df_view = df_view[df_view["nm_estudo"] == estudo_sel]
-
-        if status_sel != "(Todos)" and "status_confirmacao" in df_view.columns:
-            df_view = df_view[df_view["status_confirmacao"] == status_sel]
-
-        if dt_sel:
-            df_view = df_view[df_view["data_visita_dt"].dt.date == dt_sel]
+        filtro = FiltroAgenda.criar(
+            coordenacoes=coordenacoes_usuario,
+            estudo_ids=None if estudo_sel == "(Todos)" else [i for i, n in estudo_nome.items() if n == estudo_sel],
+            status=None if status_sel == "(Todos)" else status_sel,
+            data=dt_sel or None,
+        )
+        df_view = _fetch_agendamentos(supabase, filtro)
 
         if df_view.empty:
             st.warning("⚠️ Nenhum agendamento encontrado para sua coordenação com os filtros aplicados.")
@@ -292,48 +202,39 @@ def page_agenda_gestao():
             st.session_state.pop("_agenda_selected_id", None)
             st.stop()
 
+        # Merge com estudos
+        if not df_estudos.empty and "estudo_id" in df_view.columns:
+            df_view = df_view.merge(
+                df_estudos,
+                left_on="estudo_id",
+                right_on="id_estudo",
+                how="left",
+                suffixes=("", "_est"),
+            ).rename(columns={"estudo": "nm_estudo"})
+            df_view.columns = [c.lower() for c in df_view.columns]
+
+        # Converte datas
+        df_view["data_visita_dt"] = tipos.data(df_view, "data_visita")
+        df_view["data_visita_br"] = df_view["data_visita_dt"].dt.strftime("%d/%m/%Y")
+
         st.success(f"✅ {len(df_view)} agendamento(s) encontrado(s)")
 
         # =====================================================
         # BUSCAR LOGS E PROCESSAR ÚLTIMO STATUS (cacheado)
         # =====================================================
         ag_ids = tuple(df_view["id"].tolist())
-        logs_all = _fetch_logs_etapas(supabase, ag_ids)
-        df_logs = pd.DataFrame(logs_all)
-
-        if not df_logs.empty:
-            df_logs.columns = [c.lower() for c in df_logs.columns]
-            df_logs["ts"] = df_logs["data_hora_etapa"].apply(parse_ts_utc)
-            df_logs = df_logs.dropna(subset=["ts"])
-
-            if not df_logs.empty:
-                df_logs_sorted = df_logs.sort_values(["agendamento_id", "nome_etapa", "ts"])
-
-                last_status = (
-                    df_logs_sorted.groupby(["agendamento_id", "nome_etapa"])["status_etapa"]
-                    .last()
-                    .reset_index()
-                    .rename(columns={"status_etapa": "ultimo_status"})
-                )
-
-                pivot_last = (
-                    last_status.pivot_table(
-                        index="agendamento_id",
-                        columns="nome_etapa",
-                        values="ultimo_status",
-                        aggfunc="last",
-                    )
-                    .reindex(columns=ETAPAS_TEMPO)
-                    .reset_index()
-                )
+        df_etapas = calcular_etapas(_fetch_logs_etapas(supabase, ag_ids))
 
-                for etapa in ETAPAS_TEMPO:
-                    if etapa in pivot_last.columns:
-                        pivot_last.rename(columns={etapa: ETAPAS_NOMES[etapa]}, inplace=True)
+        if not df_etapas.empty:
+            pivot_last = (
+                pivot_ultimo_status(df_etapas, ETAPAS_TEMPO)
+                .rename(columns=ETAPAS_NOMES)
+                .reset_index()
+            )
 
-                df_view = df_view.merge(pivot_last, left_on="id", right_on="agendamento_id", how="left")
-                if "agendamento_id" in df_view.columns:
-                    df_view = df_view.drop(columns=["agendamento_id"])
+            df_view = df_view.merge(pivot_last, left_on="id", right_on="agendamento_id", how="left")
+            if "agendamento_id" in df_view.columns:
+                df_view = df_view.drop(columns=["agendamento_id"])
 
         for etapa in ETAPAS_TEMPO:
             col_name = ETAPAS_NOMES[etapa]
@@ -349,7 +250,7 @@ def page_agenda_gestao():
         st.caption(f"**Total:** {len(df_view)} agendamentos")
 
         cols_display = [
-            "id", "data_visita_br", "hora_consulta", "nm_estudo", "id_paciente", "nome_paciente",
+            "id", "data_visita_dt", "hora_consulta", "nm_estudo", "id_paciente", "nome_paciente",
             "hora_chegada", "tipo_visita", "visita", "medico_responsavel", "status_confirmacao",
             "valor_financeiro", "desfecho_atendimento",
             "Médico", "Enfermagem", "Espirometria", "Farmácia", "Nutricionista", "Coordenação"
@@ -357,7 +258,7 @@ def page_agenda_gestao():
 
         cols_rename = {
             "id": "ID",
-            "data_visita_br": "Data",
+            "data_visita_dt": "Data",
             "hora_consulta": "Hora Consulta",
             "nm_estudo": "Estudo",
             "id_paciente": "ID Paciente",
@@ -374,41 +275,18 @@ def page_agenda_gestao():
         if not cols_existentes:
             cols_existentes = [c for c in df_view.columns if c not in ("data_visita_dt", "data_visita")]
             cols_rename = {}
-        df_grid = df_view[cols_existentes].copy()
-        if "hora_consulta" in df_grid.columns:
-            df_grid = df_grid.sort_values("hora_consulta", ascending=True, na_position="last")
-        df_grid.rename(columns=cols_rename, inplace=True)
+        df_grid = df_view[cols_existentes].rename(columns=cols_rename)
 
         # =====================================================
-        # CONFIGURAR AGGRID
+        # CONFIGURAR AGGRID (paginado no servidor)
         # =====================================================
-        gb = GridOptionsBuilder.from_dataframe(df_grid)
-        gb.configure_selection(selection_mode="single", use_checkbox=False)
-
-        if "ID" in df_grid.columns:
-            gb.configure_column("ID", width=50)
-        if "Data" in df_grid.columns:
-            gb.configure_column("Data", width=80)
-        if "Hora Consulta" in df_grid.columns:
-            gb.configure_column("Hora Consulta", width=100)
-        if "Estudo" in df_grid.columns:
-            gb.configure_column("Estudo", width=120)
-        if "ID Paciente" in df_grid.columns:
-            gb.configure_column("ID Paciente", width=90)
-        if "Paciente" in df_grid.columns:
-            gb.configure_column("Paciente", width=150)
-        if "Hora Chegada" in df_grid.columns:
-            gb.configure_column("Hora Chegada", width=100)
-        if "Tipo Visita" in df_grid.columns:
-            gb.configure_column("Tipo Visita", width=90)
-        if "Visita" in df_grid.columns:
-            gb.configure_column("Visita", width=80)
-        if "Médico Resp." in df_grid.columns:
-            gb.configure_column("Médico Resp.", width=130)
-        if "Status" in df_grid.columns:
-            gb.configure_column("Status", width=150)
-        if "Valor Reembolso" in df_grid.columns:
-            gb.configure_column("Valor Reembolso", width=120)
+        larguras = {
+            "ID": 50, "Data": 80, "Hora Consulta": 100, "Estudo": 120, "ID Paciente": 90,
+            "Paciente": 150, "Hora Chegada": 100, "Tipo Visita": 90, "Visita": 80,
+            "Médico Resp.": 130, "Status": 150, "Valor Reembolso": 120, "Desfecho": 150,
+            "Médico": 110, "Enfermagem": 110, "Espirometria": 110, "Farmácia": 110,
+            "Nutricionista": 110, "Coordenação": 110,
+        }
 
         row_style_jscode = JsCode("""
 function(params) {
@@ -437,32 +315,24 @@ function(params) {
     return null;
 }
 """)
-        gb.configure_grid_options(getRowStyle=row_style_jscode)
-
-        if "Desfecho" in df_grid.columns:
-            gb.configure_column("Desfecho", width=150)
-        if "Médico" in df_grid.columns:
-            gb.configure_column("Médico", width=110)
-        if "Enfermagem" in df_grid.columns:
-            gb.configure_column("Enfermagem", width=110)
-        if "Espirometria" in df_grid.columns:
-            gb.configure_column("Espirometria", width=110)
-        if "Farmácia" in df_grid.columns:
-            gb.configure_column("Farmácia", width=110)
-        if "Nutricionista" in df_grid.columns:
-            gb.configure_column("Nutricionista", width=110)
-        if "Coordenação" in df_grid.columns:
-            gb.configure_column("Coordenação", width=110)
-
-        grid_options = gb.build()
+
+        def _configurar_grid(gb):
+            gb.configure_selection(selection_mode="single", use_checkbox=False)
+            for col, largura in larguras.items():
+                if col in df_grid.columns:
+                    gb.configure_column(col, width=largura)
+            gb.configure_grid_options(getRowStyle=row_style_jscode)
 
         if df_grid.shape[1] == 0:
             st.warning("⚠️ Não foi possível preparar as colunas para exibição.")
             st.stop()
 
-        grid_response = AgGrid(
+        grid_response = grid_paginado(
             df_grid,
-            gridOptions=grid_options,
+            key="agenda_gestao",
+            configurar=_configurar_grid,
+            colunas_data=["Data"],
+            ordem_padrao="Hora Consulta",
             update_mode=GridUpdateMode.SELECTION_CHANGED,
             fit_columns_on_grid_load=False,
             height=400,
@@ -658,7 +528,7 @@ function(params) {
 
                 if st.form_submit_button("💾 Atualizar Status", use_container_width=True):
                     payload = {}
-                    logs_para_inserir = []
+                    logs = LogAlteracoes(supabase, usuario_id, usuario_logado)
 
                     timestamp_agora = datetime.now(timezone.utc).isoformat()
 
@@ -672,69 +542,27 @@ function(params) {
 
                     if status_medico and status_medico_atual != status_medico:
                         payload["status_medico"] = status_medico
-                        logs_para_inserir.append({
-                            "agendamento_id": agendamento_id,
-                            "nome_etapa": "status_medico",
-                            "status_etapa": status_medico,
-                            "data_hora_etapa": timestamp_agora,
-                            "usuario_id": usuario_id,
-                            "usuario_nome": usuario_logado,
-                        })
+                        logs.etapa(agendamento_id, "status_medico", status_medico, timestamp_agora)
 
                     if status_enfermagem and status_enfermagem_atual != status_enfermagem:
                         payload["status_enfermagem"] = status_enfermagem
-                        logs_para_inserir.append({
-                            "agendamento_id": agendamento_id,
-                            "nome_etapa": "status_enfermagem",
-                            "status_etapa": status_enfermagem,
-                            "data_hora_etapa": timestamp_agora,
-                            "usuario_id": usuario_id,
-                            "usuario_nome": usuario_logado,
-                        })
+                        logs.etapa(agendamento_id, "status_enfermagem", status_enfermagem, timestamp_agora)
 
                     if status_farmacia and status_farmacia_atual != status_farmacia:
                         payload["status_farmacia"] = status_farmacia
-                        logs_para_inserir.append({
-                            "agendamento_id": agendamento_id,
-                            "nome_etapa": "status_farmacia",
-                            "status_etapa": status_farmacia,
-                            "data_hora_etapa": timestamp_agora,
-                            "usuario_id": usuario_id,
-                            "usuario_nome": usuario_logado,
-                        })
+                        logs.etapa(agendamento_id, "status_farmacia", status_farmacia, timestamp_agora)
 
                     if status_espirometria and status_espirometria_atual != status_espirometria:
                         payload["status_espirometria"] = status_espirometria
-                        logs_para_inserir.append({
-                            "agendamento_id": agendamento_id,
-                            "nome_etapa": "status_espirometria",
-                            "status_etapa": status_espirometria,
-                            "data_hora_etapa": timestamp_agora,
-                            "usuario_id": usuario_id,
-                            "usuario_nome": usuario_logado,
-                        })
+                        logs.etapa(agendamento_id, "status_espirometria", status_espirometria, timestamp_agora)
 
                     if status_nutricionista and status_nutricionista_atual != status_nutricionista:
                         payload["status_nutricionista"] = status_nutricionista
-                        logs_para_inserir.append({
-                            "agendamento_id": agendamento_id,
-                            "nome_etapa": "status_nutricionista",
-                            "status_etapa": status_nutricionista,
-                            "data_hora_etapa": timestamp_agora,
-                            "usuario_id": usuario_id,
-                            "usuario_nome": usuario_logado,
-                        })
+                        logs.etapa(agendamento_id, "status_nutricionista", status_nutricionista, timestamp_agora)
 
                     if status_coordenacao and status_coordenacao_atual != status_coordenacao:
                         payload["status_coordenacao"] = status_coordenacao
-                        logs_para_inserir.append({
-                            "agendamento_id": agendamento_id,
-                            "nome_etapa": "status_coordenacao",
-                            "status_etapa": status_coordenacao,
-                            "data_hora_etapa": timestamp_agora,
-                            "usuario_id": usuario_id,
-                            "usuario_nome": usuario_logado,
-                        })
+                        logs.etapa(agendamento_id, "status_coordenacao", status_coordenacao, timestamp_agora)
 
                     if hora_saida:
                         payload["hora_saida"] = hora_saida.isoformat()
@@ -758,12 +586,7 @@ function(params) {
                             for nome_campo, valor_atual, valor_selecionado in etapas_verificar:
                                 if not valor_atual and not valor_selecionado:
                                     payload[nome_campo] = "N/A"
-                                    logs_para_inserir.append({
-                                        "agendamento_id": agendamento_id,
-                                        "nome_etapa": nome_campo,
-                                        "status_etapa": "N/A",
-                                        "data_hora_etapa": timestamp_agora,
-                                    })
+                                    logs.etapa(agendamento_id, nome_campo, "N/A", timestamp_agora, automatico=True)
 
                     if valor_uber != valor_uber_atual:
                         payload["valor_uber"] = valor_uber if valor_uber else None
@@ -801,19 +624,9 @@ function(params) {
                                 .execute()
                             )
 
-                            for campo, novo_valor in payload.items():
-                                registrar_log_agendamento(
-                                    supabase, agendamento_id, usuario_id, usuario_logado,
-                                    campo, valores_anteriores_gestao.get(campo), novo_valor
-                                )
-
-                            for log in logs_para_inserir:
-                                supabase_execute(
-                                    lambda log=log: supabase.table("tab_app_log_etapas").insert(log).execute()
-                                )
-
-                            # Invalida cache para refletir os dados atualizados
-                            _invalidar_cache_agendamentos()
+                            # Alterações de campo + eventos de etapa: um insert por tabela
+                            logs.campos(agendamento_id, payload, valores_anteriores_gestao)
+                            logs.gravar()
 
                             st.session_state["_agenda_gestao_save_ok"] = True
                             st.session_state["_agenda_gestao_save_agendamento_id"] = agendamento_id
@@ -840,7 +653,7 @@ function(params) {
 
             resp_logs_detalhe = supabase_execute(
                 lambda: supabase.table("tab_app_log_etapas")
-                .select("*")
+                .select(projecoes.select("agenda_gestao_historico"))
                 .eq("agendamento_id", agendamento_id)
                 .order("data_hora_etapa", desc=True)
                 .execute()
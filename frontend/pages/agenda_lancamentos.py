@@ -8,31 +8,15 @@ import time
 from datetime import date, datetime, timezone, timedelta
 from io import BytesIO
 
-from frontend.supabase_client import get_supabase_client, supabase_execute, registrar_log_agendamento
+from frontend.supabase_client import get_supabase_client, supabase_execute, registrar_log_agendamento, depende_de
+from frontend.agenda_store import consultar_agendamentos
+from frontend import dimensoes_cache as dim
+from frontend import tipos
 from frontend.components.feedback import feedback
 
 FUSO_BRASILIA = timezone(timedelta(hours=-3))
 
 
-def parse_variaveis(valor_str: str) -> list:
-    """Parse de valores a partir de uma string - removendo aspas e normalizando."""
-    if not valor_str:
-        return []
-
-    valor_str = valor_str.strip('"').strip("'")
-
-    if ";" in valor_str:
-        valores = [v.strip() for v in valor_str.split(";") if v.strip()]
-    elif "\n" in valor_str:
-        valores = [v.strip() for v in valor_str.split("\n") if v.strip()]
-    elif "," in valor_str:
-        valores = [v.strip() for v in valor_str.split(",") if v.strip()]
-    else:
-        valores = [valor_str.strip()]
-
-    return valores
-
-
 def calc_programacao(data_cad: date, data_visita: date) -> str:
     """Calcula tipo de programação baseado nas datas."""
     if not (data_cad and data_visita):
@@ -54,7 +38,8 @@ def calc_programacao(data_cad: date, data_visita: date) -> str:
 # CACHED DATA FETCHING — evita reconexões em reruns de widget
 # ============================================================
 
-@st.cache_data(ttl=300, show_spinner=False)
+@depende_de("tab_app_usuarios")
+@st.cache_data(ttl=600, show_spinner=False)
 def _fetch_usuario_id(_supabase, usuario_logado: str):
     resp = supabase_execute(
         lambda: _supabase.table("tab_app_usuarios")
@@ -65,46 +50,18 @@ def _fetch_usuario_id(_supabase, usuario_logado: str):
     return resp.data[0]["id_usuario"] if resp.data else None
 
 
-@st.cache_data(ttl=120, show_spinner=False)
 def _fetch_estudos(_supabase):
-    resp = supabase_execute(
-        lambda: _supabase.table("tab_app_estudos")
-        .select("id_estudo, estudo, coordenacao")
-        .execute()
-    )
-    df = pd.DataFrame(resp.data) if resp.data else pd.DataFrame()
-    if not df.empty:
-        df.columns = [c.lower() for c in df.columns]
-    return df
+    return dim.estudos(_supabase, ["id_estudo", "estudo", "coordenacao"])
 
 
-@st.cache_data(ttl=600, show_spinner=False)
 def _fetch_variaveis(_supabase):
-    usos = ["tipo_visita", "medico_responsavel", "consultorio", "jejum", "reembolso", "visita"]
-    result = {}
-    for uso in usos:
-        resp = supabase_execute(
-            lambda uso=uso: _supabase.table("tab_app_variaveis")
-            .select("valor")
-            .eq("uso", uso)
-            .execute()
-        )
-        result[uso] = parse_variaveis(resp.data[0]["valor"]) if resp.data else []
-    return result
+    return dim.variaveis(
+        _supabase, ["tipo_visita", "medico_responsavel", "consultorio", "jejum", "reembolso", "visita"]
+    )
 
 
-@st.cache_data(ttl=60, show_spinner=False)
 def _fetch_agendamentos(_supabase):
-    resp = supabase_execute(
-        lambda: _supabase.table("tab_app_agendamentos")
-        .select("*")
-        .order("data_visita", desc=True)
-        .execute()
-    )
-    df = pd.DataFrame(resp.data) if resp.data else pd.DataFrame()
-    if not df.empty:
-        df.columns = [c.lower() for c in df.columns]
-    return df
+    return consultar_agendamentos(_supabase, desc=True)
 
 
 def page_agenda_lancamentos():
@@ -334,9 +291,6 @@ def page_agenda_lancamentos():
                             "criacao", None, str(novo_id)
                         )
 
-                    # Invalida cache para refletir o novo registro
-                    _fetch_agendamentos.clear()
-
                     st.balloons()
                     st.toast(
                         f"✅ Agendamento de {nome_paciente} salvo com sucesso!",
@@ -375,7 +329,7 @@ def page_agenda_lancamentos():
                         suffixes=("", "_est"),
                     ).rename(columns={"estudo": "nm_estudo"})
 
-                df_agendamentos["data_visita_dt"] = pd.to_datetime(df_agendamentos["data_visita"], errors="coerce")
+                df_agendamentos["data_visita_dt"] = tipos.data(df_agendamentos, "data_visita")
 
                 # Filtro pelo date_input da visita
                 df_filtrado = df_agendamentos.copy()
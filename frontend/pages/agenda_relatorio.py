@@ -6,54 +6,18 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-from datetime import date, timedelta, datetime, timezone
+from datetime import date, timedelta
 from io import BytesIO
-from st_aggrid import AgGrid, GridOptionsBuilder, GridUpdateMode, JsCode
-
-from frontend.supabase_client import get_supabase_client, supabase_execute
+from st_aggrid import GridUpdateMode
+
+from frontend.supabase_client import get_supabase_client, fetch_in, depende_de, cache_swr
+from frontend.agenda_store import FiltroAgenda, consultar_agendamentos
+from backend.engines.etapas import calcular_etapas, tempo_por_etapa, pivot_tempos, pivot_ultimo_status
+from frontend import dimensoes_cache as dim
+from frontend import projecoes
+from frontend import tipos
 from frontend.components.feedback import feedback
-
-
-def parse_variaveis(valor_str: str) -> list:
-    """Parse de valores a partir de uma string - removendo aspas e normalizando."""
-    if not valor_str:
-        return []
-
-    valor_str = valor_str.strip('"').strip("'")
-
-    if ";" in valor_str:
-        valores = [v.strip() for v in valor_str.split(";") if v.strip()]
-    elif "\n" in valor_str:
-        valores = [v.strip() for v in valor_str.split("\n") if v.strip()]
-    elif "," in valor_str:
-        valores = [v.strip() for v in valor_str.split(",") if v.strip()]
-    else:
-        valores = [valor_str.strip()]
-
-    return valores
-
-
-def parse_ts_utc(val):
-    """Converte qualquer string para Timestamp com tz=UTC ou None."""
-    if val is None or (isinstance(val, float) and pd.isna(val)):
-        return None
-    ts = pd.to_datetime(val, errors="coerce", utc=True)
-    if pd.isna(ts):
-        return None
-    return ts
-
-
-def ensure_utc(ts):
-    """Garante tz=UTC (tz-aware)."""
-    if ts is None:
-        return None
-    if not isinstance(ts, pd.Timestamp):
-        ts = pd.to_datetime(ts, errors="coerce")
-    if ts is None or pd.isna(ts):
-        return None
-    if ts.tzinfo is None:
-        return ts.tz_localize("UTC")
-    return ts.tz_convert("UTC")
+from frontend.components.grid import grid_paginado
 
 
 def hhmm_from_seconds(total_seconds: float) -> str:
@@ -70,42 +34,24 @@ def hhmm_from_seconds(total_seconds: float) -> str:
 # CACHED DATA FETCHING — evita reconexões em reruns de filtro
 # ============================================================
 
-@st.cache_data(ttl=120, show_spinner=False)
 def _fetch_estudos(_supabase):
-    resp = supabase_execute(
-        lambda: _supabase.table("tab_app_estudos")
-        .select("id_estudo, estudo, disciplina, coordenacao")
-        .execute()
-    )
-    df = pd.DataFrame(resp.data) if resp.data else pd.DataFrame()
-    if not df.empty:
-        df.columns = [c.lower() for c in df.columns]
-        df = df.drop_duplicates(subset=["id_estudo"], keep="first")
-    return df
+    return dim.estudos(_supabase, ["id_estudo", "estudo", "disciplina", "coordenacao"])
 
 
-@st.cache_data(ttl=60, show_spinner=False)
-def _fetch_agendamentos(_supabase):
-    resp = supabase_execute(
-        lambda: _supabase.table("tab_app_agendamentos").select("*").limit(5000).execute()
+def _fetch_agendamentos(_supabase, filtro: FiltroAgenda | None = None, colunas: list | None = None):
+    return consultar_agendamentos(
+        _supabase, filtro, ordem=("id",), colunas=colunas or projecoes.colunas("agenda_relatorio")
     )
-    df = pd.DataFrame(resp.data) if resp.data else pd.DataFrame()
-    if not df.empty:
-        df.columns = [c.lower() for c in df.columns]
-    return df
 
 
-@st.cache_data(ttl=60, show_spinner=False)
+@depende_de("tab_app_log_etapas")
+@cache_swr(ttl=600)
 def _fetch_logs(_supabase, ag_ids: tuple):
-    if not ag_ids:
-        return []
-    resp = supabase_execute(
-        lambda: _supabase.table("tab_app_log_etapas")
-        .select("agendamento_id, nome_etapa, status_etapa, data_hora_etapa")
-        .in_("agendamento_id", list(ag_ids))
-        .execute()
+    return fetch_in(
+        _supabase, "tab_app_log_etapas", "agendamento_id", ag_ids,
+        "id, agendamento_id, nome_etapa, status_etapa, data_hora_etapa",
+        formato="csv",
     )
-    return resp.data if resp.data else []
 
 
 def page_agenda_relatorio():
@@ -118,24 +64,13 @@ def page_agenda_relatorio():
 
         # ✅ BUSCAR DADOS (cacheados)
         df_estudos = _fetch_estudos(supabase)
-        df_agendamentos = _fetch_agendamentos(supabase)
+        # Opções de status/coordenação: só essas 2 colunas de todos os agendamentos
+        df_opcoes = _fetch_agendamentos(supabase, colunas=["status_confirmacao", "coordenacao"])
 
-        if df_agendamentos.empty:
+        if df_opcoes.empty:
             st.warning("Nenhum agendamento encontrado.")
             st.stop()
 
-        if not df_estudos.empty:
-            df_agendamentos = df_agendamentos.merge(
-                df_estudos,
-                left_on="estudo_id",
-                right_on="id_estudo",
-                how="left",
-                suffixes=("", "_est"),
-            ).rename(columns={"estudo": "nm_estudo"})
-
-        df_agendamentos["data_visita_dt"] = pd.to_datetime(df_agendamentos["data_visita"], errors="coerce")
-        df_agendamentos["data_cadastro_dt"] = pd.to_datetime(df_agendamentos["data_cadastro"], errors="coerce")
-
         # =====================================================
         # FILTROS
         # =====================================================
@@ -158,11 +93,11 @@ def page_agenda_relatorio():
             disciplina_sel = st.selectbox("Disciplina", ["(Todas)"] + disciplinas_estudo, index=0)
 
         with fc3:
-            status_unicos = sorted([x for x in df_agendamentos["status_confirmacao"].dropna().unique() if x])
+            status_unicos = sorted([x for x in df_opcoes["status_confirmacao"].dropna().unique() if x])
             status_sel = st.selectbox("Status Confirmação", ["(Todos)"] + status_unicos, index=0)
 
         with fc4:
-            coordenacoes_unicas = sorted([x for x in df_agendamentos["coordenacao"].dropna().unique() if x])
+            coordenacoes_unicas = sorted([x for x in df_opcoes["coordenacao"].dropna().unique() if x])
             coordenacao_sel = st.selectbox("Coordenação", ["(Todas)"] + coordenacoes_unicas, index=0)
 
         with fc5:
@@ -172,32 +107,39 @@ def page_agenda_relatorio():
             dt_fim = st.date_input("Data (Fim)", value=date.today(), format="DD/MM/YYYY")
 
         # =====================================================
-        # APLICAR FILTROS
+        # APLICAR FILTROS (no AgendaStore; estudo e disciplina viram estudo_ids)
         # =====================================================
-        df_view = df_agendamentos.copy()
-
+        estudos_filtro = df_estudos
         if estudo_sel != "(Todos)":
-            df_view = df_view[df_view["nm_estudo"] == estudo_sel]
-
+            estudos_filtro = estudos_filtro[estudos_filtro["estudo"] == estudo_sel]
         if disciplina_sel != "(Todas)":
-            df_view = df_view[df_view["disciplina"] == disciplina_sel]
-
-        if status_sel != "(Todos)":
-            df_view = df_view[df_view["status_confirmacao"] == status_sel]
-
-        if coordenacao_sel != "(Todas)":
-            df_view = df_view[df_view["coordenacao"] == coordenacao_sel]
-
-        if dt_ini and dt_fim:
-            df_view = df_view[
-                (df_view["data_visita_dt"] >= pd.to_datetime(dt_ini)) &
-                (df_view["data_visita_dt"] <= pd.to_datetime(dt_fim))
-            ]
+            estudos_filtro = estudos_filtro[estudos_filtro["disciplina"] == disciplina_sel]
+
+        filtro = FiltroAgenda.criar(
+            estudo_ids=None if estudos_filtro is df_estudos else estudos_filtro["id_estudo"],
+            status=None if status_sel == "(Todos)" else status_sel,
+            coordenacoes=None if coordenacao_sel == "(Todas)" else coordenacao_sel,
+            data_ini=dt_ini if dt_ini and dt_fim else None,
+            data_fim=dt_fim if dt_ini and dt_fim else None,
+        )
+        df_view = _fetch_agendamentos(supabase, filtro)
 
         if df_view.empty:
             st.info("Nenhum agendamento encontrado com os filtros aplicados.")
             st.stop()
 
+        if not df_estudos.empty:
+            df_view = df_view.merge(
+                df_estudos,
+                left_on="estudo_id",
+                right_on="id_estudo",
+                how="left",
+                suffixes=("", "_est"),
+            ).rename(columns={"estudo": "nm_estudo"})
+
+        df_view["data_visita_dt"] = tipos.data(df_view, "data_visita")
+        df_view["data_cadastro_dt"] = pd.to_datetime(df_view["data_cadastro"], errors="coerce")
+
         # =====================================================
         # MÉTRICAS PRINCIPAIS
         # =====================================================
@@ -314,7 +256,6 @@ def page_agenda_relatorio():
             "status_medico", "status_enfermagem", "status_espirometria",
             "status_farmacia", "status_nutricionista",
         ]
-        STATUS_INICIO = {"Atendendo", "Em atendimento"}
 
         ag_ids = tuple(df_view["id"].tolist())
         logs_all = _fetch_logs(supabase, ag_ids)
@@ -325,54 +266,29 @@ def page_agenda_relatorio():
         st.markdown("---")
         st.markdown("### ⏱️ Tempo por Etapa")
 
-        if logs_all:
-            df_logs = pd.DataFrame(logs_all)
-            df_logs.columns = [c.lower() for c in df_logs.columns]
-            df_logs["ts"] = df_logs["data_hora_etapa"].apply(parse_ts_utc)
-            df_logs = df_logs.dropna(subset=["ts"])
-
-            if not df_logs.empty:
-                now_utc = pd.Timestamp(datetime.now(timezone.utc))
-                df_logs_sorted = df_logs.sort_values(["agendamento_id", "nome_etapa", "ts"])
-
-                durations = []
-                for (ag_id, etapa), grp in df_logs_sorted.groupby(["agendamento_id", "nome_etapa"]):
-                    grp = grp.reset_index(drop=True)
-                    total_sec = 0.0
-                    for i, row in grp.iterrows():
-                        if row["status_etapa"] not in STATUS_INICIO:
-                            continue
-                        t_ini = ensure_utc(row["ts"])
-                        t_fim = ensure_utc(grp.loc[i + 1, "ts"]) if i + 1 < len(grp) else now_utc
-                        if t_ini is None or t_fim is None:
-                            continue
-                        delta = (t_fim - t_ini).total_seconds()
-                        if delta > 0:
-                            total_sec += delta
-                    durations.append({"nome_etapa": etapa, "tempo_sec": total_sec})
-
-                df_tempo_etapa = pd.DataFrame(durations)
-                tempo_total_etapa = df_tempo_etapa.groupby("nome_etapa")["tempo_sec"].sum().reset_index()
-                tempo_total_etapa.columns = ["Etapa", "Tempo (segundos)"]
-                tempo_total_etapa["Etapa"] = tempo_total_etapa["Etapa"].map(ETAPAS_MAPA).fillna(tempo_total_etapa["Etapa"])
-                tempo_total_etapa = tempo_total_etapa.sort_values("Tempo (segundos)", ascending=False)
-
-                fig_tempo_etapa = px.bar(
-                    tempo_total_etapa, x="Etapa", y="Tempo (segundos)",
-                    title="Tempo Total Aberto por Etapa", color="Etapa",
-                    text=tempo_total_etapa["Tempo (segundos)"].apply(lambda x: hhmm_from_seconds(x)),
-                )
-                fig_tempo_etapa.update_layout(height=400, showlegend=False)
-                fig_tempo_etapa.update_traces(textposition="auto")
-                st.plotly_chart(fig_tempo_etapa, use_container_width=True)
-
-                tempo_total_etapa["Tempo (HH:MM)"] = tempo_total_etapa["Tempo (segundos)"].apply(hhmm_from_seconds)
-                st.dataframe(
-                    tempo_total_etapa[["Etapa", "Tempo (HH:MM)"]],
-                    use_container_width=True, hide_index=True,
-                )
-            else:
-                st.info("Sem dados de logs para exibir")
+        # Tempos/último status por (agendamento, etapa) — memoizado, o bloco do relatório reaproveita
+        df_etapas = calcular_etapas(logs_all)
+
+        if not df_etapas.empty:
+            tempo_total_etapa = tempo_por_etapa(df_etapas)
+            tempo_total_etapa.columns = ["Etapa", "Tempo (segundos)"]
+            tempo_total_etapa["Etapa"] = tempo_total_etapa["Etapa"].map(ETAPAS_MAPA).fillna(tempo_total_etapa["Etapa"])
+            tempo_total_etapa = tempo_total_etapa.sort_values("Tempo (segundos)", ascending=False)
+
+            fig_tempo_etapa = px.bar(
+                tempo_total_etapa, x="Etapa", y="Tempo (segundos)",
+                title="Tempo Total Aberto por Etapa", color="Etapa",
+                text=tempo_total_etapa["Tempo (segundos)"].apply(lambda x: hhmm_from_seconds(x)),
+            )
+            fig_tempo_etapa.update_layout(height=400, showlegend=False)
+            fig_tempo_etapa.update_traces(textposition="auto")
+            st.plotly_chart(fig_tempo_etapa, use_container_width=True)
+
+            tempo_total_etapa["Tempo (HH:MM)"] = tempo_total_etapa["Tempo (segundos)"].apply(hhmm_from_seconds)
+            st.dataframe(
+                tempo_total_etapa[["Etapa", "Tempo (HH:MM)"]],
+                use_container_width=True, hide_index=True,
+            )
         else:
             st.info("Sem dados de logs para exibir")
 
@@ -426,9 +342,9 @@ def page_agenda_relatorio():
 
         df_visao = df_view.copy()
         df_visao["data_visita_fmt"] = df_visao["data_visita_dt"].dt.strftime("%d/%m/%Y")
-        df_visao["data_cadastro_fmt"] = pd.to_datetime(df_visao["data_cadastro"], errors="coerce", utc=True).dt.tz_convert(None).dt.strftime("%d/%m/%Y %H:%M")
-        _cad_naive = pd.to_datetime(df_visao["data_cadastro"], errors="coerce", utc=True).dt.tz_convert(None).dt.normalize()
-        df_visao["antecedencia_dias"] = (df_visao["data_visita_dt"].dt.normalize() - _cad_naive).dt.days
+        df_visao["data_cadastro_dt"] = pd.to_datetime(df_visao["data_cadastro"], errors="coerce", utc=True).dt.tz_convert(None)
+        df_visao["data_cadastro_fmt"] = df_visao["data_cadastro_dt"].dt.strftime("%d/%m/%Y %H:%M")
+        df_visao["antecedencia_dias"] = (df_visao["data_visita_dt"].dt.normalize() - df_visao["data_cadastro_dt"].dt.normalize()).dt.days
 
         colunas_disponiveis = {
             "data_visita_fmt": "Data Visita",
@@ -476,30 +392,20 @@ def page_agenda_relatorio():
             df_visao_filtrado = df_visao[colunas_selecionadas_originais].copy()
             df_visao_filtrado.rename(columns=colunas_disponiveis, inplace=True)
 
-            gb = GridOptionsBuilder.from_dataframe(df_visao_filtrado)
-            gb.configure_default_column(editable=False, groupable=True, filterable=True, sorteable=True)
-            gb.configure_side_bar()
-
-            if "Data Visita" in df_visao_filtrado.columns:
-                _date_comparator = JsCode("""
-function(dateA, dateB) {
-    function parse(d) {
-        if (!d) return null;
-        var p = d.split('/');
-        return new Date(parseInt(p[2]), parseInt(p[1]) - 1, parseInt(p[0]));
-    }
-    var a = parse(dateA), b = parse(dateB);
-    if (!a && !b) return 0;
-    if (!a) return -1;
-    if (!b) return 1;
-    return a < b ? -1 : a > b ? 1 : 0;
-}
-""")
-                gb.configure_column("Data Visita", comparator=_date_comparator)
-
-            AgGrid(
-                df_visao_filtrado,
-                gridOptions=gb.build(),
+            # Grid: datas reais (ISO + formatter), ordenadas e paginadas no servidor
+            datas_grid = {"data_visita_fmt": "data_visita_dt", "data_cadastro_fmt": "data_cadastro_dt"}
+            df_visao_grid = df_visao[[datas_grid.get(c, c) for c in colunas_selecionadas_originais]].copy()
+            df_visao_grid.columns = list(df_visao_filtrado.columns)
+
+            def _configurar_grid(gb):
+                gb.configure_default_column(editable=False)
+                gb.configure_side_bar()
+
+            grid_paginado(
+                df_visao_grid,
+                key="agenda_relatorio_visao",
+                configurar=_configurar_grid,
+                colunas_data=["Data Visita", "Data Cadastro"],
                 update_mode=GridUpdateMode.NO_UPDATE,
                 allow_unsafe_jscode=True,
                 theme="streamlit",
@@ -527,83 +433,27 @@ function(dateA, dateB) {
 
         # =====================================================
         # RELATÓRIO PADRONIZADO + TEMPOS POR ETAPA
-        # Reutiliza logs_all já buscado acima (sem segunda query)
+        # Reutiliza df_etapas calculado acima (sem segunda query nem recálculo)
         # =====================================================
         st.markdown("---")
         st.subheader("Relatório (padronizado) + tempos por etapa")
 
-        df_logs_rel = pd.DataFrame(logs_all)
-
-        if not df_logs_rel.empty:
-            df_logs_rel.columns = [c.lower() for c in df_logs_rel.columns]
-            df_logs_rel["ts"] = df_logs_rel["data_hora_etapa"].apply(parse_ts_utc)
-            df_logs_rel = df_logs_rel.dropna(subset=["ts"])
-
-            now_utc = pd.Timestamp(datetime.now(timezone.utc))
-            df_logs_sorted = df_logs_rel.sort_values(["agendamento_id", "nome_etapa", "ts"])
-
-            last_status = (
-                df_logs_sorted.groupby(["agendamento_id", "nome_etapa"])["status_etapa"]
-                .last()
-                .reset_index()
-                .rename(columns={"status_etapa": "ultimo_status"})
-            )
+        if not df_etapas.empty:
+            pivot_time = pivot_tempos(df_etapas, ETAPAS_TEMPO)
+            sum_sec = pivot_time.sum(axis=1).reset_index(name="total_sec")
+            sum_sec["Total (HH:MM)"] = sum_sec["total_sec"].apply(hhmm_from_seconds)
+            sum_sec = sum_sec.drop(columns=["total_sec"])
 
-            durations = []
-            for (ag_id, etapa), grp in df_logs_sorted.groupby(["agendamento_id", "nome_etapa"]):
-                grp = grp.reset_index(drop=True)
-                total_sec = 0.0
-                for i, row in grp.iterrows():
-                    if row["status_etapa"] not in STATUS_INICIO:
-                        continue
-                    t_ini = ensure_utc(row["ts"])
-                    t_fim = ensure_utc(grp.loc[i + 1, "ts"]) if i + 1 < len(grp) else now_utc
-                    if t_ini is None or t_fim is None:
-                        continue
-                    delta = (t_fim - t_ini).total_seconds()
-                    if delta > 0:
-                        total_sec += delta
-                durations.append({"agendamento_id": ag_id, "nome_etapa": etapa, "tempo_sec": total_sec})
-
-            df_dur = pd.DataFrame(durations)
-            df_stage = pd.merge(df_dur, last_status, on=["agendamento_id", "nome_etapa"], how="left")
-
-            pivot_time = (
-                df_stage.pivot_table(
-                    index="agendamento_id", columns="nome_etapa",
-                    values="tempo_sec", aggfunc="sum", fill_value=0.0,
-                )
-                .reindex(columns=ETAPAS_TEMPO, fill_value=0.0)
-                .reset_index()
-            )
+            pivot_time = pivot_time.reset_index()
             for etapa in ETAPAS_TEMPO:
                 if etapa in pivot_time.columns:
                     pivot_time[f"Tempo {etapa.split('_', 1)[1].title()} (HH:MM)"] = pivot_time[etapa].apply(hhmm_from_seconds)
                     del pivot_time[etapa]
 
-            pivot_last = (
-                df_stage.pivot_table(
-                    index="agendamento_id", columns="nome_etapa",
-                    values="ultimo_status", aggfunc="last",
-                )
-                .reindex(columns=ETAPAS_TEMPO)
-                .reset_index()
-            )
+            pivot_last = pivot_ultimo_status(df_etapas, ETAPAS_TEMPO).reset_index()
             for etapa in ETAPAS_TEMPO:
                 if etapa in pivot_last.columns:
                     pivot_last.rename(columns={etapa: f"Último {etapa.split('_', 1)[1].title()}"}, inplace=True)
-
-            sum_sec = (
-                df_stage.pivot_table(
-                    index="agendamento_id", columns="nome_etapa",
-                    values="tempo_sec", aggfunc="sum", fill_value=0.0,
-                )
-                .reindex(columns=ETAPAS_TEMPO, fill_value=0.0)
-                .sum(axis=1)
-                .reset_index(name="total_sec")
-            )
-            sum_sec["Total (HH:MM)"] = sum_sec["total_sec"].apply(hhmm_from_seconds)
-            sum_sec = sum_sec.drop(columns=["total_sec"])
         else:
             ag_ids_list = list(ag_ids)
             pivot_time = pd.DataFrame({"agendamento_id": ag_ids_list})
@@ -5,50 +5,25 @@
 import streamlit as st
 import pandas as pd
 
-from frontend.supabase_client import get_supabase_client, supabase_execute
+from frontend.supabase_client import get_supabase_client, supabase_execute, depende_de
+from frontend import dimensoes_cache as dim
 from frontend.components.feedback import feedback
 
 
-def parse_variaveis(valor_str: str) -> list:
-    if not valor_str:
-        return []
-    valor_str = valor_str.strip('"').strip("'")
-    if ";" in valor_str:
-        return [v.strip() for v in valor_str.split(";") if v.strip()]
-    elif "\n" in valor_str:
-        return [v.strip() for v in valor_str.split("\n") if v.strip()]
-    elif "," in valor_str:
-        return [v.strip() for v in valor_str.split(",") if v.strip()]
-    return [valor_str.strip()]
-
-
 # ============================================================
 # CACHED DATA FETCHING
 # ============================================================
 
-@st.cache_data(ttl=600, show_spinner=False)
 def _fetch_coordenacoes_var(_supabase):
-    resp = supabase_execute(
-        lambda: _supabase.table("tab_app_variaveis")
-        .select("valor")
-        .eq("uso", "coordenacao")
-        .execute()
-    )
-    return parse_variaveis(resp.data[0]["valor"]) if resp.data else []
+    return dim.variavel(_supabase, "coordenacao")
 
 
-@st.cache_data(ttl=600, show_spinner=False)
 def _fetch_estudos(_supabase):
-    resp = supabase_execute(
-        lambda: _supabase.table("tab_app_estudos")
-        .select("estudo")
-        .order("estudo")
-        .execute()
-    )
-    return sorted([r["estudo"] for r in resp.data if r.get("estudo")]) if resp.data else []
+    return sorted(x for x in dim.estudos(_supabase, ["estudo"])["estudo"] if x)
 
 
-@st.cache_data(ttl=300, show_spinner=False)
+@depende_de("tab_app_grupos")
+@st.cache_data(ttl=600, show_spinner=False)
 def _fetch_grupos(_supabase):
     resp = supabase_execute(
         lambda: _supabase.table("tab_app_grupos")
@@ -63,22 +38,12 @@ def _fetch_grupos(_supabase):
     return df
 
 
-@st.cache_data(ttl=300, show_spinner=False)
 def _fetch_usuarios(_supabase):
-    resp = supabase_execute(
-        lambda: _supabase.table("tab_app_usuarios")
-        .select("id_usuario, nm_usuario, sn_ativo")
-        .eq("sn_ativo", True)
-        .order("nm_usuario")
-        .execute()
-    )
-    df = pd.DataFrame(resp.data) if resp.data else pd.DataFrame()
-    if not df.empty:
-        df.columns = [c.lower() for c in df.columns]
-    return df
+    return dim.usuarios(_supabase, ["id_usuario", "nm_usuario", "sn_ativo"])
 
 
-@st.cache_data(ttl=120, show_spinner=False)
+@depende_de("tab_app_usuario_grupo")
+@st.cache_data(ttl=600, show_spinner=False)
 def _fetch_usuarios_grupo(_supabase, grupo_id: int):
     resp = supabase_execute(
         lambda: _supabase.table("tab_app_usuario_grupo")
@@ -90,7 +55,8 @@ def _fetch_usuarios_grupo(_supabase, grupo_id: int):
     return [u["id_usuario"] for u in resp.data] if resp.data else []
 
 
-@st.cache_data(ttl=60, show_spinner=False)
+@depende_de("tab_app_usuario_vinculo")
+@st.cache_data(ttl=600, show_spinner=False)
 def _fetch_vinculos_tipo(_supabase, tipo: str):
     resp = supabase_execute(
         lambda: _supabase.table("tab_app_usuario_vinculo")
@@ -106,7 +72,8 @@ def _fetch_vinculos_tipo(_supabase, tipo: str):
     return df
 
 
-@st.cache_data(ttl=60, show_spinner=False)
+@depende_de("tab_app_usuario_vinculo")
+@st.cache_data(ttl=600, show_spinner=False)
 def _fetch_vinculos_usuario(_supabase, usuario_id: int, tipo: str):
     resp = supabase_execute(
         lambda: _supabase.table("tab_app_usuario_vinculo")
@@ -119,11 +86,6 @@ def _fetch_vinculos_usuario(_supabase, usuario_id: int, tipo: str):
     return [v["vinculo"] for v in resp.data] if resp.data else []
 
 
-def _invalidar_cache_vinculos():
-    _fetch_vinculos_tipo.clear()
-    _fetch_vinculos_usuario.clear()
-
-
 # ============================================================
 # BLOCO REUTILIZÁVEL: editar vínculos de um tipo
 # ============================================================
@@ -203,7 +165,6 @@ def _render_aba_editar(supabase, tipo: str, label_vinculo: str, opcoes: list, df
                         .execute()
                     )
 
-                _invalidar_cache_vinculos()
                 feedback("✅ Vínculos atualizados com sucesso!", "success", "💾")
                 st.rerun()
 
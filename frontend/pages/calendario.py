@@ -7,62 +7,29 @@ import pandas as pd
 from datetime import date
 from io import BytesIO
 
-from frontend.supabase_client import get_supabase_client, supabase_execute
+from frontend.supabase_client import get_supabase_client
+from frontend.agenda_store import consultar_agendamentos
+from frontend import dimensoes_cache as dim
 
 
-def _parse_variaveis(valor_str: str) -> list:
-    if not valor_str:
-        return []
-    valor_str = valor_str.strip('"').strip("'")
-    if ";" in valor_str:
-        return [v.strip() for v in valor_str.split(";") if v.strip()]
-    if "\n" in valor_str:
-        return [v.strip() for v in valor_str.split("\n") if v.strip()]
-    if "," in valor_str:
-        return [v.strip() for v in valor_str.split(",") if v.strip()]
-    return [valor_str.strip()]
-
-
-@st.cache_data(ttl=600, show_spinner=False)
 def _fetch_estudos(_supabase):
-    resp = supabase_execute(
-        lambda: _supabase.table("tab_app_estudos")
-        .select("id_estudo, estudo, coordenacao")
-        .execute()
-    )
-    df = pd.DataFrame(resp.data) if resp.data else pd.DataFrame()
-    if not df.empty:
-        df.columns = [c.lower() for c in df.columns]
-    return df
+    return dim.estudos(_supabase, ["id_estudo", "estudo", "coordenacao"])
 
 
-@st.cache_data(ttl=600, show_spinner=False)
 def _fetch_medicos(_supabase):
-    resp = supabase_execute(
-        lambda: _supabase.table("tab_app_variaveis")
-        .select("valor")
-        .eq("uso", "medico_responsavel")
-        .execute()
-    )
-    return _parse_variaveis(resp.data[0]["valor"]) if resp.data else []
+    return dim.variavel(_supabase, "medico_responsavel")
 
 
-@st.cache_data(ttl=60, show_spinner=False)
 def _fetch_calendario(_supabase, data_str):
-    resp = supabase_execute(
-        lambda: _supabase.table("tab_app_agendamentos")
-        .select(
-            "id, hora_consulta, estudo_id, id_paciente, "
-            "tipo_visita, visita, medico_responsavel, consultorio, coordenacao"
-        )
-        .eq("data_visita", data_str)
-        .order("hora_consulta", desc=False)
-        .execute()
+    return consultar_agendamentos(
+        _supabase,
+        data=data_str,
+        ordem=("hora_consulta",),
+        colunas=[
+            "id", "hora_consulta", "estudo_id", "id_paciente",
+            "tipo_visita", "visita", "medico_responsavel", "consultorio", "coordenacao",
+        ],
     )
-    df = pd.DataFrame(resp.data) if resp.data else pd.DataFrame()
-    if not df.empty:
-        df.columns = [c.lower() for c in df.columns]
-    return df
 
 
 def page_calendario():
@@ -6,90 +6,19 @@ import streamlit as st
 import pandas as pd
 from datetime import date, timedelta
 
-from st_aggrid import AgGrid, GridOptionsBuilder, GridUpdateMode, JsCode
-from frontend.supabase_client import get_supabase_client, supabase_execute
+from st_aggrid import GridUpdateMode
+from frontend.supabase_client import get_supabase_client, supabase_execute, fetch_in, depende_de, bulk_upsert
+from frontend.agenda_store import consultar_agendamentos
+from backend.engines.prazos import USO_FERIADOS, calcular_prazos_agenda
+from frontend import dimensoes_cache as dim
 from frontend.components.feedback import feedback
+from frontend.components.grid import grid_paginado
 
 
 # ============================================================
 # HELPERS
 # ============================================================
 
-def _parse_variaveis(valor_str: str) -> list:
-    if not valor_str:
-        return []
-    valor_str = valor_str.strip('"').strip("'")
-    for sep in [";", "\n", ","]:
-        if sep in valor_str:
-            return [v.strip() for v in valor_str.split(sep) if v.strip()]
-    return [valor_str.strip()]
-
-
-def _add_business_days(start: date, days: int) -> date:
-    current = start
-    added = 0
-    while added < days:
-        current += timedelta(days=1)
-        if current.weekday() < 5:
-            added += 1
-    return current
-
-
-def _calcular_prazo(data_visita_str, resolucao_dias, resolucao_modelo):
-    if not data_visita_str:
-        return None
-    try:
-        dv = date.fromisoformat(str(data_visita_str))
-        if not resolucao_dias:
-            return _add_business_days(dv, 5)
-        d = int(resolucao_dias)
-        modelo = str(resolucao_modelo or "").lower().strip()
-        if modelo == "úteis":
-            return _add_business_days(dv, d)
-        return dv + timedelta(days=d)
-    except Exception:
-        return None
-
-
-def _status_atuacao(desfecho, status_revisao, status_transcricao) -> str:
-    if str(desfecho or "").strip() != "Finalizado":
-        return "N/A"
-    def preenchido(v):
-        return bool(v and str(v).strip() not in ("", "None", "nan", "NaN"))
-    rev = preenchido(status_revisao)
-    tran = preenchido(status_transcricao)
-    if rev and tran:
-        return "Concluído"
-    if rev or tran:
-        return "Em andamento"
-    return "Pendente"
-
-
-def _farol(prazo_rev_tran, desfecho) -> str:
-    if str(desfecho or "").strip() != "Finalizado":
-        return "⚪"
-    if prazo_rev_tran is None:
-        return "⚪"
-    prazo = prazo_rev_tran if isinstance(prazo_rev_tran, date) else _safe_date(prazo_rev_tran)
-    if prazo is None:
-        return "⚪"
-    today = date.today()
-    if prazo < today:
-        return "🔴"
-    if prazo <= today + timedelta(days=3):
-        return "🟡"
-    return "🟢"
-
-
-def _fmt_date(v) -> str:
-    if v is None or (isinstance(v, float) and pd.isna(v)):
-        return ""
-    try:
-        return pd.to_datetime(v).strftime("%d/%m/%Y")
-    except Exception:
-        return ""
-
-
 def _safe_date(v):
     if not v or (isinstance(v, float) and pd.isna(v)):
         return None
@@ -115,75 +44,39 @@ def _sel_idx(opts: list, val) -> int:
 # CACHE FETCHERS
 # ============================================================
 
-@st.cache_data(ttl=600, show_spinner=False)
 def _fetch_estudos_info(_supabase):
-    resp = supabase_execute(
-        lambda: _supabase.table("tab_app_estudos")
-        .select("id_estudo, estudo, disciplina, resolucao_dias, resolucao_modelo")
-        .execute()
-    )
-    df = pd.DataFrame(resp.data) if resp.data else pd.DataFrame()
-    if not df.empty:
-        df.columns = [c.lower() for c in df.columns]
-    return df
+    return dim.estudos(_supabase, ["id_estudo", "estudo", "disciplina", "resolucao_dias", "resolucao_modelo"])
 
 
-@st.cache_data(ttl=60, show_spinner=False)
 def _fetch_agendamentos(_supabase, ids_estudo: tuple, data_ini: str, data_fim: str):
     if not ids_estudo:
         return pd.DataFrame()
-    resp = supabase_execute(
-        lambda: _supabase.table("tab_app_agendamentos")
-        .select(
-            "id, estudo_id, id_paciente, nome_paciente, visita, tipo_visita, "
-            "data_visita, desfecho_atendimento, status_confirmacao, medico_responsavel, "
-            "obs_visita, obs_coleta"
-        )
-        .in_("estudo_id", list(ids_estudo))
-        .gte("data_visita", data_ini)
-        .lte("data_visita", data_fim)
-        .order("data_visita", desc=False)
-        .execute()
+    return consultar_agendamentos(
+        _supabase,
+        estudo_ids=ids_estudo,
+        data_ini=data_ini,
+        data_fim=data_fim,
+        colunas=[
+            "id", "estudo_id", "id_paciente", "nome_paciente", "visita", "tipo_visita",
+            "data_visita", "desfecho_atendimento", "status_confirmacao", "medico_responsavel",
+            "obs_visita", "obs_coleta",
+        ],
     )
-    df = pd.DataFrame(resp.data) if resp.data else pd.DataFrame()
-    if not df.empty:
-        df.columns = [c.lower() for c in df.columns]
-    return df
 
 
 
-@st.cache_data(ttl=30, show_spinner=False)
+@depende_de("tab_app_dados_agenda")
+@st.cache_data(ttl=300, show_spinner=False)
 def _fetch_dados_agenda(_supabase, ids_agenda: tuple):
-    if not ids_agenda:
-        return pd.DataFrame()
-    resp = supabase_execute(
-        lambda: _supabase.table("tab_app_dados_agenda")
-        .select("*")
-        .in_("id_agenda", list(ids_agenda))
-        .execute()
-    )
-    df = pd.DataFrame(resp.data) if resp.data else pd.DataFrame()
-    if not df.empty:
-        df.columns = [c.lower() for c in df.columns]
-    return df
+    return fetch_in(_supabase, "tab_app_dados_agenda", "id_agenda", ids_agenda)
 
 
-@st.cache_data(ttl=600, show_spinner=False)
 def _fetch_usuarios(_supabase):
-    resp = supabase_execute(
-        lambda: _supabase.table("tab_app_usuarios")
-        .select("id_usuario, nm_usuario")
-        .eq("sn_ativo", True)
-        .order("nm_usuario")
-        .execute()
-    )
-    df = pd.DataFrame(resp.data) if resp.data else pd.DataFrame()
-    if not df.empty:
-        df.columns = [c.lower() for c in df.columns]
-    return df
+    return dim.usuarios(_supabase, ["id_usuario", "nm_usuario"])
 
 
-@st.cache_data(ttl=300, show_spinner=False)
+@depende_de("tab_app_grupos", "tab_app_usuario_grupo", "tab_app_usuarios")
+@st.cache_data(ttl=600, show_spinner=False)
 def _fetch_usuarios_dados(_supabase):
     resp_grupo = supabase_execute(
         lambda: _supabase.table("tab_app_grupos")
@@ -219,32 +112,14 @@ def _fetch_usuarios_dados(_supabase):
     return df
 
 
-@st.cache_data(ttl=600, show_spinner=False)
-def _fetch_variaveis(_supabase):
-    usos = ["revisado_coordenacao", "status_revisao", "status_transcricao", "visita_crio", "status_indice"]
-    result = {}
-    for uso in usos:
-        resp = supabase_execute(
-            lambda uso=uso: _supabase.table("tab_app_variaveis")
-            .select("valor")
-            .eq("uso", uso)
-            .execute()
-        )
-        result[uso] = _parse_variaveis(resp.data[0]["valor"]) if resp.data else []
-    return result
+def _fetch_feriados(_supabase):
+    return dim.variavel(_supabase, USO_FERIADOS)
 
 
-# ============================================================
-# AGGRID JS
-# ============================================================
-
-_DATE_CMP_JS = JsCode("""
-function(a, b) {
-    if (!a && !b) return 0; if (!a) return -1; if (!b) return 1;
-    var pa = a.split('/'), pb = b.split('/');
-    return new Date(pa[2], pa[1]-1, pa[0]) - new Date(pb[2], pb[1]-1, pb[0]);
-}
-""")
+def _fetch_variaveis(_supabase):
+    return dim.variaveis(
+        _supabase, ["revisado_coordenacao", "status_revisao", "status_transcricao", "visita_crio", "status_indice"]
+    )
 
 
 # ============================================================
@@ -413,14 +288,11 @@ def page_dados_agenda():
             for col in [c for c in _dados_cols if c != "id_agenda"]:
                 df_ags[col if col != "id" else "id_dado"] = None
 
-        # Campos calculados
-        df_ags["prazo_rev_tran"] = df_ags.apply(
-            lambda r: _calcular_prazo(r.get("data_visita"), r.get("resolucao_dias"), r.get("resolucao_modelo")),
-            axis=1,
-        )
-        df_ags["_farol"] = df_ags.apply(
-            lambda r: _farol(r.get("prazo_rev_tran"), r.get("desfecho_atendimento")), axis=1
-        )
+        # Campos calculados (prazo em dias úteis com feriados, farol e status) — frame inteiro de uma vez
+        calculados = calcular_prazos_agenda(df_ags, _fetch_feriados(supabase))
+        df_ags["prazo_rev_tran"] = calculados["prazo"]
+        df_ags["_farol"]         = calculados["farol"]
+        df_ags["status_atuacao"] = calculados["status_atuacao"]
 
         if farol_sel:
             _farol_map = {"🟢 Verde": "🟢", "🟡 Amarelo": "🟡", "🔴 Vermelho": "🔴", "⚪ Cinza": "⚪"}
@@ -428,32 +300,23 @@ def page_dados_agenda():
             df_ags = df_ags[df_ags["_farol"].isin(farol_emojis)]
 
         if prazo_ini:
-            df_ags = df_ags[df_ags["prazo_rev_tran"].apply(
-                lambda v: v is not None and (v if isinstance(v, date) else _safe_date(v)) >= prazo_ini
-            )]
+            df_ags = df_ags[df_ags["prazo_rev_tran"] >= pd.Timestamp(prazo_ini)]
         if prazo_fim:
-            df_ags = df_ags[df_ags["prazo_rev_tran"].apply(
-                lambda v: v is not None and (v if isinstance(v, date) else _safe_date(v)) <= prazo_fim
-            )]
-
-        df_ags["data_visita_fmt"] = df_ags["data_visita"].apply(_fmt_date)
-        df_ags["prazo_fmt"]       = df_ags["prazo_rev_tran"].apply(_fmt_date)
-        df_ags["status_atuacao"]  = df_ags.apply(
-            lambda r: _status_atuacao(r.get("desfecho_atendimento"), r.get("status_revisao"), r.get("status_transcricao")),
-            axis=1,
-        )
+            df_ags = df_ags[df_ags["prazo_rev_tran"] <= pd.Timestamp(prazo_fim)]
+
+        df_ags["data_visita_fmt"] = pd.to_datetime(df_ags["data_visita"], errors="coerce").dt.strftime("%d/%m/%Y").fillna("")
 
         # =====================================================
         # AGGRID
         # =====================================================
         col_map = {
             "status_atuacao":       "Status Atuação",
-            "prazo_fmt":            "Prazo Rev/Tran",
+            "prazo_rev_tran":       "Prazo Rev/Tran",
             "estudo":               "Estudo",
             "id_paciente":          "ID Paciente",
             "nome_paciente":        "Nome Paciente",
             "visita":               "Visita",
-            "data_visita_fmt":      "Data Visita",
+            "data_visita":          "Data Visita",
             "desfecho_atendimento": "Desfecho",
             "status_confirmacao":   "Confirmação",
             "medico_responsavel":   "Médico",
@@ -464,21 +327,20 @@ def page_dados_agenda():
         df_grid = df_ags[src_cols + ["id"]].copy()
         df_grid.rename(columns={k: v for k, v in col_map.items() if k in df_grid.columns}, inplace=True)
 
-        gb = GridOptionsBuilder.from_dataframe(df_grid)
-        gb.configure_column("id", hide=True)
-        gb.configure_column("_farol", headerName="Farol", width=70,
-                            pinned="left", suppressMenu=True, sortable=False, filter=False)
-        gb.configure_column("Data Visita", comparator=_DATE_CMP_JS, type=["customComparator"])
-        gb.configure_column("Prazo Rev/Tran", comparator=_DATE_CMP_JS, type=["customComparator"])
-        gb.configure_default_column(resizable=True, sortable=True, filter=True, minWidth=100)
-        gb.configure_selection("single", use_checkbox=False)
-        gb.configure_grid_options(rowHeight=36)
-
-        grid_resp = AgGrid(
+        def _configurar_grid(gb):
+            gb.configure_column("id", hide=True)
+            gb.configure_column("_farol", headerName="Farol", width=70, pinned="left", suppressMenu=True)
+            gb.configure_default_column(resizable=True, minWidth=100)
+            gb.configure_selection("single", use_checkbox=False)
+            gb.configure_grid_options(rowHeight=36)
+
+        grid_resp = grid_paginado(
             df_grid,
-            gridOptions=gb.build(),
+            key="dados_agenda",
+            configurar=_configurar_grid,
+            colunas_data=["Data Visita", "Prazo Rev/Tran"],
+            ordem_padrao="Data Visita",
             update_mode=GridUpdateMode.SELECTION_CHANGED,
-            allow_unsafe_jscode=True,
             use_container_width=True,
             height=380,
         )
@@ -648,23 +510,14 @@ def page_dados_agenda():
                         "observacao":                       observacao or None,
                         "indice":                           indice or None,
                     }
+                    # Um upsert por id_agenda (uq_dados_agenda_id_agenda) em vez de update-ou-insert;
+                    # id_responsavel só entra na criação, então o upsert não o sobrescreve
+                    if dado.get("id"):
+                        payload["dt_atualizacao"] = pd.Timestamp.now(tz="UTC").isoformat()
+                    else:
+                        payload["id_responsavel"] = usuario_id
                     try:
-                        if dado.get("id"):
-                            payload["dt_atualizacao"] = pd.Timestamp.now(tz="UTC").isoformat()
-                            supabase_execute(
-                                lambda: supabase.table("tab_app_dados_agenda")
-                                .update(payload)
-                                .eq("id", int(dado["id"]))
-                                .execute()
-                            )
-                        else:
-                            payload["id_responsavel"] = usuario_id
-                            supabase_execute(
-                                lambda: supabase.table("tab_app_dados_agenda")
-                                .insert(payload)
-                                .execute()
-                            )
-                        _fetch_dados_agenda.clear()
+                        bulk_upsert(supabase, "tab_app_dados_agenda", [payload], on_conflict="id_agenda")
                         feedback("✅ Dados salvos com sucesso!", "success", "💾")
                         st.rerun()
                     except Exception as e:
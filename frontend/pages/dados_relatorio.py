@@ -4,35 +4,23 @@
 # ============================================================
 import streamlit as st
 import pandas as pd
-from datetime import date, datetime, timedelta, timezone
+from datetime import date, timedelta
 from io import BytesIO
 
-from st_aggrid import AgGrid, GridOptionsBuilder, GridUpdateMode, JsCode
+from st_aggrid import GridUpdateMode
 
-from frontend.supabase_client import get_supabase_client, supabase_execute
+from frontend.supabase_client import get_supabase_client, supabase_execute, fetch_in, depende_de
+from frontend.agenda_store import consultar_agendamentos
+from backend.engines.etapas import calcular_etapas, pivot_tempos, pivot_ultimo_status
+from frontend import dimensoes_cache as dim
+from frontend import tipos
+from frontend.components.grid import grid_paginado
 
 
 # ============================================================
 # HELPERS (mesmo padrão de agenda_relatorio)
 # ============================================================
 
-def _parse_ts_utc(val):
-    if val is None or (isinstance(val, float) and pd.isna(val)):
-        return None
-    ts = pd.to_datetime(val, errors="coerce", utc=True)
-    return None if pd.isna(ts) else ts
-
-
-def _ensure_utc(ts):
-    if ts is None:
-        return None
-    if not isinstance(ts, pd.Timestamp):
-        ts = pd.to_datetime(ts, errors="coerce")
-    if ts is None or pd.isna(ts):
-        return None
-    return ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
-
-
 def _hhmm(total_seconds: float) -> str:
     if pd.isna(total_seconds) or total_seconds is None:
         return "00:00"
@@ -40,60 +28,29 @@ def _hhmm(total_seconds: float) -> str:
     return f"{s // 3600:02d}:{(s % 3600) // 60:02d}"
 
 
-_STATUS_INICIO = {"Atendendo", "Em atendimento"}
 _ETAPAS_TEMPO  = [
     "status_medico", "status_enfermagem", "status_espirometria",
     "status_farmacia", "status_nutricionista",
 ]
 
-_DATE_CMP_JS = JsCode("""
-function(a, b) {
-    function p(d) {
-        if (!d) return null;
-        var x = d.split('/');
-        return new Date(parseInt(x[2]), parseInt(x[1])-1, parseInt(x[0]));
-    }
-    var da = p(a), db = p(b);
-    if (!da && !db) return 0;
-    if (!da) return -1;
-    if (!db) return 1;
-    return da < db ? -1 : da > db ? 1 : 0;
-}
-""")
+# Colunas formatadas (texto dd/mm/aaaa, usadas no Excel) -> datas reais enviadas ao grid
+_DATAS_GRID = {"data_visita_fmt": "data_visita_dt", "data_cadastro_fmt": "data_cadastro_dt"}
 
 
 # ============================================================
 # CACHED FETCHERS
 # ============================================================
 
-@st.cache_data(ttl=600, show_spinner=False)
 def _fetch_estudos(_supabase):
-    resp = supabase_execute(
-        lambda: _supabase.table("tab_app_estudos").select("id_estudo, estudo, disciplina").execute()
-    )
-    df = pd.DataFrame(resp.data) if resp.data else pd.DataFrame()
-    if not df.empty:
-        df.columns = [c.lower() for c in df.columns]
-    return df
+    return dim.estudos(_supabase, ["id_estudo", "estudo", "disciplina"])
 
 
-@st.cache_data(ttl=60, show_spinner=False)
 def _fetch_agendamentos(_supabase, data_ini_str, data_fim_str):
-    resp = supabase_execute(
-        lambda: _supabase.table("tab_app_agendamentos")
-        .select("*")
-        .gte("data_visita", data_ini_str)
-        .lte("data_visita", data_fim_str)
-        .order("id", desc=False)
-        .execute()
-    )
-    df = pd.DataFrame(resp.data) if resp.data else pd.DataFrame()
-    if not df.empty:
-        df.columns = [c.lower() for c in df.columns]
-    return df
+    return consultar_agendamentos(_supabase, data_ini=data_ini_str, data_fim=data_fim_str, ordem=("id",))
 
 
-@st.cache_data(ttl=30, show_spinner=False)
+@depende_de("tab_app_log_agendamentos")
+@st.cache_data(ttl=300, show_spinner=False)
 def _fetch_log_agendamentos(_supabase, agendamento_id):
     resp = supabase_execute(
         lambda: _supabase.table("tab_app_log_agendamentos")
@@ -108,17 +65,14 @@ def _fetch_log_agendamentos(_supabase, agendamento_id):
     return df
 
 
-@st.cache_data(ttl=60, show_spinner=False)
+@depende_de("tab_app_log_etapas")
+@st.cache_data(ttl=600, show_spinner=False)
 def _fetch_log_etapas(_supabase, ag_ids: tuple):
-    if not ag_ids:
-        return []
-    resp = supabase_execute(
-        lambda: _supabase.table("tab_app_log_etapas")
-        .select("agendamento_id, nome_etapa, status_etapa, data_hora_etapa")
-        .in_("agendamento_id", list(ag_ids))
-        .execute()
+    return fetch_in(
+        _supabase, "tab_app_log_etapas", "agendamento_id", ag_ids,
+        "id, agendamento_id, nome_etapa, status_etapa, data_hora_etapa",
+        formato="csv",
     )
-    return resp.data if resp.data else []
 
 
 # ============================================================
@@ -188,7 +142,7 @@ def page_dados_relatorio():
 
         if not df_ag.empty:
             df_ag = df_ag.rename(columns={"estudo": "nm_estudo"})
-            df_ag["data_visita_dt"]  = pd.to_datetime(df_ag["data_visita"],  errors="coerce")
+            df_ag["data_visita_dt"]  = tipos.data(df_ag, "data_visita")
             df_ag["data_cadastro_dt"] = pd.to_datetime(df_ag["data_cadastro"], errors="coerce")
 
         df_view = df_ag.copy()
@@ -212,17 +166,13 @@ def page_dados_relatorio():
             st.subheader("Agendamentos")
             st.caption("Clique em uma linha para ver o histórico de alterações")
 
-            _cad_naive = (
-                pd.to_datetime(df_view["data_cadastro"], errors="coerce", utc=True)
-                .dt.tz_convert(None).dt.normalize()
+            df_view["data_cadastro_dt"] = (
+                pd.to_datetime(df_view["data_cadastro"], errors="coerce", utc=True).dt.tz_convert(None)
             )
             df_view["data_visita_fmt"]   = df_view["data_visita_dt"].dt.strftime("%d/%m/%Y")
-            df_view["data_cadastro_fmt"] = (
-                pd.to_datetime(df_view["data_cadastro"], errors="coerce", utc=True)
-                .dt.tz_convert(None).dt.strftime("%d/%m/%Y %H:%M")
-            )
+            df_view["data_cadastro_fmt"] = df_view["data_cadastro_dt"].dt.strftime("%d/%m/%Y %H:%M")
             df_view["antecedencia_dias"] = (
-                df_view["data_visita_dt"].dt.normalize() - _cad_naive
+                df_view["data_visita_dt"].dt.normalize() - df_view["data_cadastro_dt"].dt.normalize()
             ).dt.days
 
             cols_ordered = [
@@ -241,27 +191,29 @@ def page_dados_relatorio():
             df_grid1 = df_view[cols_src].copy()
             df_grid1.rename(columns=cols_rename, inplace=True)
 
-            gb1 = GridOptionsBuilder.from_dataframe(df_grid1)
-            gb1.configure_selection(selection_mode="single", use_checkbox=False)
-            gb1.configure_default_column(filterable=True, sortable=True)
-            gb1.configure_column("Data Visita",          width=105, comparator=_DATE_CMP_JS)
-            gb1.configure_column("Data Criação",         width=130)
-            gb1.configure_column("ID Paciente",          width=95)
-            gb1.configure_column("Paciente",             width=170)
-            gb1.configure_column("Tipo Visita",          width=105)
-            gb1.configure_column("Visita",               width=80)
-            gb1.configure_column("Desfecho Atendimento", width=160)
-            gb1.configure_column("Antecedência (dias)",  width=135)
-            gb1.configure_column("ID",                   width=65)
-
-            grid_resp1 = AgGrid(
-                df_grid1,
-                gridOptions=gb1.build(),
+            df_grid1_dt = df_view[[_DATAS_GRID.get(c, c) for c in cols_src]].copy()
+            df_grid1_dt.columns = list(df_grid1.columns)
+
+            def _configurar_grid1(gb1):
+                gb1.configure_selection(selection_mode="single", use_checkbox=False)
+                gb1.configure_column("Data Visita",          width=105)
+                gb1.configure_column("Data Criação",         width=130)
+                gb1.configure_column("ID Paciente",          width=95)
+                gb1.configure_column("Paciente",             width=170)
+                gb1.configure_column("Tipo Visita",          width=105)
+                gb1.configure_column("Visita",               width=80)
+                gb1.configure_column("Desfecho Atendimento", width=160)
+                gb1.configure_column("Antecedência (dias)",  width=135)
+                gb1.configure_column("ID",                   width=65)
+
+            grid_resp1 = grid_paginado(
+                df_grid1_dt,
+                key="aggrid_log",
+                configurar=_configurar_grid1,
+                colunas_data=["Data Visita", "Data Criação"],
                 update_mode=GridUpdateMode.SELECTION_CHANGED,
                 height=300,
                 theme="streamlit",
-                allow_unsafe_jscode=True,
-                key="aggrid_log",
             )
 
             sel1 = grid_resp1["selected_rows"]
@@ -371,18 +323,6 @@ def page_dados_relatorio():
         # =====================================================
         with st.expander("📄 Relatório Personalizado"):
             df_visao = df_view.copy()
-            _cad_vp  = (
-                pd.to_datetime(df_visao["data_cadastro"], errors="coerce", utc=True)
-                .dt.tz_convert(None).dt.normalize()
-            )
-            df_visao["data_visita_fmt"]   = df_visao["data_visita_dt"].dt.strftime("%d/%m/%Y")
-            df_visao["data_cadastro_fmt"] = (
-                pd.to_datetime(df_visao["data_cadastro"], errors="coerce", utc=True)
-                .dt.tz_convert(None).dt.strftime("%d/%m/%Y %H:%M")
-            )
-            df_visao["antecedencia_dias"] = (
-                df_visao["data_visita_dt"].dt.normalize() - _cad_vp
-            ).dt.days
 
             colunas_disponiveis = {
                 "data_visita_fmt":      "Data Visita",
@@ -427,20 +367,21 @@ def page_dados_relatorio():
                 df_vp = df_visao[[n2o[n] for n in colunas_sel]].copy()
                 df_vp.rename(columns=colunas_disponiveis, inplace=True)
 
-                gb_vp = GridOptionsBuilder.from_dataframe(df_vp)
-                gb_vp.configure_default_column(editable=False, groupable=True, filterable=True, sorteable=True)
-                gb_vp.configure_side_bar()
-                if "Data Visita" in df_vp.columns:
-                    gb_vp.configure_column("Data Visita", comparator=_DATE_CMP_JS)
+                df_vp_dt = df_visao[[_DATAS_GRID.get(n2o[n], n2o[n]) for n in colunas_sel]].copy()
+                df_vp_dt.columns = list(df_vp.columns)
+
+                def _configurar_grid_vp(gb_vp):
+                    gb_vp.configure_default_column(editable=False)
+                    gb_vp.configure_side_bar()
 
-                AgGrid(
-                    df_vp,
-                    gridOptions=gb_vp.build(),
+                grid_paginado(
+                    df_vp_dt,
+                    key="aggrid_personalizado",
+                    configurar=_configurar_grid_vp,
+                    colunas_data=["Data Visita", "Data Cadastro"],
                     update_mode=GridUpdateMode.NO_UPDATE,
-                    allow_unsafe_jscode=True,
                     theme="streamlit",
                     height=400,
-                    key="aggrid_personalizado",
                 )
 
                 col_d_vp, col_i_vp = st.columns([1, 3])
@@ -467,77 +408,24 @@ def page_dados_relatorio():
             ag_ids   = tuple(df_view["id"].tolist())
             logs_all = _fetch_log_etapas(supabase, ag_ids)
 
-            df_logs_rel = pd.DataFrame(logs_all)
-
-            if not df_logs_rel.empty:
-                df_logs_rel.columns = [c.lower() for c in df_logs_rel.columns]
-                df_logs_rel["ts"]   = df_logs_rel["data_hora_etapa"].apply(_parse_ts_utc)
-                df_logs_rel         = df_logs_rel.dropna(subset=["ts"])
+            df_etapas = calcular_etapas(logs_all)
 
-                now_utc      = pd.Timestamp(datetime.now(timezone.utc))
-                df_ls        = df_logs_rel.sort_values(["agendamento_id", "nome_etapa", "ts"])
-
-                last_status = (
-                    df_ls.groupby(["agendamento_id", "nome_etapa"])["status_etapa"]
-                    .last().reset_index()
-                    .rename(columns={"status_etapa": "ultimo_status"})
-                )
+            if not df_etapas.empty:
+                pivot_time = pivot_tempos(df_etapas, _ETAPAS_TEMPO)
+                sum_sec    = pivot_time.sum(axis=1).reset_index(name="total_sec")
+                sum_sec["Total (HH:MM)"] = sum_sec["total_sec"].apply(_hhmm)
+                sum_sec    = sum_sec.drop(columns=["total_sec"])
 
-                durations = []
-                for (ag_id, etapa), grp in df_ls.groupby(["agendamento_id", "nome_etapa"]):
-                    grp       = grp.reset_index(drop=True)
-                    total_sec = 0.0
-                    for i, row in grp.iterrows():
-                        if row["status_etapa"] not in _STATUS_INICIO:
-                            continue
-                        t_ini  = _ensure_utc(row["ts"])
-                        t_fim  = _ensure_utc(grp.loc[i + 1, "ts"]) if i + 1 < len(grp) else now_utc
-                        if t_ini is None or t_fim is None:
-                            continue
-                        delta = (t_fim - t_ini).total_seconds()
-                        if delta > 0:
-                            total_sec += delta
-                    durations.append({"agendamento_id": ag_id, "nome_etapa": etapa, "tempo_sec": total_sec})
-
-                df_dur   = pd.DataFrame(durations)
-                df_stage = pd.merge(df_dur, last_status, on=["agendamento_id", "nome_etapa"], how="left")
-
-                pivot_time = (
-                    df_stage.pivot_table(
-                        index="agendamento_id", columns="nome_etapa",
-                        values="tempo_sec", aggfunc="sum", fill_value=0.0,
-                    )
-                    .reindex(columns=_ETAPAS_TEMPO, fill_value=0.0)
-                    .reset_index()
-                )
+                pivot_time = pivot_time.reset_index()
                 for etapa in _ETAPAS_TEMPO:
                     if etapa in pivot_time.columns:
                         pivot_time[f"Tempo {etapa.split('_', 1)[1].title()} (HH:MM)"] = pivot_time[etapa].apply(_hhmm)
                         del pivot_time[etapa]
 
-                pivot_last = (
-                    df_stage.pivot_table(
-                        index="agendamento_id", columns="nome_etapa",
-                        values="ultimo_status", aggfunc="last",
-                    )
-                    .reindex(columns=_ETAPAS_TEMPO)
-                    .reset_index()
-                )
+                pivot_last = pivot_ultimo_status(df_etapas, _ETAPAS_TEMPO).reset_index()
                 for etapa in _ETAPAS_TEMPO:
                     if etapa in pivot_last.columns:
                         pivot_last.rename(columns={etapa: f"Último {etapa.split('_', 1)[1].title()}"}, inplace=True)
-
-                sum_sec = (
-                    df_stage.pivot_table(
-                        index="agendamento_id", columns="nome_etapa",
-                        values="tempo_sec", aggfunc="sum", fill_value=0.0,
-                    )
-                    .reindex(columns=_ETAPAS_TEMPO, fill_value=0.0)
-                    .sum(axis=1)
-                    .reset_index(name="total_sec")
-                )
-                sum_sec["Total (HH:MM)"] = sum_sec["total_sec"].apply(_hhmm)
-                sum_sec = sum_sec.drop(columns=["total_sec"])
             else:
                 ag_ids_list = list(ag_ids)
                 pivot_time  = pd.DataFrame({"agendamento_id": ag_ids_list})
@@ -4,10 +4,12 @@
 # ============================================================
 import streamlit as st
 import pandas as pd
-from frontend.supabase_client import get_supabase_client
+from frontend.supabase_client import get_supabase_client, depende_de, invalidar_tabela
 from frontend.components.feedback import feedback
+from frontend import projecoes
 
 
+@depende_de("tab_app_variaveis")
 @st.cache_data(ttl=300)
 def load_variaveis_por_uso():
     """Carrega variáveis agrupadas por uso para facilitar seleção."""
@@ -63,7 +65,7 @@ def aba_estudos(usuario_logado: str):
         supabase = get_supabase_client()
         
         # Busca todos os estudos
-        response = supabase.table("tab_app_estudos").select("*").order("estudo").execute()
+        response = supabase.table("tab_app_estudos").select(projecoes.select("estudos")).order("estudo").execute()
         df_estudos = pd.DataFrame(response.data) if response.data else pd.DataFrame()
         
     except Exception as e:
@@ -111,7 +113,7 @@ def aba_estudos(usuario_logado: str):
         if status_filtro:
             df_filtrado = df_filtrado[df_filtrado["status"].isin(status_filtro)]
 
-        # Todos os campos da tabela (sn_ativo é substituído pela coluna status já formatada)
+        # Campos da projeção "estudos" (sn_ativo é substituído pela coluna status já formatada)
         cols_estudo = [c for c in df_filtrado.columns if c != "sn_ativo"]
 
         st.dataframe(
@@ -239,6 +241,7 @@ def aba_estudos(usuario_logado: str):
                         "sn_ativo": True
                     }).execute()
                     
+                    invalidar_tabela("tab_app_estudos")
                     feedback(f"✅ Estudo '{estudo}' criado com sucesso!", "success", "🎉")
                     st.rerun()
                     
@@ -354,6 +357,7 @@ def aba_estudos(usuario_logado: str):
                                 "sn_ativo": novo_status
                             }).eq("estudo", estudo_sel).execute()
                             
+                            invalidar_tabela("tab_app_estudos")
                             feedback(f"✅ Estudo '{novo_nome}' atualizado!", "success", "💾")
                             st.rerun()
                             
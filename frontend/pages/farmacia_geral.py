@@ -7,13 +7,12 @@ import pandas as pd
 from datetime import datetime, date
 from io import BytesIO
 
-from frontend.supabase_client import get_supabase_client, supabase_execute
+from frontend.supabase_client import get_supabase_client
+from frontend import dimensoes_cache as dim
+from frontend import farmacia_saldos as saldos
 from frontend.components.feedback import feedback
 
 
-TABLE_MOVS = "tab_app_farmacia_movimentacoes"
-
-
 def fmt_date_br(d) -> str:
     """Formata datas (str/date/datetime) para dd/mm/aaaa apenas para exibição."""
     if d in (None, "", "N/A"):
@@ -65,37 +64,23 @@ def page_farmacia_geral():
         supabase = get_supabase_client()
 
         # ---------------------------
-        # Carregar dados
+        # Carregar dados (saldos já agregados pelo banco)
         # ---------------------------
-        resp_movs = supabase_execute(lambda: supabase.table(TABLE_MOVS).select("*").execute())
-        df_movs = pd.DataFrame(resp_movs.data) if resp_movs.data else pd.DataFrame()
+        df_saldos = saldos.fetch_saldos(supabase)
 
-        if df_movs.empty:
+        if df_saldos.empty:
             st.warning("Nenhuma movimentação registrada.")
             return
 
-        resp_estudos = supabase_execute(
-            lambda: supabase.table("tab_app_estudos").select("id_estudo, estudo").execute()
-        )
-        df_estudos = pd.DataFrame(resp_estudos.data) if resp_estudos.data else pd.DataFrame()
-
-        resp_produtos = supabase_execute(
-            lambda: supabase.table("produtos").select("id, nome, tipo_produto").execute()
-        )
-        df_produtos = pd.DataFrame(resp_produtos.data) if resp_produtos.data else pd.DataFrame()
+        df_estudos = dim.estudos(supabase, ["id_estudo", "estudo"])
+        df_produtos = dim.produtos(supabase, ["id", "nome", "tipo_produto"])
 
         # ---------------------------
-        # Normalização + enriquecimento
+        # Enriquecimento
         # ---------------------------
-        df_movs.columns = [c.lower() for c in df_movs.columns]
         if not df_estudos.empty:
-            df_estudos.columns = [c.lower() for c in df_estudos.columns]
-        if not df_produtos.empty:
-            df_produtos.columns = [c.lower() for c in df_produtos.columns]
-
-        if not df_estudos.empty:
-            df_movs = pd.merge(
-                df_movs,
+            df_saldos = pd.merge(
+                df_saldos,
                 df_estudos,
                 left_on="estudo_id",
                 right_on="id_estudo",
@@ -104,8 +89,8 @@ def page_farmacia_geral():
             ).rename(columns={"estudo": "nm_estudo"})
 
         if not df_produtos.empty:
-            df_movs = pd.merge(
-                df_movs,
+            df_saldos = pd.merge(
+                df_saldos,
                 df_produtos,
                 left_on="produto_id",
                 right_on="id",
@@ -114,28 +99,23 @@ def page_farmacia_geral():
             ).rename(columns={"nome": "nm_produto"})
 
         # Campos de interesse (mantendo validade como string)
-        df = df_movs[
-            [
-                "id",
-                "data",
-                "tipo_transacao",
+        df = df_saldos.reindex(
+            columns=[
                 "nm_estudo",
                 "nm_produto",
                 "tipo_produto",
-                "quantidade",
+                "entradas",
+                "saidas",
                 "validade",
                 "lote",
             ]
-        ].copy()
+        ).copy()
 
         # Normalização para evitar NaN no agrupamento
-        df[["nm_estudo", "nm_produto", "validade", "lote", "tipo_transacao", "tipo_produto"]] = (
-            df[["nm_estudo", "nm_produto", "validade", "lote", "tipo_transacao", "tipo_produto"]].fillna("")
+        df[["nm_estudo", "nm_produto", "validade", "lote", "tipo_produto"]] = (
+            df[["nm_estudo", "nm_produto", "validade", "lote", "tipo_produto"]].fillna("")
         )
 
-        # Tipos numéricos
-        df["quantidade"] = pd.to_numeric(df["quantidade"], errors="coerce").fillna(0)
-
         # ---------------------------
         # Filtros superiores
         # ---------------------------
@@ -208,12 +188,9 @@ def page_farmacia_geral():
             st.info("Nenhum item para exibir com os filtros atuais.")
             return
 
-        df["Entradas"] = (df["tipo_transacao"] == "Entrada").astype(int) * df["quantidade"].astype(float)
-        df["Saidas"] = (df["tipo_transacao"] == "Saída").astype(int) * df["quantidade"].astype(float)
-
         agrupado = (
             df.groupby(["nm_estudo", "nm_produto", "tipo_produto", "validade", "lote"], dropna=False)
-            .agg(Entradas=("Entradas", "sum"), Saidas=("Saidas", "sum"))
+            .agg(Entradas=("entradas", "sum"), Saidas=("saidas", "sum"))
             .reset_index()
         )
 
@@ -7,7 +7,10 @@ import pandas as pd
 from datetime import date, datetime
 from io import BytesIO
 
-from frontend.supabase_client import get_supabase_client, supabase_execute
+from frontend.supabase_client import get_supabase_client, supabase_execute, fetch_all
+from frontend import dimensoes_cache as dim
+from frontend import projecoes
+from frontend import tipos
 from frontend.components.feedback import feedback
 
 
@@ -51,23 +54,6 @@ def safe_date_value(value, fallback: date | None = None) -> date | None:
         return fallback
 
 
-def parse_variaveis(valor_str: str) -> list:
-    """Parse de valores a partir de uma string."""
-    if not valor_str:
-        return []
-
-    if "\n" in valor_str:
-        valores = [v.strip() for v in valor_str.split("\n") if v.strip()]
-    elif ";" in valor_str:
-        valores = [v.strip() for v in valor_str.split(";") if v.strip()]
-    elif "," in valor_str:
-        valores = [v.strip() for v in valor_str.split(",") if v.strip()]
-    else:
-        valores = [valor_str.strip()]
-
-    return valores
-
-
 def page_farmacia_lancamentos():
     """Página para visualização e gerenciamento de lançamentos."""
     st.title("📜 Lançamentos Realizados - Farmácia")
@@ -92,48 +78,29 @@ def page_farmacia_lancamentos():
     try:
         supabase = get_supabase_client()
 
-        # Busca movimentações
-        resp_movs = supabase_execute(lambda: supabase.table(TABLE_MOVS).select("*").execute())
-        df_movs = pd.DataFrame(resp_movs.data) if resp_movs.data else pd.DataFrame()
+        # Busca movimentações (o livro inteiro: CSV + pyarrow em vez de JSON)
+        df_movs = fetch_all(
+            lambda: supabase.table(TABLE_MOVS).select(projecoes.select("farmacia_movimentacoes")).order("id"),
+            esquema=TABLE_MOVS,
+            formato="csv",
+        )
+        # Contrato de sempre (object/None) para fillna e merges; data_dt/validade_dt ficam
+        df_movs = tipos.para_pagina(df_movs)
 
         if df_movs.empty:
             st.warning("Nenhum lançamento registrado.")
             return
 
-        # Busca estudos
-        resp_estudos = supabase_execute(
-            lambda: supabase.table("tab_app_estudos").select("id_estudo, estudo").execute()
-        )
-        df_estudos = pd.DataFrame(resp_estudos.data) if resp_estudos.data else pd.DataFrame()
-
-        # Busca produtos
-        resp_produtos = supabase_execute(
-            lambda: supabase.table("produtos").select("id, nome, tipo_produto").execute()
-        )
-        df_produtos = pd.DataFrame(resp_produtos.data) if resp_produtos.data else pd.DataFrame()
+        # Dimensões (cache compartilhado)
+        df_estudos = dim.estudos(supabase, ["id_estudo", "estudo"])
+        df_produtos = dim.produtos(supabase, ["id", "nome", "tipo_produto"])
 
         # Variáveis para select
-        resp_localizacao = supabase_execute(
-            lambda: supabase.table("tab_app_variaveis").select("valor").eq("uso", "localizacao").execute()
-        )
-        resp_tipo_acao = supabase_execute(
-            lambda: supabase.table("tab_app_variaveis").select("valor").eq("uso", "tipo_de_acao").execute()
-        )
-
-        localizacoes = []
-        if resp_localizacao.data and resp_localizacao.data[0].get("valor"):
-            localizacoes = parse_variaveis(resp_localizacao.data[0]["valor"])
-
-        tipos_acao = []
-        if resp_tipo_acao.data and resp_tipo_acao.data[0].get("valor"):
-            tipos_acao = parse_variaveis(resp_tipo_acao.data[0]["valor"])
+        localizacoes = dim.variavel(supabase, "localizacao")
+        tipos_acao = dim.variavel(supabase, "tipo_de_acao")
 
         # Normaliza colunas
         df_movs.columns = [c.lower() for c in df_movs.columns]
-        if not df_estudos.empty:
-            df_estudos.columns = [c.lower() for c in df_estudos.columns]
-        if not df_produtos.empty:
-            df_produtos.columns = [c.lower() for c in df_produtos.columns]
 
         # Merges
         if not df_estudos.empty and "estudo_id" in df_movs.columns:
@@ -155,11 +122,11 @@ def page_farmacia_lancamentos():
             ).rename(columns={"nome": "nm_produto"})
 
         # Datas para filtro/exibição (blindado contra NaT)
-        df_movs["data_dt"] = pd.to_datetime(df_movs.get("data"), errors="coerce")
+        df_movs["data_dt"] = tipos.data(df_movs, "data")
         df_movs["data_brl"] = df_movs["data_dt"].apply(fmt_date)
 
-        # validade é varchar no schema, então nem sempre é data -> blindar
-        df_movs["validade_dt"] = pd.to_datetime(df_movs.get("validade"), errors="coerce")
+        # validade é varchar no schema, então nem sempre é data (NaT quando não é)
+        df_movs["validade_dt"] = tipos.data(df_movs, "validade")
         df_movs["validade_brl"] = df_movs["validade_dt"].apply(fmt_date)
 
         # Normaliza valores vazios
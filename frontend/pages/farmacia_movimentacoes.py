@@ -8,6 +8,9 @@ from datetime import date, datetime
 from io import BytesIO
 
 from frontend.supabase_client import get_supabase_client, supabase_execute
+from frontend import dimensoes_cache as dim
+from frontend import projecoes
+from frontend import farmacia_saldos as saldos
 from frontend.components.feedback import feedback
 
 
@@ -29,52 +32,16 @@ def fmt_date(d) -> str:
         return str(d)
 
 
-def parse_variaveis(valor_str: str) -> list:
-    """Parse de valores a partir de uma string."""
-    if not valor_str:
-        return []
-
-    if "\n" in valor_str:
-        valores = [v.strip() for v in valor_str.split("\n") if v.strip()]
-    elif ";" in valor_str:
-        valores = [v.strip() for v in valor_str.split(";") if v.strip()]
-    elif "," in valor_str:
-        valores = [v.strip() for v in valor_str.split(",") if v.strip()]
-    else:
-        valores = [valor_str.strip()]
-
-    return valores
-
-
 def obter_saldo(estudo_id: int, produto_id: int, validade, lote) -> int:
     """
-    Calcula o saldo atual de um produto considerando entradas e saídas.
+    Saldo atual de um produto (entradas - saídas), lido da tabela de saldos
+    mantida pelo banco.
 
     validade: date|datetime|str|None
     lote: str|None
     """
     try:
-        supabase = get_supabase_client()
-
-        query = supabase.table(TABLE_MOVS).select("tipo_transacao, quantidade")
-
-        if estudo_id:
-            query = query.eq("estudo_id", estudo_id)
-        if produto_id:
-            query = query.eq("produto_id", produto_id)
-
-        if validade:
-            query = query.eq("validade", str(validade))
-        if lote:
-            query = query.eq("lote", lote)
-
-        resp = supabase_execute(lambda: query.execute())
-        movs = resp.data or []
-
-        entradas = sum(int(m.get("quantidade") or 0) for m in movs if m.get("tipo_transacao") == "Entrada")
-        saidas = sum(int(m.get("quantidade") or 0) for m in movs if m.get("tipo_transacao") == "Saída")
-
-        return entradas - saidas
+        return saldos.obter_saldo(get_supabase_client(), estudo_id, produto_id, validade, lote)
 
     except Exception as e:
         st.error(f"Erro ao calcular saldo: {str(e)}")
@@ -109,34 +76,12 @@ def page_farmacia_movimentacoes():
         # =====================================================
         # CARREGAR DIMENSÕES
         # =====================================================
-        resp_estudos = supabase_execute(
-            lambda: supabase.table("tab_app_estudos").select("id_estudo, estudo").order("estudo").execute()
-        )
-        resp_produtos = supabase_execute(
-            lambda: supabase.table("produtos").select("id, nome, estudo_id, tipo_produto").order("nome").execute()
-        )
-        resp_localizacao = supabase_execute(
-            lambda: supabase.table("tab_app_variaveis").select("valor").eq("uso", "localizacao").execute()
-        )
-        resp_tipo_acao = supabase_execute(
-            lambda: supabase.table("tab_app_variaveis").select("valor").eq("uso", "tipo_de_acao").execute()
-        )
-
-        df_estudos = pd.DataFrame(resp_estudos.data) if resp_estudos.data else pd.DataFrame()
-        df_produtos = pd.DataFrame(resp_produtos.data) if resp_produtos.data else pd.DataFrame()
-
-        if not df_estudos.empty:
-            df_estudos.columns = [c.lower() for c in df_estudos.columns]
-        if not df_produtos.empty:
-            df_produtos.columns = [c.lower() for c in df_produtos.columns]
+        df_estudos = dim.estudos(supabase, ["id_estudo", "estudo"])
+        df_produtos = dim.produtos(supabase, ["id", "nome", "estudo_id", "tipo_produto"])
 
-        localizacoes = []
-        if resp_localizacao.data and resp_localizacao.data[0].get("valor"):
-            localizacoes = parse_variaveis(resp_localizacao.data[0]["valor"])
-
-        tipos_acao = []
-        if resp_tipo_acao.data and resp_tipo_acao.data[0].get("valor"):
-            tipos_acao = parse_variaveis(resp_tipo_acao.data[0]["valor"])
+        variaveis = dim.variaveis(supabase, ["localizacao", "tipo_de_acao"])
+        localizacoes = variaveis["localizacao"]
+        tipos_acao = variaveis["tipo_de_acao"]
 
         # =====================================================
         # FORM (SEM st.form): dependências ao vivo (Estudo -> Produto)
@@ -214,23 +159,11 @@ def page_farmacia_movimentacoes():
             lote = st.text_input("Lote", key="lote_entrada")
 
         else:
-            resp_base = supabase_execute(
-                lambda: supabase.table(TABLE_MOVS).select("validade, lote, estudo_id, produto_id").execute()
-            )
-            df_base = pd.DataFrame(resp_base.data) if resp_base.data else pd.DataFrame()
-
-            if not df_base.empty:
-                df_base.columns = [c.lower() for c in df_base.columns]
-
-                if (estudo_id is not None) and ("estudo_id" in df_base.columns):
-                    df_base = df_base[df_base["estudo_id"] == estudo_id]
-                else:
-                    df_base = df_base.iloc[0:0]
-
-                if (produto_id is not None) and ("produto_id" in df_base.columns):
-                    df_base = df_base[df_base["produto_id"] == produto_id]
-                else:
-                    df_base = df_base.iloc[0:0]
+            # Validades/lotes já movimentados para o estudo+produto (tabela de saldos)
+            if (estudo_id is not None) and (produto_id is not None):
+                df_base = saldos.fetch_saldos(supabase, produto_ids=(int(produto_id),), estudo_id=int(estudo_id))
+            else:
+                df_base = pd.DataFrame()
 
             if not df_base.empty and "validade" in df_base.columns:
                 vdates = pd.to_datetime(df_base["validade"], errors="coerce").dt.date.dropna().drop_duplicates().sort_values().tolist()
@@ -245,7 +178,7 @@ def page_farmacia_movimentacoes():
             validade = validade_map.get(validade_label)
 
             if not df_base.empty and "lote" in df_base.columns:
-                lotes = df_base["lote"].dropna().drop_duplicates().sort_values().astype(str).tolist()
+                lotes = df_base.loc[df_base["lote"] != "", "lote"].drop_duplicates().sort_values().astype(str).tolist()
             else:
                 lotes = []
 
@@ -330,7 +263,11 @@ def page_farmacia_movimentacoes():
 
         try:
             resp_movs = supabase_execute(
-                lambda: supabase.table(TABLE_MOVS).select("*").order("data", desc=True).limit(100).execute()
+                lambda: supabase.table(TABLE_MOVS)
+                .select(projecoes.select("farmacia_movimentacoes"))
+                .order("data", desc=True)
+                .limit(100)
+                .execute()
             )
             df_movs = pd.DataFrame(resp_movs.data) if resp_movs.data else pd.DataFrame()
 
@@ -8,31 +8,13 @@ import time
 from datetime import datetime
 
 from frontend.supabase_client import get_supabase_client, supabase_execute
+from frontend import dimensoes_cache as dim
 from frontend.components.feedback import feedback
 
 
 TABLE_MOVS = "tab_app_farmacia_movimentacoes"
 
 
-def parse_variaveis(valor_str: str) -> list:
-    """Parse de valores a partir de uma string."""
-    if not valor_str:
-        return []
-
-    valor_str = str(valor_str)
-
-    if "\n" in valor_str:
-        valores = [v.strip() for v in valor_str.split("\n") if v.strip()]
-    elif ";" in valor_str:
-        valores = [v.strip() for v in valor_str.split(";") if v.strip()]
-    elif "," in valor_str:
-        valores = [v.strip() for v in valor_str.split(",") if v.strip()]
-    else:
-        valores = [valor_str.strip()] if valor_str.strip() else []
-
-    return valores
-
-
 def _toast_after_rerun():
     """Mostra toast de sucesso após rerun (padrão agenda)."""
     if st.session_state.get("_farmacia_prod_save_ok"):
@@ -69,27 +51,14 @@ def page_farmacia_produtos():
         supabase = get_supabase_client()
 
         # Busca dados
-        resp_estudos = supabase_execute(
-            lambda: supabase.table("tab_app_estudos").select("id_estudo, estudo").order("estudo").execute()
-        )
+        # Produtos vêm direto da tabela (todas as colunas, sempre atuais nesta tela de cadastro)
         resp_produtos = supabase_execute(lambda: supabase.table("produtos").select("*").order("nome").execute())
-        resp_tipos = supabase_execute(
-            lambda: supabase.table("tab_app_variaveis").select("valor").eq("uso", "tipo_produto").execute()
-        )
-
-        df_estudos = pd.DataFrame(resp_estudos.data) if resp_estudos.data else pd.DataFrame()
         df_produtos = pd.DataFrame(resp_produtos.data) if resp_produtos.data else pd.DataFrame()
-
-        # Normaliza colunas
-        if not df_estudos.empty:
-            df_estudos.columns = [c.lower() for c in df_estudos.columns]
         if not df_produtos.empty:
             df_produtos.columns = [c.lower() for c in df_produtos.columns]
 
-        # Parse tipos de produto (variáveis)
-        tipos_produto = []
-        if resp_tipos.data and resp_tipos.data[0].get("valor"):
-            tipos_produto = parse_variaveis(resp_tipos.data[0]["valor"])
+        df_estudos = dim.estudos(supabase, ["id_estudo", "estudo"])
+        tipos_produto = dim.variavel(supabase, "tipo_produto")
 
         # =====================================================
         # 📥 CADASTRAR NOVO PRODUTO
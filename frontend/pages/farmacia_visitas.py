@@ -7,13 +7,13 @@ import pandas as pd
 from datetime import date, datetime
 from io import BytesIO
 
-from frontend.supabase_client import get_supabase_client, supabase_execute
+from frontend.supabase_client import get_supabase_client
+from frontend.agenda_store import consultar_agendamentos
+from frontend import dimensoes_cache as dim
+from frontend import tipos
 from frontend.components.feedback import feedback
 
 
-TABLE_AGENDAMENTOS = "tab_app_agendamentos"
-
-
 def fmt_date(d) -> str:
     """Formata date/datetime/str para dd/mm/aaaa."""
     if d in (None, "", "N/A"):
@@ -37,25 +37,19 @@ def page_farmacia_visitas():
         supabase = get_supabase_client()
 
         # Busca estudos
-        resp_estudos = supabase_execute(
-            lambda: supabase.table("tab_app_estudos").select("id_estudo, estudo").execute()
-        )
-        df_estudos = pd.DataFrame(resp_estudos.data) if resp_estudos.data else pd.DataFrame()
+        df_estudos = dim.estudos(supabase, ["id_estudo", "estudo"])
 
         # Tipos desejados (agora texto, não ID)
         tipos_desejados = {"PRESENCIAL", "EXTERNA"}
 
         # Busca agendamentos (NOVA TABELA)
-        resp_agendamentos = supabase_execute(lambda: supabase.table(TABLE_AGENDAMENTOS).select("*").execute())
-        df_agendamentos = pd.DataFrame(resp_agendamentos.data) if resp_agendamentos.data else pd.DataFrame()
+        df_agendamentos = consultar_agendamentos(supabase, ordem=("id",))
 
         if df_agendamentos.empty:
             st.warning("Nenhum agendamento registrado.")
             return
 
         # Normaliza colunas
-        if not df_estudos.empty:
-            df_estudos.columns = [c.lower() for c in df_estudos.columns]
         df_agendamentos.columns = [c.lower() for c in df_agendamentos.columns]
 
         # Merge com estudos
@@ -69,7 +63,7 @@ def page_farmacia_visitas():
             ).rename(columns={"estudo": "nm_estudo"})
 
         # Converte datas
-        df_agendamentos["data_visita_dt"] = pd.to_datetime(df_agendamentos.get("data_visita"), errors="coerce")
+        df_agendamentos["data_visita_dt"] = tipos.data(df_agendamentos, "data_visita")
         df_agendamentos["Data Visita (BR)"] = df_agendamentos["data_visita_dt"].apply(fmt_date)
 
         # Normaliza tipo_visita (texto)
@@ -139,11 +133,11 @@ def page_farmacia_visitas():
         try:
             df_agrup = df_view.copy()
 
-            tipos = set(tipos_desejados)
+            tipos_filtro = set(tipos_desejados)
             if mostrar_remota:
-                tipos.add("REMOTA")
+                tipos_filtro.add("REMOTA")
 
-            df_agrup = df_agrup[df_agrup["tipo_visita_norm"].isin(tipos)]
+            df_agrup = df_agrup[df_agrup["tipo_visita_norm"].isin(tipos_filtro)]
 
             if df_agrup.empty:
                 st.info("Nenhuma visita encontrada com os filtros aplicados.")
@@ -6,45 +6,32 @@ import streamlit as st
 import pandas as pd
 from datetime import date, timedelta
 
-from frontend.supabase_client import get_supabase_client, supabase_execute
+from frontend.supabase_client import get_supabase_client, supabase_execute, depende_de, bulk_upsert
+from frontend.agenda_store import consultar_agendamentos
+from frontend import dimensoes_cache as dim
+from frontend import projecoes
 from frontend.components.feedback import feedback
+from frontend.components.editor import linhas_editadas
 
 TABLE_MODELO = "tab_app_modelo_awb"
+# Chave natural da matriz (constraint uq_modelo_awb_chave)
+CHAVE_MODELO = "data_visita,id_estudo,laboratorio,courier,temperatura"
 
 
 # ============================================================
 # HELPERS
 # ============================================================
 
-def _parse_variaveis(valor_str: str) -> list:
-    if not valor_str:
-        return []
-    valor_str = valor_str.strip('"').strip("'")
-    for sep in [";", "\n", ","]:
-        if sep in valor_str:
-            return [v.strip() for v in valor_str.split(sep) if v.strip()]
-    return [valor_str.strip()]
-
-
 # ============================================================
 # CACHE FETCHERS
 # ============================================================
 
-@st.cache_data(ttl=600, show_spinner=False)
 def _fetch_estudos(_supabase):
-    resp = supabase_execute(
-        lambda: _supabase.table("tab_app_estudos")
-        .select("id_estudo, estudo")
-        .order("estudo")
-        .execute()
-    )
-    df = pd.DataFrame(resp.data) if resp.data else pd.DataFrame()
-    if not df.empty:
-        df.columns = [c.lower() for c in df.columns]
-    return df
+    return dim.estudos(_supabase, ["id_estudo", "estudo"])
 
 
-@st.cache_data(ttl=300, show_spinner=False)
+@depende_de("tab_app_relacao_visita_kit")
+@st.cache_data(ttl=600, show_spinner=False)
 def _fetch_relacao_visita_kit(_supabase):
     resp = supabase_execute(
         lambda: _supabase.table("tab_app_relacao_visita_kit")
@@ -57,48 +44,26 @@ def _fetch_relacao_visita_kit(_supabase):
     return df
 
 
-@st.cache_data(ttl=60, show_spinner=False)
 def _fetch_agendamentos_range(_supabase, data_ini_str, data_fim_str):
-    resp = supabase_execute(
-        lambda: _supabase.table("tab_app_agendamentos")
-        .select("id, data_visita, estudo_id, visita")
-        .gte("data_visita", data_ini_str)
-        .lte("data_visita", data_fim_str)
-        .execute()
+    return consultar_agendamentos(
+        _supabase, data_ini=data_ini_str, data_fim=data_fim_str, colunas=["id", "data_visita", "estudo_id", "visita"]
     )
-    df = pd.DataFrame(resp.data) if resp.data else pd.DataFrame()
-    if not df.empty:
-        df.columns = [c.lower() for c in df.columns]
-    return df
 
 
-@st.cache_data(ttl=600, show_spinner=False)
 def _fetch_opcoes_laboratorio(_supabase):
-    resp = supabase_execute(
-        lambda: _supabase.table("tab_app_variaveis")
-        .select("valor")
-        .eq("uso", "opcoes_laboratorio")
-        .execute()
-    )
-    return _parse_variaveis(resp.data[0]["valor"]) if resp.data else []
+    return dim.variavel(_supabase, "opcoes_laboratorio")
 
 
-@st.cache_data(ttl=600, show_spinner=False)
 def _fetch_opcoes_desfecho_awb(_supabase):
-    resp = supabase_execute(
-        lambda: _supabase.table("tab_app_variaveis")
-        .select("valor")
-        .eq("uso", "desfecho_awb")
-        .execute()
-    )
-    return _parse_variaveis(resp.data[0]["valor"]) if resp.data else []
+    return dim.variavel(_supabase, "desfecho_awb")
 
 
-@st.cache_data(ttl=60, show_spinner=False)
+@depende_de(TABLE_MODELO)
+@st.cache_data(ttl=600, show_spinner=False)
 def _fetch_modelo_awb_existentes(_supabase, data_ini_str, data_fim_str):
     resp = supabase_execute(
         lambda: _supabase.table(TABLE_MODELO)
-        .select("*")
+        .select(projecoes.select("modelo_awb"))
         .gte("data_visita", data_ini_str)
         .lte("data_visita", data_fim_str)
         .execute()
@@ -109,10 +74,6 @@ def _fetch_modelo_awb_existentes(_supabase, data_ini_str, data_fim_str):
     return df
 
 
-def _invalidar_cache():
-    _fetch_modelo_awb_existentes.clear()
-
-
 # ============================================================
 # PÁGINA
 # ============================================================
@@ -305,10 +266,12 @@ def _page_modelo_awb_body():
 
     if st.button("💾 Gravar", type="primary", use_container_width=True):
         usuario_logado = st.session_state.get("usuario_logado", "desconhecido")
+        agora = pd.Timestamp.now(tz="UTC").isoformat()
         erros = []
-        alterados = 0
+        payloads = []
 
-        for idx in agrupado.index:
+        # Só as linhas tocadas no editor (change-set do st.data_editor)
+        for idx in linhas_editadas("editor_modelo_awb"):
             row = agrupado.loc[idx]
             novo_awb = (edited.loc[idx, "AWB"] or "").strip()
             novo_desfecho = edited.loc[idx, "Desfecho"] or ""
@@ -327,49 +290,26 @@ def _page_modelo_awb_body():
                 erros.append(f"{rotulo}: não é possível gravar sem Laboratório, Courier e Temperatura vinculados.")
                 continue
 
+            payloads.append({
+                "data_visita":    str(row["data_visita"]),
+                "id_estudo":      int(row["estudo_id"]),
+                "laboratorio":    row["laboratorio"] or None,
+                "courier":        row["courier"] or None,
+                "temperatura":    row["temperatura"] or None,
+                "awb":            novo_awb or None,
+                "desfecho":       novo_desfecho or None,
+                "observacao":     nova_obs or None,
+                "responsavel":    usuario_logado,
+                "dt_atualizacao": agora,
+            })
+
+        alterados = 0
+        if payloads:
             try:
-                def _buscar():
-                    q = (
-                        supabase.table(TABLE_MODELO)
-                        .select("id")
-                        .eq("data_visita", str(row["data_visita"]))
-                        .eq("id_estudo", int(row["estudo_id"]))
-                    )
-                    for campo in ["laboratorio", "courier", "temperatura"]:
-                        valor = row[campo] or None
-                        q = q.eq(campo, valor) if valor else q.is_(campo, "null")
-                    return q.execute()
-
-                existente_resp = supabase_execute(_buscar)
-
-                payload = {
-                    "data_visita":    str(row["data_visita"]),
-                    "id_estudo":      int(row["estudo_id"]),
-                    "laboratorio":    row["laboratorio"] or None,
-                    "courier":        row["courier"] or None,
-                    "temperatura":    row["temperatura"] or None,
-                    "awb":            novo_awb or None,
-                    "desfecho":       novo_desfecho or None,
-                    "observacao":     nova_obs or None,
-                    "responsavel":    usuario_logado,
-                    "dt_atualizacao": pd.Timestamp.now(tz="UTC").isoformat(),
-                }
-
-                if existente_resp.data:
-                    reg_id = existente_resp.data[0]["id"]
-                    supabase_execute(
-                        lambda: supabase.table(TABLE_MODELO).update(payload).eq("id", reg_id).execute()
-                    )
-                else:
-                    supabase_execute(
-                        lambda: supabase.table(TABLE_MODELO).insert(payload).execute()
-                    )
-
-                alterados += 1
+                bulk_upsert(supabase, TABLE_MODELO, payloads, on_conflict=CHAVE_MODELO)
+                alterados = len(payloads)
             except Exception as e:
-                erros.append(f"{rotulo}: {e}")
-
-        _invalidar_cache()
+                erros.append(f"Erro ao gravar a matriz ({len(payloads)} linha(s)): {e}")
 
         if alterados:
             feedback(f"✅ {alterados} registro(s) gravado(s) com sucesso!", "success", "💾")
@@ -6,10 +6,15 @@ import streamlit as st
 import pandas as pd
 from datetime import date, timedelta
 
-from frontend.supabase_client import get_supabase_client, supabase_execute
+from frontend.supabase_client import get_supabase_client, supabase_execute, carregar_em_paralelo, depende_de
+from frontend.agenda_store import consultar_agendamentos
+from frontend import dimensoes_cache as dim
+from frontend import projecoes
+from frontend import farmacia_saldos as saldos
 from frontend.components.feedback import feedback
+from frontend.components.editor import linhas_editadas
+from backend.api.workflows import gravar_dispensacao
 
-TABLE_MOVS   = "tab_app_farmacia_movimentacoes"
 TABLE_MODELO = "tab_app_modelo_kits"
 
 
@@ -17,49 +22,20 @@ TABLE_MODELO = "tab_app_modelo_kits"
 # HELPERS
 # ============================================================
 
-def _parse_variaveis(valor_str: str) -> list:
-    if not valor_str:
-        return []
-    valor_str = valor_str.strip('"').strip("'")
-    for sep in [";", "\n", ","]:
-        if sep in valor_str:
-            return [v.strip() for v in valor_str.split(sep) if v.strip()]
-    return [valor_str.strip()]
-
-
 # ============================================================
 # CACHE FETCHERS
 # ============================================================
 
-@st.cache_data(ttl=600, show_spinner=False)
 def _fetch_estudos(_supabase):
-    resp = supabase_execute(
-        lambda: _supabase.table("tab_app_estudos")
-        .select("id_estudo, estudo")
-        .order("estudo")
-        .execute()
-    )
-    df = pd.DataFrame(resp.data) if resp.data else pd.DataFrame()
-    if not df.empty:
-        df.columns = [c.lower() for c in df.columns]
-    return df
+    return dim.estudos(_supabase, ["id_estudo", "estudo"])
 
 
-@st.cache_data(ttl=600, show_spinner=False)
 def _fetch_kits_catalogo(_supabase):
-    resp = supabase_execute(
-        lambda: _supabase.table("produtos")
-        .select("id, nome, estudo_id")
-        .eq("tipo_produto", "Kit")
-        .execute()
-    )
-    df = pd.DataFrame(resp.data) if resp.data else pd.DataFrame()
-    if not df.empty:
-        df.columns = [c.lower() for c in df.columns]
-    return df
+    return dim.produtos(_supabase, ["id", "nome", "estudo_id"], tipo_produto="Kit")
 
 
-@st.cache_data(ttl=300, show_spinner=False)
+@depende_de("tab_app_relacao_visita_kit")
+@st.cache_data(ttl=600, show_spinner=False)
 def _fetch_relacao_visita_kit(_supabase):
     resp = supabase_execute(
         lambda: _supabase.table("tab_app_relacao_visita_kit")
@@ -72,63 +48,31 @@ def _fetch_relacao_visita_kit(_supabase):
     return df
 
 
-@st.cache_data(ttl=60, show_spinner=False)
 def _fetch_agendamentos_range(_supabase, data_ini_str, data_fim_str):
-    resp = supabase_execute(
-        lambda: _supabase.table("tab_app_agendamentos")
-        .select("id, data_visita, estudo_id, visita")
-        .gte("data_visita", data_ini_str)
-        .lte("data_visita", data_fim_str)
-        .execute()
+    return consultar_agendamentos(
+        _supabase, data_ini=data_ini_str, data_fim=data_fim_str, colunas=["id", "data_visita", "estudo_id", "visita"]
     )
-    df = pd.DataFrame(resp.data) if resp.data else pd.DataFrame()
-    if not df.empty:
-        df.columns = [c.lower() for c in df.columns]
-    return df
 
 
-@st.cache_data(ttl=60, show_spinner=False)
 def _fetch_saldo_lotes(_supabase, ids_produto: tuple) -> pd.DataFrame:
     """Saldo por produto+lote+validade, considerando só lotes não vencidos com saldo > 0."""
     cols = ["produto_id", "lote", "validade", "saldo"]
-    if not ids_produto:
+    df = saldos.fetch_saldos(_supabase, produto_ids=ids_produto, apenas_nao_vencidos=True)
+    if df.empty:
         return pd.DataFrame(columns=cols)
-    resp = supabase_execute(
-        lambda: _supabase.table(TABLE_MOVS)
-        .select("produto_id, tipo_transacao, quantidade, validade, lote")
-        .in_("produto_id", list(ids_produto))
-        .execute()
-    )
-    if not resp.data:
-        return pd.DataFrame(columns=cols)
-    df = pd.DataFrame(resp.data)
-    df.columns = [c.lower() for c in df.columns]
-
-    validade_dt = pd.to_datetime(df["validade"], errors="coerce")
-    nao_vencido = validade_dt.isna() | (validade_dt.dt.date >= date.today())
-    df = df[nao_vencido].copy()
-    df["lote"] = df["lote"].fillna("")
-    df["validade"] = df["validade"].fillna("")
+    df = df.assign(validade=df["validade"].fillna(""))
 
-    quantidade = pd.to_numeric(df["quantidade"], errors="coerce").fillna(0)
-    sinal = df["tipo_transacao"].map({"Entrada": 1, "Saída": -1}).fillna(0)
-    df["qtd_sinal"] = quantidade * sinal
-
-    agrupado = (
-        df.groupby(["produto_id", "lote", "validade"], dropna=False)["qtd_sinal"]
-        .sum()
-        .reset_index()
-        .rename(columns={"qtd_sinal": "saldo"})
-    )
+    agrupado = df.groupby(["produto_id", "lote", "validade"], dropna=False)["saldo"].sum().reset_index()
     agrupado["saldo"] = agrupado["saldo"].astype(int)
     return agrupado[agrupado["saldo"] > 0].reset_index(drop=True)
 
 
-@st.cache_data(ttl=60, show_spinner=False)
+@depende_de(TABLE_MODELO)
+@st.cache_data(ttl=600, show_spinner=False)
 def _fetch_modelo_kits_existentes(_supabase, data_ini_str, data_fim_str):
     resp = supabase_execute(
         lambda: _supabase.table(TABLE_MODELO)
-        .select("*")
+        .select(projecoes.select("modelo_kits"))
         .gte("data_visita", data_ini_str)
         .lte("data_visita", data_fim_str)
         .execute()
@@ -139,20 +83,8 @@ def _fetch_modelo_kits_existentes(_supabase, data_ini_str, data_fim_str):
     return df
 
 
-@st.cache_data(ttl=600, show_spinner=False)
 def _fetch_opcoes_desfecho(_supabase):
-    resp = supabase_execute(
-        lambda: _supabase.table("tab_app_variaveis")
-        .select("valor")
-        .eq("uso", "opcoes_desfecho")
-        .execute()
-    )
-    return _parse_variaveis(resp.data[0]["valor"]) if resp.data else []
-
-
-def _invalidar_cache():
-    _fetch_modelo_kits_existentes.clear()
-    _fetch_saldo_lotes.clear()
+    return dim.variavel(_supabase, "opcoes_desfecho")
 
 
 # ============================================================
@@ -173,10 +105,16 @@ def page_modelo_kits():
 
 def _page_modelo_kits_body():
     supabase = get_supabase_client()
-    df_estudos       = _fetch_estudos(supabase)
-    df_kits_catalogo = _fetch_kits_catalogo(supabase)
-    df_rvk           = _fetch_relacao_visita_kit(supabase)
-    opcoes_desfecho  = _fetch_opcoes_desfecho(supabase)
+    dims = carregar_em_paralelo({
+        "estudos":         lambda: _fetch_estudos(supabase),
+        "kits_catalogo":   lambda: _fetch_kits_catalogo(supabase),
+        "rvk":             lambda: _fetch_relacao_visita_kit(supabase),
+        "opcoes_desfecho": lambda: _fetch_opcoes_desfecho(supabase),
+    })
+    df_estudos       = dims["estudos"]
+    df_kits_catalogo = dims["kits_catalogo"]
+    df_rvk           = dims["rvk"]
+    opcoes_desfecho  = dims["opcoes_desfecho"]
 
     if df_estudos.empty:
         st.warning("Nenhum estudo cadastrado.")
@@ -406,9 +344,10 @@ def _page_modelo_kits_body():
     if st.button("💾 Gravar", type="primary", use_container_width=True):
         usuario_logado = st.session_state.get("usuario_logado", "desconhecido")
         erros = []
-        alterados = 0
+        payloads, movimentos = [], []
 
-        for idx in df_matriz.index:
+        # Só as linhas tocadas no editor (change-set do st.data_editor)
+        for idx in linhas_editadas("editor_modelo_kits"):
             row = df_matriz.loc[idx]
             novo_dispensado = int(edited.loc[idx, "Dispensado"] or 0)
             novo_desfecho = edited.loc[idx, "Desfecho"] or ""
@@ -436,68 +375,42 @@ def _page_modelo_kits_body():
             validade_row = row["validade"] or None
             lote_row     = row["lote"] or None
 
+            payloads.append({
+                "data_visita":        str(row["data_visita"]),
+                "id_estudo":          int(row["id_estudo"]),
+                "kit_type":           kit_type_row,
+                "validade":           validade_row,
+                "lote":               lote_row,
+                "quantidade_visitas": int(row["quantidade_visitas"]),
+                "dispensado":         novo_dispensado,
+                "desfecho":           novo_desfecho or None,
+                "responsavel":        usuario_logado,
+            })
+
+            if delta != 0 and kit_type_row is not None:
+                movimentos.append({
+                    "data":           str(date.today()),
+                    "tipo_transacao": "Saída" if delta > 0 else "Entrada",
+                    "estudo_id":      int(row["id_estudo"]),
+                    "produto_id":     kit_type_row,
+                    "tipo_produto":   "Kit",
+                    "quantidade":     abs(delta),
+                    "validade":       validade_row,
+                    "lote":           lote_row,
+                    "nota":           None,
+                    "tipo_acao":      "Distribuição enfermagem",
+                    "consideracoes":  None,
+                    "responsavel":    usuario_logado,
+                    "localizacao":    "Enfermagem",
+                })
+
+        # Matriz + movimentações numa só transação (fn_app_gravar_dispensacao)
+        alterados = 0
+        if payloads:
             try:
-                def _buscar():
-                    q = (
-                        supabase.table(TABLE_MODELO)
-                        .select("id")
-                        .eq("data_visita", str(row["data_visita"]))
-                        .eq("id_estudo", int(row["id_estudo"]))
-                    )
-                    q = q.eq("kit_type", kit_type_row) if kit_type_row is not None else q.is_("kit_type", "null")
-                    q = q.eq("validade", validade_row) if validade_row else q.is_("validade", "null")
-                    q = q.eq("lote", lote_row) if lote_row else q.is_("lote", "null")
-                    return q.execute()
-
-                existente_resp = supabase_execute(_buscar)
-
-                payload = {
-                    "data_visita":        str(row["data_visita"]),
-                    "id_estudo":          int(row["id_estudo"]),
-                    "kit_type":           kit_type_row,
-                    "validade":           validade_row,
-                    "lote":               lote_row,
-                    "quantidade_visitas": int(row["quantidade_visitas"]),
-                    "dispensado":         novo_dispensado,
-                    "desfecho":           novo_desfecho or None,
-                    "responsavel":        usuario_logado,
-                    "dt_atualizacao":     pd.Timestamp.now(tz="UTC").isoformat(),
-                }
-
-                if existente_resp.data:
-                    reg_id = existente_resp.data[0]["id"]
-                    supabase_execute(
-                        lambda: supabase.table(TABLE_MODELO).update(payload).eq("id", reg_id).execute()
-                    )
-                else:
-                    supabase_execute(
-                        lambda: supabase.table(TABLE_MODELO).insert(payload).execute()
-                    )
-
-                if delta != 0 and kit_type_row is not None:
-                    supabase_execute(
-                        lambda: supabase.table(TABLE_MOVS).insert({
-                            "data":           str(date.today()),
-                            "tipo_transacao": "Saída" if delta > 0 else "Entrada",
-                            "estudo_id":      int(row["id_estudo"]),
-                            "produto_id":     kit_type_row,
-                            "tipo_produto":   "Kit",
-                            "quantidade":     abs(delta),
-                            "validade":       validade_row,
-                            "lote":           lote_row,
-                            "nota":           None,
-                            "tipo_acao":      "Distribuição enfermagem",
-                            "consideracoes":  None,
-                            "responsavel":    usuario_logado,
-                            "localizacao":    "Enfermagem",
-                        }).execute()
-                    )
-
-                alterados += 1
+                alterados = gravar_dispensacao(supabase, payloads, movimentos)
             except Exception as e:
-                erros.append(f"{rotulo}: {e}")
-
-        _invalidar_cache()
+                erros.append(f"Erro ao gravar a matriz ({len(payloads)} linha(s)); nada foi gravado: {e}")
 
         if alterados:
             feedback(f"✅ {alterados} registro(s) gravado(s) com sucesso!", "success", "💾")
@@ -6,79 +6,41 @@ import streamlit as st
 import pandas as pd
 from datetime import date
 
-from frontend.supabase_client import get_supabase_client, supabase_execute
+from frontend.supabase_client import get_supabase_client, supabase_execute, depende_de, bulk_upsert, bulk_insert
+from frontend import dimensoes_cache as dim
+from frontend import farmacia_saldos as saldos
 from frontend.components.feedback import feedback
 
-TABLE_MOVS = "tab_app_farmacia_movimentacoes"
+TABLE_RELACAO = "tab_app_relacao_visita_kit"
 
 
 # ============================================================
 # HELPERS
 # ============================================================
 
-def _parse_variaveis(valor_str: str) -> list:
-    if not valor_str:
-        return []
-    valor_str = valor_str.strip('"').strip("'")
-    for sep in [";", "\n", ","]:
-        if sep in valor_str:
-            return [v.strip() for v in valor_str.split(sep) if v.strip()]
-    return [valor_str.strip()]
-
-
 # ============================================================
 # CACHE FETCHERS
 # ============================================================
 
-@st.cache_data(ttl=600, show_spinner=False)
 def _fetch_estudos(_supabase):
-    resp = supabase_execute(
-        lambda: _supabase.table("tab_app_estudos")
-        .select("id_estudo, estudo")
-        .order("estudo")
-        .execute()
-    )
-    df = pd.DataFrame(resp.data) if resp.data else pd.DataFrame()
-    if not df.empty:
-        df.columns = [c.lower() for c in df.columns]
-    return df
+    return dim.estudos(_supabase, ["id_estudo", "estudo"])
 
 
-@st.cache_data(ttl=600, show_spinner=False)
 def _fetch_variaveis(_supabase):
-    usos = ["visita", "opcoes_envio", "opcoes_temperatura", "opcoes_laboratorio", "opcoes_courier"]
-    result = {}
-    for uso in usos:
-        resp = supabase_execute(
-            lambda uso=uso: _supabase.table("tab_app_variaveis")
-            .select("valor")
-            .eq("uso", uso)
-            .execute()
-        )
-        result[uso] = _parse_variaveis(resp.data[0]["valor"]) if resp.data else []
-    return result
+    return dim.variaveis(
+        _supabase, ["visita", "opcoes_envio", "opcoes_temperatura", "opcoes_laboratorio", "opcoes_courier"]
+    )
 
 
-@st.cache_data(ttl=300, show_spinner=False)
 def _fetch_kits(_supabase, id_estudo: int):
-    resp = supabase_execute(
-        lambda: _supabase.table("produtos")
-        .select("id, nome")
-        .eq("estudo_id", id_estudo)
-        .eq("tipo_produto", "Kit")
-        .order("nome")
-        .execute()
-    )
-    df = pd.DataFrame(resp.data) if resp.data else pd.DataFrame()
-    if not df.empty:
-        df.columns = [c.lower() for c in df.columns]
-    return df
+    return dim.produtos(_supabase, ["id", "nome"], tipo_produto="Kit", estudo_id=id_estudo)
 
 
-@st.cache_data(ttl=60, show_spinner=False)
+@depende_de(TABLE_RELACAO)
+@st.cache_data(ttl=600, show_spinner=False)
 def _fetch_relacoes(_supabase, id_estudo: int):
     resp = supabase_execute(
-        lambda: _supabase.table("tab_app_relacao_visita_kit")
+        lambda: _supabase.table(TABLE_RELACAO)
         .select("*")
         .eq("id_estudo", id_estudo)
         .order("visita")
@@ -90,10 +52,11 @@ def _fetch_relacoes(_supabase, id_estudo: int):
     return df
 
 
-@st.cache_data(ttl=60, show_spinner=False)
+@depende_de(TABLE_RELACAO)
+@st.cache_data(ttl=600, show_spinner=False)
 def _fetch_relacoes_todas(_supabase):
     resp = supabase_execute(
-        lambda: _supabase.table("tab_app_relacao_visita_kit")
+        lambda: _supabase.table(TABLE_RELACAO)
         .select("*")
         .order("id_estudo")
         .order("visita")
@@ -105,21 +68,10 @@ def _fetch_relacoes_todas(_supabase):
     return df
 
 
-@st.cache_data(ttl=300, show_spinner=False)
 def _fetch_todos_kits(_supabase):
-    resp = supabase_execute(
-        lambda: _supabase.table("produtos")
-        .select("id, nome")
-        .eq("tipo_produto", "Kit")
-        .execute()
-    )
-    df = pd.DataFrame(resp.data) if resp.data else pd.DataFrame()
-    if not df.empty:
-        df.columns = [c.lower() for c in df.columns]
-    return df
+    return dim.produtos(_supabase, ["id", "nome"], tipo_produto="Kit")
 
 
-@st.cache_data(ttl=60, show_spinner=False)
 def _fetch_saldo_kits(_supabase, ids_produto: tuple) -> dict:
     """Saldo (Entradas - Saídas) por produto, considerando só lotes não vencidos.
 
@@ -127,29 +79,15 @@ def _fetch_saldo_kits(_supabase, ids_produto: tuple) -> dict:
     vazia na tabela); produtos com movimentação mas saldo não-vencido nulo
     (ex: todos os lotes vencidos) entram com valor 0.
     """
-    if not ids_produto:
+    df = saldos.fetch_saldos(_supabase, produto_ids=ids_produto)
+    if df.empty:
         return {}
-    resp = supabase_execute(
-        lambda: _supabase.table(TABLE_MOVS)
-        .select("produto_id, tipo_transacao, quantidade, validade")
-        .in_("produto_id", list(ids_produto))
-        .execute()
-    )
-    if not resp.data:
-        return {}
-    df = pd.DataFrame(resp.data)
-    df.columns = [c.lower() for c in df.columns]
     produtos_com_mov = set(int(p) for p in df["produto_id"].dropna().unique())
 
     validade_dt = pd.to_datetime(df["validade"], errors="coerce")
     nao_vencido = validade_dt.isna() | (validade_dt.dt.date >= date.today())
-    df_valido = df[nao_vencido]
+    saldo = df.loc[nao_vencido, "saldo"].groupby(df.loc[nao_vencido, "produto_id"]).sum()
 
-    quantidade = pd.to_numeric(df_valido["quantidade"], errors="coerce").fillna(0)
-    sinal = df_valido["tipo_transacao"].map({"Entrada": 1, "Saída": -1}).fillna(0)
-    qtd_sinal = quantidade * sinal
-
-    saldo = qtd_sinal.groupby(df_valido["produto_id"]).sum()
     saldo_dict = {int(k): int(v) for k, v in saldo.items()}
     return {pid: saldo_dict.get(pid, 0) for pid in produtos_com_mov}
 
@@ -343,78 +281,75 @@ def page_relacao_visita_kit():
         erros = []
         alterados = 0
 
-        # ── Exclusões ──────────────────────────────────
-        for pos in deleted_rows:
+        # ── Exclusões (um delete com .in_) ─────────────
+        ids_apagar = [
+            int(df_rel_idx.loc[int(df_filtrado.iloc[pos]["_orig_idx"]), "id"]) for pos in deleted_rows
+        ]
+        if ids_apagar:
             try:
-                orig_idx = int(df_filtrado.iloc[pos]["_orig_idx"])
-                reg_id = int(df_rel_idx.loc[orig_idx, "id"])
                 supabase_execute(
-                    lambda reg_id=reg_id: supabase.table("tab_app_relacao_visita_kit")
-                    .delete().eq("id", reg_id).execute()
+                    lambda: supabase.table(TABLE_RELACAO).delete().in_("id", ids_apagar).execute()
                 )
-                alterados += 1
+                alterados += len(ids_apagar)
             except Exception as e:
-                erros.append(f"Erro ao apagar linha: {e}")
+                erros.append(f"Erro ao apagar {len(ids_apagar)} linha(s): {e}")
 
-        # ── Edições ────────────────────────────────────
+        # ── Edições (um upsert pela chave primária) ────
+        edicoes = []
         for pos, mudancas in edited_rows.items():
+            orig_idx = int(df_filtrado.iloc[pos]["_orig_idx"])
+            reg_id = int(df_rel_idx.loc[orig_idx, "id"])
+
+            visita_e = mudancas.get("Visita", df_editor.loc[pos, "Visita"])
+            if not visita_e:
+                erros.append(f"Linha #{reg_id}: Visita é obrigatória — alteração não gravada.")
+                continue
+            kit_e         = mudancas.get("Kit", df_editor.loc[pos, "Kit"])
+            envio_e       = mudancas.get("Envio", df_editor.loc[pos, "Envio"])
+            temperatura_e = mudancas.get("Temperatura", df_editor.loc[pos, "Temperatura"])
+            laboratorio_e = mudancas.get("Laboratório", df_editor.loc[pos, "Laboratório"])
+            courier_e     = mudancas.get("Courier", df_editor.loc[pos, "Courier"])
+
+            edicoes.append({
+                "id":          reg_id,
+                "id_estudo":   int(df_rel_idx.loc[orig_idx, "id_estudo"]),
+                "visita":      visita_e,
+                "kit_type":    kit_nome_to_id.get(kit_e),
+                "envio":       envio_e or None,
+                "temperatura": temperatura_e or None,
+                "laboratorio": laboratorio_e or None,
+                "courier":     courier_e or None,
+            })
+        if edicoes:
             try:
-                orig_idx = int(df_filtrado.iloc[pos]["_orig_idx"])
-                reg_id = int(df_rel_idx.loc[orig_idx, "id"])
-
-                visita_e = mudancas.get("Visita", df_editor.loc[pos, "Visita"])
-                if not visita_e:
-                    erros.append(f"Linha #{reg_id}: Visita é obrigatória — alteração não gravada.")
-                    continue
-                kit_e         = mudancas.get("Kit", df_editor.loc[pos, "Kit"])
-                envio_e       = mudancas.get("Envio", df_editor.loc[pos, "Envio"])
-                temperatura_e = mudancas.get("Temperatura", df_editor.loc[pos, "Temperatura"])
-                laboratorio_e = mudancas.get("Laboratório", df_editor.loc[pos, "Laboratório"])
-                courier_e     = mudancas.get("Courier", df_editor.loc[pos, "Courier"])
-
-                supabase_execute(
-                    lambda: supabase.table("tab_app_relacao_visita_kit")
-                    .update({
-                        "visita":      visita_e,
-                        "kit_type":    kit_nome_to_id.get(kit_e),
-                        "envio":       envio_e or None,
-                        "temperatura": temperatura_e or None,
-                        "laboratorio": laboratorio_e or None,
-                        "courier":     courier_e or None,
-                    })
-                    .eq("id", reg_id)
-                    .execute()
-                )
-                alterados += 1
+                bulk_upsert(supabase, TABLE_RELACAO, edicoes, on_conflict="id")
+                alterados += len(edicoes)
             except Exception as e:
-                erros.append(f"Erro ao atualizar linha: {e}")
+                erros.append(f"Erro ao atualizar {len(edicoes)} linha(s): {e}")
 
-        # ── Novos registros ────────────────────────────
+        # ── Novos registros (um insert em lote) ────────
+        novos = []
         for nova in added_rows:
             visita_n = nova.get("Visita") or ""
             if not visita_n:
                 continue  # linha em branco adicionada sem preencher — ignora silenciosamente
+            novos.append({
+                "id_estudo":   id_estudo,
+                "visita":      visita_n,
+                "kit_type":    kit_nome_to_id.get(nova.get("Kit") or ""),
+                "envio":       nova.get("Envio") or None,
+                "temperatura": nova.get("Temperatura") or None,
+                "laboratorio": nova.get("Laboratório") or None,
+                "courier":     nova.get("Courier") or None,
+            })
+        if novos:
             try:
-                kit_n = nova.get("Kit") or ""
-                supabase_execute(
-                    lambda: supabase.table("tab_app_relacao_visita_kit")
-                    .insert({
-                        "id_estudo":   id_estudo,
-                        "visita":      visita_n,
-                        "kit_type":    kit_nome_to_id.get(kit_n),
-                        "envio":       nova.get("Envio") or None,
-                        "temperatura": nova.get("Temperatura") or None,
-                        "laboratorio": nova.get("Laboratório") or None,
-                        "courier":     nova.get("Courier") or None,
-                    })
-                    .execute()
-                )
-                alterados += 1
+                bulk_insert(supabase, TABLE_RELACAO, novos)
+                alterados += len(novos)
             except Exception as e:
-                erros.append(f"Erro ao criar registro (Visita={visita_n}): {e}")
+                erros.append(f"Erro ao criar {len(novos)} registro(s): {e}")
 
         if alterados:
-            _fetch_relacoes.clear()
             feedback(f"✅ {alterados} alteração(ões) gravada(s) com sucesso!", "success", "💾")
         for e in erros:
             st.error(f"⚠️ {e}")
@@ -0,0 +1,214 @@
+# ============================================================
+# 🐘 frontend/postgres_direto.py
+# Caminho opcional direto no Postgres do Supabase, sem PostgREST, para as
+# leituras e cargas pesadas. Liga com SUPABASE_DB_URL definido e o psycopg 3
+# instalado (pip install "psycopg[binary]" psycopg_pool); sem isso, tudo
+# continua pelo PostgREST.
+#   - fetch_all/fetch_in com formato="csv": o builder do postgrest vira SQL
+#     e o resultado vem por COPY (...) TO STDOUT em CSV, em blocos.
+#   - bulk_insert a partir de COPY_MIN_LINHAS linhas: COPY ... FROM STDIN.
+# Qualquer Postgres local com as mesmas tabelas serve para testar
+# (SUPABASE_DB_URL=postgresql://localhost/app).
+# ============================================================
+import csv
+import io
+import os
+import re
+import logging
+import threading
+from typing import Any
+
+try:
+    import psycopg
+    from psycopg import sql
+    from psycopg_pool import ConnectionPool
+except ImportError:
+    psycopg = None
+
+logger = logging.getLogger(__name__)
+
+# Use a string do pooler em modo transação (porta 6543) ou a conexão direta.
+# O papel da URL ignora RLS como o service role; o app já usa uma chave única.
+DB_URL = os.getenv("SUPABASE_DB_URL", "")
+DB_POOL_MIN = int(os.getenv("SUPABASE_DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("SUPABASE_DB_POOL_MAX", "4"))
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("SUPABASE_DB_STATEMENT_TIMEOUT_MS", "60000"))
+# Abaixo disso o insert pelo PostgREST (que devolve as linhas) é rápido o bastante
+COPY_MIN_LINHAS = int(os.getenv("SUPABASE_DB_COPY_MIN_LINHAS", "1000"))
+
+_IDENT = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+# Filtros do postgrest-py que têm tradução direta
+_OPERADORES = {"eq": "=", "neq": "<>", "gt": ">", "gte": ">=", "lt": "<", "lte": "<=", "like": "LIKE", "ilike": "ILIKE"}
+_IS = {"null": "NULL", "true": "TRUE", "false": "FALSE", "unknown": "UNKNOWN"}
+_PARAMS_IGNORADOS = frozenset({"offset", "limit"})
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def ativo() -> bool:
+    """Há SUPABASE_DB_URL e driver instalado."""
+    return bool(DB_URL) and psycopg is not None
+
+
+def _get_pool() -> "ConnectionPool":
+    """Pool do processo, criado na primeira leitura (thread-safe, como o httpx do PostgREST)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(
+                DB_URL,
+                min_size=DB_POOL_MIN,
+                max_size=DB_POOL_MAX,
+                kwargs={
+                    # O pooler em modo transação não aceita prepared statements
+                    "prepare_threshold": None,
+                    "options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}",
+                },
+                name="supabase-direto",
+                open=True,
+            )
+            logger.info(f"✅ Pool Postgres direto criado (max={DB_POOL_MAX})")
+        return _pool
+
+
+def fechar() -> None:
+    """Fecha o pool (a próxima leitura cria outro)."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close()
+
+
+# ============================================================
+# 🔁 Builder do postgrest -> SQL
+# ============================================================
+def _ident(nome: str):
+    if not _IDENT.match(nome):
+        raise ValueError(nome)
+    return sql.Identifier(nome)
+
+
+def _lista_in(valor: str) -> list[str]:
+    """'(1,2,"a,b")' -> ['1', '2', 'a,b'] (aspas do postgrest-py protegem vírgulas)."""
+    if not (valor.startswith("(") and valor.endswith(")")):
+        raise ValueError(valor)
+    return next(csv.reader([valor[1:-1]], skipinitialspace=True), [])
+
+
+def _filtro(coluna: str, expressao: str, params: list):
+    negado = expressao.startswith("not.")
+    if negado:
+        expressao = expressao[4:]
+    op, _, valor = expressao.partition(".")
+
+    if op == "in":
+        itens = _lista_in(valor)
+        if not itens:
+            cond = sql.SQL("FALSE")
+        else:
+            params.extend(itens)
+            cond = sql.SQL("{} IN ({})").format(_ident(coluna), sql.SQL(", ").join(sql.Placeholder() * len(itens)))
+    elif op == "is" and valor in _IS:
+        cond = sql.SQL("{} IS {}").format(_ident(coluna), sql.SQL(_IS[valor]))
+    elif op in _OPERADORES:
+        params.append(valor.replace("*", "%") if op in ("like", "ilike") else valor)
+        cond = sql.SQL("{} {} {}").format(_ident(coluna), sql.SQL(_OPERADORES[op]), sql.Placeholder())
+    else:
+        raise ValueError(op)
+    return sql.SQL("NOT ({})").format(cond) if negado else cond
+
+
+def _ordem(valor: str):
+    termos = []
+    for item in valor.split(","):
+        coluna, *mods = item.strip().split(".")
+        termo = _ident(coluna)
+        for mod in mods:
+            if mod not in ("asc", "desc", "nullsfirst", "nullslast"):
+                raise ValueError(mod)
+            termo = sql.SQL("{} {}").format(termo, sql.SQL({"nullsfirst": "NULLS FIRST", "nullslast": "NULLS LAST"}.get(mod, mod.upper())))
+        termos.append(termo)
+    return sql.SQL(", ").join(termos)
+
+
+def consulta(builder: Any) -> tuple[Any, list] | None:
+    """
+    SELECT equivalente a um builder de select do postgrest-py (tabela, colunas,
+    filtros simples, order e limit/offset). Devolve None quando o builder usa
+    algo sem tradução aqui (embeds, aliases, or/and, fts...): o chamador segue
+    pelo PostgREST.
+    """
+    try:
+        tabela = builder.path.strip("/")
+        params: list = []
+        colunas = sql.SQL("*")
+        filtros, ordem, limite, deslocamento = [], None, None, None
+        for chave, valor in builder.params.multi_items():
+            if chave == "select":
+                nomes = [c.strip() for c in valor.split(",")]
+                if nomes != ["*"]:
+                    colunas = sql.SQL(", ").join(_ident(c) for c in nomes)
+            elif chave == "order":
+                ordem = _ordem(valor)
+            elif chave == "limit":
+                limite = int(valor)
+            elif chave == "offset":
+                deslocamento = int(valor)
+            elif chave in ("or", "and", "columns", "on_conflict"):
+                return None
+            else:
+                filtros.append(_filtro(chave, valor, params))
+
+        consulta_sql = sql.SQL("SELECT {} FROM {}").format(colunas, _ident(tabela))
+        if filtros:
+            consulta_sql += sql.SQL(" WHERE ") + sql.SQL(" AND ").join(filtros)
+        if ordem is not None:
+            consulta_sql += sql.SQL(" ORDER BY ") + ordem
+        if limite is not None:
+            consulta_sql += sql.SQL(" LIMIT {}").format(sql.Literal(limite))
+        if deslocamento:
+            consulta_sql += sql.SQL(" OFFSET {}").format(sql.Literal(deslocamento))
+        return consulta_sql, params
+    except (ValueError, AttributeError):
+        return None
+
+
+# ============================================================
+# 📤 Leitura (COPY TO) e 📥 carga (COPY FROM)
+# ============================================================
+def copiar_csv(consulta_sql, params: list, *, limite: int | None = None) -> bytes:
+    """
+    Resultado de `consulta_sql` em CSV com cabeçalho (NULL vazio, texto vazio
+    entre aspas), via COPY ... TO STDOUT. O servidor envia em blocos; nada é
+    montado linha a linha. `limite` corta no servidor.
+    """
+    if limite is not None:
+        consulta_sql = sql.SQL("SELECT * FROM ({}) AS q LIMIT {}").format(consulta_sql, sql.Literal(limite))
+    comando = sql.SQL("COPY ({}) TO STDOUT (FORMAT csv, HEADER)").format(consulta_sql)
+
+    saida = io.BytesIO()
+    with _get_pool().connection() as conn, conn.cursor() as cur:
+        # COPY não aceita parâmetros de bind: o psycopg os incorpora no cliente
+        with cur.copy(comando, params or None) as copia:
+            for bloco in copia:
+                saida.write(bloco)
+    return saida.getvalue()
+
+
+def carregar(tabela: str, rows: list[dict]) -> int:
+    """
+    INSERT em massa por COPY tabela (colunas) FROM STDIN, numa transação.
+    Colunas ausentes numa linha viram NULL (como no insert em lote do PostgREST).
+    Não há RETURNING: devolve só a quantidade de linhas.
+    """
+    colunas = list(dict.fromkeys(c for r in rows for c in r))
+    comando = sql.SQL("COPY {} ({}) FROM STDIN").format(
+        _ident(tabela), sql.SQL(", ").join(_ident(c) for c in colunas)
+    )
+    with _get_pool().connection() as conn, conn.cursor() as cur:
+        with cur.copy(comando) as copia:
+            for r in rows:
+                copia.write_row(tuple(r.get(c) for c in colunas))
+    return len(rows)
@@ -0,0 +1,158 @@
+# ============================================================
+# 🧾 frontend/projecoes.py
+# Colunas que cada visão realmente lê de cada tabela. Os fetchers montam
+# o select() daqui em vez de select("*"); com PROJECOES_VERIFICAR=1 avisa
+# quando a página usa uma coluna da tabela que ficou fora da projeção.
+# ============================================================
+import os
+import logging
+import re
+import sys
+import threading
+from dataclasses import dataclass
+
+logger = logging.getLogger(__name__)
+
+# Verificação de colunas fora da projeção: só quando ligada explicitamente
+# (APP_ENV não serve, porque o padrão é "dev" e o deploy não o define)
+VERIFICAR = os.getenv("PROJECOES_VERIFICAR", "") == "1"
+
+
+@dataclass(frozen=True)
+class Projecao:
+    tabela: str
+    colunas: tuple[str, ...]
+    # Colunas deixadas de fora de propósito (a página só grava, nunca lê)
+    omitidas: tuple[str, ...] = ()
+
+
+_STATUS_ETAPAS = (
+    "status_medico", "status_enfermagem", "status_farmacia",
+    "status_espirometria", "status_nutricionista",
+)
+
+PROJECOES: dict[str, Projecao] = {
+    # 📅 Agenda
+    "agenda_gestao": Projecao("tab_app_agendamentos", (
+        "id", "data_visita", "hora_consulta", "estudo_id", "id_paciente", "nome_paciente",
+        "hora_chegada", "hora_saida", "tipo_visita", "visita", "medico_responsavel",
+        "consultorio", "coordenacao", "status_confirmacao", "valor_uber", "valor_financeiro",
+        "desfecho_atendimento", "obs_visita", "obs_coleta", *_STATUS_ETAPAS, "status_coordenacao",
+    )),
+    "agenda_gestao_historico": Projecao("tab_app_log_etapas", (
+        "nome_etapa", "status_etapa", "data_hora_etapa", "usuario_nome",
+    )),
+    "agenda_edicao": Projecao("tab_app_agendamentos", (
+        "id", "data_visita", "hora_consulta", "estudo_id", "id_paciente", "nome_paciente",
+        "tipo_visita", "visita", "medico_responsavel", "consultorio", "coordenacao",
+        "jejum", "reembolso", "valor_financeiro", "horario_uber", "status_confirmacao",
+        "responsavel_agendamento_nome",
+    )),
+    "agenda_relatorio": Projecao("tab_app_agendamentos", (
+        "id", "data_visita", "hora_consulta", "data_cadastro", "estudo_id", "id_paciente",
+        "nome_paciente", "desfecho_atendimento", "status_confirmacao", "tipo_visita", "visita",
+        "medico_responsavel", "coordenacao", "hora_chegada", "hora_saida", "consultorio",
+        *_STATUS_ETAPAS, "jejum", "reembolso", "valor_financeiro", "obs_visita",
+    )),
+    # 🧪 Matrizes de visita
+    "modelo_kits": Projecao("tab_app_modelo_kits", (
+        "data_visita", "id_estudo", "kit_type", "validade", "lote", "dispensado", "desfecho",
+    )),
+    "modelo_awb": Projecao("tab_app_modelo_awb", (
+        "data_visita", "id_estudo", "laboratorio", "courier", "temperatura",
+        "awb", "desfecho", "observacao",
+    )),
+    # 💊 Farmácia
+    "farmacia_movimentacoes": Projecao("tab_app_farmacia_movimentacoes", (
+        "id", "data", "tipo_transacao", "estudo_id", "produto_id", "tipo_produto",
+        "quantidade", "validade", "lote", "nota", "tipo_acao", "consideracoes",
+        "responsavel", "localizacao",
+    )),
+    # 🧱 Cadastros
+    "estudos": Projecao("tab_app_estudos", (
+        "id_estudo", "estudo", "cod_estudo", "centro", "id_centro", "disciplina",
+        "coordenacao", "coordenador", "pi", "patrocinador", "entrada_dados_modelo",
+        "entrada_dados_dias", "resolucao_modelo", "resolucao_dias", "sn_ativo",
+    )),
+    # ds_senha fica de fora: o hash da senha não deve chegar ao cliente
+    "usuarios": Projecao("tab_app_usuarios", (
+        "nm_usuario", "ds_email", "nm_usuario_label", "sn_ativo", "tp_tema",
+    ), omitidas=("ds_senha",)),
+    "menu_paginas": Projecao("tab_app_paginas", (
+        "id_pagina", "nm_pagina", "ds_label", "ds_icone", "ds_modulo", "nm_funcao",
+        "grupo", "nr_ordem",
+    )),
+}
+
+
+def colunas(visao: str) -> list[str]:
+    """Colunas projetadas para `visao` (chave de PROJECOES)."""
+    proj = PROJECOES[visao]
+    if VERIFICAR:
+        _verificar(visao, sys._getframe(1).f_globals.get("__file__"))
+    return list(proj.colunas)
+
+
+def select(visao: str) -> str:
+    """String para .select() com as colunas projetadas para `visao`."""
+    proj = PROJECOES[visao]
+    if VERIFICAR:
+        _verificar(visao, sys._getframe(1).f_globals.get("__file__"))
+    return ", ".join(proj.colunas)
+
+
+# ============================================================
+# 🔎 Verificação (PROJECOES_VERIFICAR=1)
+# ============================================================
+# Literais 'coluna' / "COLUNA" no fonte da página (df["x"], row.get("x"), ...)
+_RE_LITERAL = re.compile(r"""["']([A-Za-z_][A-Za-z0-9_]*)["']""")
+
+_verificados: set[tuple[str, str]] = set()
+_colunas_tabela: dict[str, frozenset[str]] = {}
+_lock = threading.Lock()
+
+
+def _colunas_da_tabela(tabela: str) -> frozenset[str]:
+    """
+    Colunas reais da tabela, pelo esquema OpenAPI do PostgREST (só nomes, sem
+    ler nenhuma linha: ds_senha & cia. não trafegam). Uma requisição carrega
+    todas as tabelas.
+    """
+    if not _colunas_tabela:
+        from frontend.supabase_client import get_supabase_client, supabase_execute
+
+        sessao = get_supabase_client().postgrest.session
+        resp = supabase_execute(lambda: sessao.get("/", headers={"Accept": "application/openapi+json"}))
+        resp.raise_for_status()
+        for nome, definicao in resp.json().get("definitions", {}).items():
+            _colunas_tabela[nome] = frozenset(c.lower() for c in definicao.get("properties", {}))
+    return _colunas_tabela.get(tabela, frozenset())
+
+
+def _verificar(visao: str, arquivo: str | None) -> None:
+    """
+    Uma vez por (visão, módulo): procura no fonte do módulo chamador nomes de
+    colunas da tabela que não estão na projeção e registra um aviso. É só uma
+    varredura de literais — serve para pegar coluna esquecida, não para provar.
+    """
+    if not arquivo:
+        return
+    with _lock:
+        if (visao, arquivo) in _verificados:
+            return
+        _verificados.add((visao, arquivo))
+
+    proj = PROJECOES[visao]
+    try:
+        with open(arquivo, encoding="utf-8") as f:
+            usados = {m.lower() for m in _RE_LITERAL.findall(f.read())}
+        faltando = (usados & _colunas_da_tabela(proj.tabela)) - set(proj.colunas) - set(proj.omitidas)
+    except Exception as e:
+        logger.debug(f"Projeção '{visao}': verificação ignorada ({e})")
+        return
+
+    if faltando:
+        logger.warning(
+            f"⚠️ Projeção '{visao}' ({proj.tabela}): {arquivo} usa colunas fora da projeção: "
+            f"{', '.join(sorted(faltando))}"
+        )
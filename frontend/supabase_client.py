@@ -3,17 +3,33 @@
 # Cliente centralizado para Supabase (seguro para múltiplas sessões Streamlit)
 # ============================================================
 import os
+import json
 import time
 import random
+import pickle
+import hashlib
+import inspect
 import logging
+import functools
+import threading
+import weakref
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime, timezone
-from typing import Callable, TypeVar
+from typing import Any, Callable, Iterator, TypeVar
 
 import streamlit as st
+import pandas as pd
 import httpx
+import pyarrow as pa
+import pyarrow.csv as pa_csv
 from dotenv import load_dotenv
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 from supabase import create_client, Client
 
+from frontend import cache_disco, postgres_direto, tipos
+
 load_dotenv()
 logger = logging.getLogger(__name__)
 
@@ -23,79 +39,1487 @@ SUPABASE_KEY = os.getenv("SUPABASE_KEY", "")
 # Chave onde o client ficará armazenado (por sessão)
 _SESSION_KEY = "_supabase_client"
 
+# Transporte HTTP compartilhado pelo processo (um pool para todas as sessões).
+# HTTP/2 multiplexa as requisições de várias sessões sobre poucas conexões TLS.
+HTTP_MAX_CONNECTIONS = int(os.getenv("SUPABASE_HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("SUPABASE_HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("SUPABASE_HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_TIMEOUT = httpx.Timeout(connect=5.0, read=30.0, write=30.0, pool=10.0)
+
+try:
+    import h2  # noqa: F401  (necessário para http2=True no httpx)
+    _HTTP2 = True
+except ModuleNotFoundError:
+    _HTTP2 = False
+
+# Tamanho da janela de paginação (.range). Deve ser <= max-rows do PostgREST
+# (1000 no Supabase por padrão), senão uma página "curta" encerra a leitura cedo.
+PAGE_SIZE = int(os.getenv("SUPABASE_PAGE_SIZE", "1000"))
+
+# Filtros .in_() grandes viram URLs enormes (proxies recusam). Quebramos a lista em
+# chunks de no máximo IN_CHUNK_MAX IDs, executados em paralelo (IN_CHUNK_WORKERS).
+IN_CHUNK_MAX = 150
+IN_CHUNK_MEDIO = 64
+IN_CHUNK_WORKERS = 4
+
+# Gravações em lote (bulk_upsert/bulk_insert): linhas por requisição
+UPSERT_CHUNK = int(os.getenv("SUPABASE_UPSERT_CHUNK", "500"))
+
+# Leituras independentes de início de página (carregar_em_paralelo)
+PLANNER_WORKERS = 6
+
+# Versões de cache por tabela. Com CACHE_VERSOES_TABELA definida, as versões também
+# são publicadas nessa tabela e lidas a cada CACHE_VERSOES_POLL s (várias réplicas).
+CACHE_VERSOES_TABELA = os.getenv("SUPABASE_CACHE_VERSOES_TABELA", "")
+CACHE_VERSOES_POLL = int(os.getenv("SUPABASE_CACHE_VERSOES_POLL", "15"))
+
+# Disjuntor por endpoint: abre após DISJUNTOR_FALHAS falhas de conexão seguidas
+# e rejeita chamadas por ~DISJUNTOR_ABERTO_S s; depois deixa passar uma sonda.
+DISJUNTOR_FALHAS = int(os.getenv("SUPABASE_DISJUNTOR_FALHAS", "5"))
+DISJUNTOR_ABERTO_S = float(os.getenv("SUPABASE_DISJUNTOR_ABERTO_S", "20"))
+# Orçamento de retry do processo: cada retry gasta 1 ficha, cada sucesso devolve
+# RETRY_RECARGA. Em pane, os retries de todas as sessões param juntos.
+RETRY_ORCAMENTO = float(os.getenv("SUPABASE_RETRY_ORCAMENTO", "10"))
+RETRY_RECARGA = float(os.getenv("SUPABASE_RETRY_RECARGA", "0.1"))
+RETRY_ESPERA_MAX = float(os.getenv("SUPABASE_RETRY_ESPERA_MAX", "2"))
+# Tempo máximo de uma página para esperar por retries (prazo_pagina)
+PRAZO_PAGINA_S = float(os.getenv("SUPABASE_PRAZO_PAGINA_S", "10"))
+# Último resultado bom por fetcher (depende_de), servido quando o Supabase cai
+FALLBACK_MAX = int(os.getenv("SUPABASE_FALLBACK_MAX", "32"))
+# Threads de revalidação em segundo plano dos fetchers @cache_swr
+SWR_WORKERS = int(os.getenv("SUPABASE_SWR_WORKERS", "2"))
+# Instrumentação: registros mantidos em memória e, opcionalmente, em JSONL
+METRICAS_MAX = int(os.getenv("SUPABASE_METRICAS_MAX", "5000"))
+METRICAS_JSONL = os.getenv("SUPABASE_METRICAS_JSONL", "")
+
+
+@st.cache_resource(show_spinner=False)
+def _get_shared_client() -> Client:
+    """
+    Client Supabase único do processo, com o httpx do PostgREST trocado por um
+    pool configurado (limites de keep-alive, HTTP/2, gzip e timeouts explícitos).
+
+    O app usa sempre a mesma chave (login próprio, sem Supabase Auth), então o
+    client não guarda estado de usuário e pode ser compartilhado entre sessões.
+    httpx.Client é thread-safe.
+    """
+    client = create_client(SUPABASE_URL, SUPABASE_KEY)
+
+    postgrest = client.postgrest
+    antigo = postgrest.session
+    postgrest.session = type(antigo)(
+        base_url=antigo.base_url,
+        headers={**antigo.headers, "Accept-Encoding": "gzip, deflate"},
+        timeout=HTTP_TIMEOUT,
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+        follow_redirects=True,
+        http2=_HTTP2,
+        event_hooks={"response": [_anotar_resposta]},
+    )
+    antigo.close()
+
+    logger.info(f"✅ Transporte Supabase do processo criado (http2={_HTTP2}, max_conn={HTTP_MAX_CONNECTIONS})")
+    return client
+
+
+_sessoes_ativas: "weakref.WeakSet[SupabaseSession]" = weakref.WeakSet()
+_sessoes_lock = threading.Lock()
+
+
+def _on_session_end(sessao_id: int) -> None:
+    logger.info(f"🔌 Sessão Supabase {sessao_id} encerrada ({len(_sessoes_ativas)} ativas)")
+
+
+class SupabaseSession:
+    """
+    Wrapper fino por sessão do Streamlit sobre o client compartilhado.
+
+    Não abre sockets próprios: table()/rpc()/from_() etc. são delegados ao client
+    do processo. Quando a sessão termina, o st.session_state é descartado, o
+    wrapper é coletado e o finalizador registra o encerramento.
+    """
+
+    def __init__(self, shared: Client):
+        self._shared = shared
+        self.criado_em = time.monotonic()
+        with _sessoes_lock:
+            _sessoes_ativas.add(self)
+        self._finalizer = weakref.finalize(self, _on_session_end, id(self))
+
+    def __getattr__(self, nome):
+        return getattr(self._shared, nome)
+
+    def table(self, nome: str):
+        _anotar_tabela(nome)
+        return _TabelaRastreada(self._shared.table(nome), nome)
+
+    from_ = table
+
+    def rpc(self, fn: str, params: dict | None = None):
+        _anotar_tabela(f"rpc:{fn}")
+        # Funções que gravam declaram suas tabelas com registrar_rpc()
+        for tabela in _tabelas_rpc.get(fn, ()):
+            _anotar_escrita(tabela)
+        return self._shared.rpc(fn, params or {})
+
+    def close(self) -> None:
+        """Solta a referência ao client compartilhado (o pool continua aberto)."""
+        with _sessoes_lock:
+            _sessoes_ativas.discard(self)
+        self._finalizer()
+
+
+class _TabelaRastreada:
+    """Builder de tabela que anota insert/update/upsert/delete para supabase_execute()."""
+
+    __slots__ = ("_builder", "_tabela")
+
+    def __init__(self, builder, tabela: str):
+        self._builder = builder
+        self._tabela = tabela
+
+    def __getattr__(self, nome):
+        if nome in _METODOS_ESCRITA:
+            _anotar_escrita(self._tabela)
+        return getattr(self._builder, nome)
+
+
+def sessoes_ativas() -> int:
+    """Quantidade de sessões com wrapper vivo neste processo."""
+    return len(_sessoes_ativas)
+
 
 def get_supabase_client() -> Client:
     """
-    Retorna um cliente Supabase por sessão do Streamlit (st.session_state).
-    Isso evita corrida entre usuários e problemas com pool/socket compartilhado.
+    Retorna o wrapper da sessão atual (st.session_state) sobre o client
+    compartilhado do processo. Todas as sessões usam o mesmo pool HTTP.
     """
     if not SUPABASE_URL or not SUPABASE_KEY:
         raise EnvironmentError("Variáveis SUPABASE_URL e SUPABASE_KEY não configuradas no .env")
 
+    sincronizar_versoes()
+
     client = st.session_state.get(_SESSION_KEY)
     if client is not None:
         return client
 
-    # Observação:
-    # O supabase-py cria internamente o client httpx.
-    # Não temos como injetar facilmente Limits/Timeout aqui sem mudar a lib,
-    # então mitigamos via isolamento por sessão + retry/backoff no execute.
-    client = create_client(SUPABASE_URL, SUPABASE_KEY)
+    client = SupabaseSession(_get_shared_client())
     st.session_state[_SESSION_KEY] = client
-    logger.info("✅ Cliente Supabase criado (por sessão)")
     return client
 
 
 def reset_supabase_client():
     """
-    Reseta SOMENTE o client da sessão atual (não global).
-    Útil se a sessão atual ficou com conexão ruim.
+    Descarta SOMENTE o wrapper da sessão atual (o pool do processo é mantido).
     """
-    if _SESSION_KEY in st.session_state:
-        del st.session_state[_SESSION_KEY]
+    client = st.session_state.pop(_SESSION_KEY, None)
+    if isinstance(client, SupabaseSession):
+        client.close()
     logger.info("🔄 Cliente Supabase resetado (sessão atual)")
 
 
+def reset_supabase_transport():
+    """
+    Recria o transporte HTTP do processo (todas as sessões).
+    Use apenas se o pool inteiro ficou inutilizável.
+    """
+    _get_shared_client.clear()
+    postgres_direto.fechar()
+    logger.info("🔄 Transporte Supabase do processo recriado")
+
+
 T = TypeVar("T")
 
 
-def supabase_execute(execute_fn: Callable[[], T], *, max_retries: int = 4) -> T:
+# ============================================================
+# 🛡️ Disjuntor, orçamento de retry e prazo da página
+# ============================================================
+_ERROS_TRANSITORIOS = (httpx.ReadError, httpx.ConnectError, httpx.ReadTimeout, httpx.ConnectTimeout, OSError)
+
+
+class SupabaseIndisponivel(RuntimeError):
+    """Chamada rejeitada sem ir à rede: o disjuntor do endpoint está aberto."""
+
+
+class _Disjuntor:
     """
-    Executa uma chamada .execute() (postgrest) com retry/backoff + jitter,
-    tratando ReadError/timeout/erros temporários.
+    Circuit breaker de um endpoint, compartilhado por todas as sessões do processo.
+
+    fechado     -> chamadas passam; DISJUNTOR_FALHAS falhas seguidas abrem.
+    aberto      -> chamadas falham na hora até o fim da janela (com jitter, para
+                   réplicas e processos não sondarem juntos).
+    meio-aberto -> uma única chamada de sonda passa; sucesso fecha, falha reabre.
     """
-    last_exc: Exception | None = None
+
+    FECHADO, ABERTO, MEIO_ABERTO = "fechado", "aberto", "meio-aberto"
+
+    def __init__(self, nome: str):
+        self.nome = nome
+        self.estado = self.FECHADO
+        self.falhas = 0
+        self.aberto_ate = 0.0
+        self._sonda = False
+        self._lock = threading.Lock()
+
+    def permitir(self) -> bool:
+        with self._lock:
+            if self.estado == self.FECHADO:
+                return True
+            if self.estado == self.ABERTO and time.monotonic() >= self.aberto_ate:
+                self.estado, self._sonda = self.MEIO_ABERTO, False
+            if self.estado == self.MEIO_ABERTO and not self._sonda:
+                self._sonda = True
+                return True
+            return False
+
+    def sucesso(self) -> None:
+        with self._lock:
+            if self.estado != self.FECHADO:
+                logger.info(f"✅ Disjuntor {self.nome} fechado")
+            self.estado, self.falhas, self._sonda = self.FECHADO, 0, False
+
+    def falha(self) -> None:
+        with self._lock:
+            self.falhas += 1
+            if self.estado == self.MEIO_ABERTO or self.falhas >= DISJUNTOR_FALHAS:
+                if self.estado != self.ABERTO:
+                    logger.warning(f"🔌 Disjuntor {self.nome} aberto após {self.falhas} falha(s)")
+                self.estado, self._sonda = self.ABERTO, False
+                self.aberto_ate = time.monotonic() + DISJUNTOR_ABERTO_S * random.uniform(0.8, 1.2)
+
+
+class _OrcamentoRetry:
+    """Balde de fichas do processo: retry só acontece se houver ficha."""
+
+    def __init__(self, maximo: float, recarga: float):
+        self.maximo = maximo
+        self.recarga = recarga
+        self.fichas = maximo
+        self._lock = threading.Lock()
+
+    def gastar(self) -> bool:
+        with self._lock:
+            if self.fichas < 1:
+                return False
+            self.fichas -= 1
+            return True
+
+    def devolver(self) -> None:
+        with self._lock:
+            self.fichas = min(self.maximo, self.fichas + self.recarga)
+
+
+_disjuntores: dict[str, _Disjuntor] = {}
+_disjuntores_lock = threading.Lock()
+_orcamento_retry = _OrcamentoRetry(RETRY_ORCAMENTO, RETRY_RECARGA)
+_prazo = threading.local()
+
+
+def _disjuntor(endpoint: str) -> _Disjuntor:
+    with _disjuntores_lock:
+        if endpoint not in _disjuntores:
+            _disjuntores[endpoint] = _Disjuntor(endpoint)
+        return _disjuntores[endpoint]
+
+
+def estado_disjuntores() -> dict[str, str]:
+    """Estado atual de cada disjuntor ({endpoint: "fechado" | "aberto" | "meio-aberto"})."""
+    with _disjuntores_lock:
+        return {nome: d.estado for nome, d in _disjuntores.items()}
+
+
+@contextmanager
+def prazo_pagina(segundos: float = PRAZO_PAGINA_S):
+    """
+    Limita o tempo que a página pode gastar esperando retries: dentro do bloco,
+    supabase_execute() não dorme além do prazo (desiste e propaga o erro).
+    Blocos aninhados ficam com o menor prazo.
+    """
+    anterior = getattr(_prazo, "ate", None)
+    ate = time.monotonic() + segundos
+    _prazo.ate = ate if anterior is None else min(anterior, ate)
+    try:
+        yield
+    finally:
+        _prazo.ate = anterior
+
+
+def _tempo_restante() -> float | None:
+    ate = getattr(_prazo, "ate", None)
+    return None if ate is None else ate - time.monotonic()
+
+
+# ============================================================
+# 📊 Instrumentação de consultas
+# ============================================================
+# Cada supabase_execute() gera um registro "consulta" e cada chamada de fetcher
+# @depende_de um registro "fetcher", com a página e o fetcher em andamento
+# (thread-local, repassado às threads de carregar_em_paralelo/fetch_in).
+_metricas: deque = deque(maxlen=METRICAS_MAX)
+_metricas_lock = threading.Lock()
+_contexto = threading.local()
+_medicao = threading.local()
+
+
+class _Medicao:
+    """Tabelas tocadas e respostas HTTP de uma execução (preenchido por hooks)."""
+
+    __slots__ = ("tabelas", "respostas")
+
+    def __init__(self):
+        self.tabelas: list[str] = []
+        self.respostas: list = []
+
+    def bytes(self) -> int:
+        return sum(getattr(r, "num_bytes_downloaded", 0) for r in self.respostas)
+
+
+def _anotar_tabela(nome: str) -> None:
+    atual = getattr(_medicao, "atual", None)
+    if atual is not None and nome not in atual.tabelas:
+        atual.tabelas.append(nome)
+
+
+def _anotar_resposta(resposta) -> None:
+    # Hook do httpx: roda na thread que fez a requisição
+    atual = getattr(_medicao, "atual", None)
+    if atual is not None:
+        atual.respostas.append(resposta)
+
+
+def _contexto_atual() -> dict:
+    return dict(_contexto.__dict__)
+
+
+@contextmanager
+def pagina_atual(nome: str):
+    """Marca as consultas feitas dentro do bloco com o nome da página."""
+    anterior = getattr(_contexto, "pagina", None)
+    _contexto.pagina = nome
+    try:
+        yield
+    finally:
+        _contexto.pagina = anterior
+
+
+def registrar_metrica(registro: dict) -> None:
+    """Guarda o registro no buffer circular (METRICAS_MAX) e, se configurado, no JSONL."""
+    registro.setdefault("ts", datetime.now(timezone.utc).isoformat(timespec="milliseconds"))
+    registro.setdefault("pagina", getattr(_contexto, "pagina", None))
+    with _metricas_lock:
+        _metricas.append(registro)
+        if METRICAS_JSONL:
+            try:
+                with open(METRICAS_JSONL, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(registro, ensure_ascii=False, default=str) + "\n")
+            except OSError as e:
+                logger.warning(f"⚠️ Falha ao gravar métricas em {METRICAS_JSONL}: {e}")
+
+
+def metricas(tipo: str | None = None) -> pd.DataFrame:
+    """Registros do buffer (mais antigos primeiro), opcionalmente só de um tipo."""
+    with _metricas_lock:
+        registros = list(_metricas)
+    if tipo:
+        registros = [r for r in registros if r.get("tipo") == tipo]
+    return pd.DataFrame(registros)
+
+
+def limpar_metricas() -> None:
+    with _metricas_lock:
+        _metricas.clear()
+
+
+def _registrar_consulta(inicio: float, medicao: _Medicao, resultado, tentativas: int, erro: Exception | None) -> None:
+    dados = getattr(resultado, "data", None)
+    contador = getattr(_contexto, "consultas", None)
+    if contador is not None:
+        contador[0] += 1
+    registrar_metrica({
+        "tipo": "consulta",
+        "fetcher": getattr(_contexto, "fetcher", None),
+        "tabela": ",".join(medicao.tabelas) or None,
+        "ms": round((time.perf_counter() - inicio) * 1000, 1),
+        "linhas": len(dados) if isinstance(dados, list) else (None if dados is None or isinstance(dados, str) else 1),
+        "bytes": medicao.bytes(),
+        "retries": tentativas - 1,
+        "erro": type(erro).__name__ if erro is not None else None,
+    })
+
+
+def supabase_execute(execute_fn: Callable[[], T], *, max_retries: int = 4, endpoint: str = "postgrest") -> T:
+    """
+    Executa uma chamada .execute() (postgrest) tratando ReadError/timeout/erros
+    temporários com retry e backoff exponencial com jitter total.
+
+    Retry só acontece com o disjuntor de `endpoint` fechado, com ficha no
+    orçamento de retry do processo e com tempo no prazo da página (prazo_pagina).
+    Disjuntor aberto levanta SupabaseIndisponivel sem ir à rede.
+
+    Se a chamada gravou (insert/update/upsert/delete) em alguma tabela, a versão
+    dessa tabela é incrementada e os caches registrados para ela são limpos.
+
+    Toda chamada gera um registro de métrica (tempo, tabela, linhas, bytes,
+    retries, página e fetcher); ver metricas().
+    """
+    inicio = time.perf_counter()
+    medicao, anterior = _Medicao(), getattr(_medicao, "atual", None)
+    _medicao.atual = medicao
+    tentativas = [0]
+    resultado, erro = None, None
+    try:
+        resultado = _executar_com_retry(execute_fn, max_retries, endpoint, tentativas)
+        return resultado
+    except Exception as e:
+        erro = e
+        raise
+    finally:
+        _medicao.atual = anterior
+        _registrar_consulta(inicio, medicao, resultado, max(tentativas[0], 1), erro)
+
+
+def _executar_com_retry(execute_fn: Callable[[], T], max_retries: int, endpoint: str, tentativas: list) -> T:
+    disjuntor = _disjuntor(endpoint)
 
     for attempt in range(1, max_retries + 1):
+        tentativas[0] = attempt
+        if not disjuntor.permitir():
+            raise SupabaseIndisponivel(f"Supabase indisponível ({endpoint}): aguardando nova tentativa")
+
         try:
-            return execute_fn()
-
-        except (httpx.ReadError, httpx.ConnectError, httpx.ReadTimeout, httpx.ConnectTimeout, OSError) as e:
-            last_exc = e
-
-            # Se não for a última tentativa, espera com backoff + jitter e tenta novamente
-            if attempt < max_retries:
-                # Backoff exponencial leve (0.3, 0.6, 1.2, 2.4...) + jitter
-                base = 0.3 * (2 ** (attempt - 1))
-                jitter = random.uniform(0, 0.2)
-                sleep_s = base + jitter
-                logger.warning(f"⚠️ Supabase temporariamente indisponível (tentativa {attempt}/{max_retries}): {e}. Sleep {sleep_s:.2f}s")
-                time.sleep(sleep_s)
-
-                # Importante: resetar apenas o client desta sessão pode ajudar
-                reset_supabase_client()
-                _ = get_supabase_client()
-                continue
-
-            # Última tentativa: propaga
+            resultado, gravadas = _executar_rastreando(execute_fn)
+
+        except _ERROS_TRANSITORIOS as e:
+            disjuntor.falha()
+            if attempt >= max_retries:
+                raise
+
+            # Jitter total (0..base): sessões que falharam juntas não voltam juntas
+            espera = random.uniform(0, min(RETRY_ESPERA_MAX, 0.3 * (2 ** attempt)))
+            restante = _tempo_restante()
+            if restante is not None and restante <= espera:
+                logger.warning(f"⚠️ Supabase indisponível e prazo da página esgotado: {e}")
+                raise
+            if not _orcamento_retry.gastar():
+                logger.warning(f"⚠️ Supabase indisponível e orçamento de retry esgotado: {e}")
+                raise
+
+            logger.warning(f"⚠️ Supabase temporariamente indisponível (tentativa {attempt}/{max_retries}): {e}. Sleep {espera:.2f}s")
+            # O pool do httpx descarta sozinho a conexão quebrada; não recriamos o client
+            time.sleep(espera)
+            continue
+
+        except Exception:
+            # O servidor respondeu (permissão, query inválida...): endpoint está de pé, sem retry
+            disjuntor.sucesso()
             raise
 
+        disjuntor.sucesso()
+        _orcamento_retry.devolver()
+
+        # Gravou em alguma tabela: nova versão + limpeza dos caches registrados
+        if gravadas:
+            invalidar_tabela(*sorted(gravadas))
+        return resultado
+
+    raise RuntimeError("Falha desconhecida ao executar chamada Supabase")
+
+
+# ============================================================
+# 🔄 Versões por tabela + invalidação de cache entre páginas
+# ============================================================
+# Cada fetcher cacheado declara de quais tabelas depende (@depende_de). Toda
+# gravação feita via supabase_execute() incrementa a versão da tabela e limpa
+# esses fetchers, em qualquer página. Assim os TTLs podem ser longos.
+_METODOS_ESCRITA = frozenset({"insert", "update", "upsert", "delete"})
+
+_escritas = threading.local()
+_versoes_lock = threading.Lock()
+_versoes: dict[str, int] = {}
+_versoes_remotas: dict[str, int] = {}
+_caches_por_tabela: dict[str, list] = {}
+_tabelas_rpc: dict[str, tuple[str, ...]] = {}
+
+
+def _anotar_escrita(tabela: str) -> None:
+    tabelas = getattr(_escritas, "tabelas", None)
+    if tabelas is not None:
+        tabelas.add(tabela)
+
+
+def _executar_rastreando(execute_fn: Callable[[], T]) -> tuple[T, set]:
+    """Executa execute_fn e devolve (resultado, tabelas gravadas durante a chamada)."""
+    anteriores = getattr(_escritas, "tabelas", None)
+    _escritas.tabelas = set()
+    try:
+        return execute_fn(), _escritas.tabelas
+    finally:
+        _escritas.tabelas = anteriores
+
+
+def registrar_cache(fn, *tabelas: str) -> None:
+    """Associa um fetcher cacheado (algo com .clear()) às tabelas que ele lê."""
+    with _versoes_lock:
+        for tabela in tabelas:
+            registrados = _caches_por_tabela.setdefault(tabela, [])
+            if fn not in registrados:
+                registrados.append(fn)
+
+
+def registrar_rpc(fn: str, *tabelas: str) -> None:
+    """
+    Declara as tabelas gravadas pela função Postgres `fn`: chamadas a
+    supabase.rpc(fn, ...) dentro de supabase_execute() invalidam essas tabelas
+    como um insert/update/delete comum.
+    """
+    with _versoes_lock:
+        _tabelas_rpc[fn] = tuple(tabelas)
+
+
+def depende_de(*tabelas: str):
+    """
+    Decorator para fetchers @st.cache_data/@st.cache_resource:
+
+        @depende_de("tab_app_agendamentos")
+        @st.cache_data(ttl=600, show_spinner=False)
+        def _fetch_agendamentos(_supabase): ...
+
+    Chamadas simultâneas com os mesmos argumentos viram uma só (single-flight) e o
+    último resultado bom fica guardado para quedas do Supabase (ver _envolver_fetcher).
+    """
+    def registrar(fn):
+        registrar_cache(fn, *tabelas)
+        if hasattr(fn, "tabelas"):
+            fn.tabelas = tabelas
+        return _envolver_fetcher(fn)
+    return registrar
+
+
+def _chave_args(assinatura, args, kwargs) -> str | None:
+    """Chave dos argumentos sem os "_param" (mesma regra de hash do st.cache_data)."""
+    try:
+        ligados = assinatura.bind(*args, **kwargs)
+        ligados.apply_defaults()
+        itens = [(k, v) for k, v in ligados.arguments.items() if not k.startswith("_")]
+        return hashlib.blake2b(pickle.dumps(itens), digest_size=16).hexdigest()
+    except Exception:
+        return None
+
+
+def _copia(valor):
+    """Cópia rasa de frames/dicts/listas (a página pode alterar o que recebe)."""
+    return valor.copy() if isinstance(valor, (pd.DataFrame, pd.Series, dict, list)) else valor
+
+
+class _Voo:
+    """Uma chamada em andamento de coalescer(): quem chega depois espera o evento."""
+
+    __slots__ = ("evento", "resultado", "erro")
+
+    def __init__(self):
+        self.evento = threading.Event()
+        self.resultado = None
+        self.erro: BaseException | None = None
+
+
+_voos: dict[tuple, _Voo] = {}
+_voos_lock = threading.Lock()
+
+
+def coalescer(chave: tuple, fn: Callable[[], T]) -> T:
+    """
+    Single-flight entre sessões: enquanto fn() de uma `chave` está em andamento,
+    outras chamadas com a mesma chave não executam nada; esperam a primeira e
+    recebem uma cópia do resultado (ou o mesmo erro).
+    """
+    with _voos_lock:
+        voo = _voos.get(chave)
+        lider = voo is None
+        if lider:
+            voo = _voos[chave] = _Voo()
+
+    if not lider:
+        _contexto.coalescida = True
+        voo.evento.wait()
+        if voo.erro is not None:
+            raise voo.erro
+        return _copia(voo.resultado)
+
+    try:
+        resultado = fn()
+        # Cópia para quem espera: o líder pode alterar o objeto que recebeu
+        voo.resultado = _copia(resultado)
+        return resultado
+    except BaseException as e:
+        voo.erro = e
+        raise
+    finally:
+        with _voos_lock:
+            _voos.pop(chave, None)
+        voo.evento.set()
+
+
+def _envolver_fetcher(fn):
+    """
+    Envolve o fetcher cacheado:
+      - misses simultâneos com os mesmos argumentos (ex.: várias sessões quando o
+        TTL vence) fazem uma única consulta via coalescer();
+      - cada resultado bom fica guardado (até FALLBACK_MAX combinações de
+        argumentos); se o Supabase estiver fora (disjuntor aberto ou erro de
+        conexão), devolve o último resultado desses argumentos, com aviso.
+        Sem resultado anterior, o erro é propagado.
+    """
+    try:
+        assinatura = inspect.signature(fn)
+    except (TypeError, ValueError):
+        return fn
+
+    ultimos: "OrderedDict[str, Any]" = OrderedDict()
+    lock = threading.Lock()
+
+    nome = getattr(fn, "__name__", str(fn))
+
+    def _chamar(args, kwargs):
+        """(resultado, origem); origem "fallback" quando veio do último resultado bom."""
+        chave = _chave_args(assinatura, args, kwargs)
+        try:
+            if chave is None:
+                resultado = fn(*args, **kwargs)
+            else:
+                resultado = coalescer((id(fn), chave), lambda: fn(*args, **kwargs))
+        except (SupabaseIndisponivel, *_ERROS_TRANSITORIOS) as e:
+            with lock:
+                if chave is None or chave not in ultimos:
+                    raise
+                resultado = _copia(ultimos[chave])
+            logger.warning(f"⚠️ {nome}: Supabase indisponível, usando último resultado ({e})")
+            try:
+                st.toast("⚠️ Supabase indisponível: exibindo os últimos dados carregados", icon="⚠️")
+            except Exception:
+                pass
+            return resultado, "fallback"
+
+        if chave is not None:
+            with lock:
+                ultimos[chave] = _copia(resultado)
+                ultimos.move_to_end(chave)
+                while len(ultimos) > FALLBACK_MAX:
+                    ultimos.popitem(last=False)
+        return resultado, None
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        anterior = (getattr(_contexto, "fetcher", None), getattr(_contexto, "consultas", None))
+        contador = [0]
+        _contexto.fetcher, _contexto.consultas, _contexto.coalescida = nome, contador, False
+        inicio, origem = time.perf_counter(), "erro"
+        try:
+            resultado, origem = _chamar(args, kwargs)
+            return resultado
+        finally:
+            if origem is None:
+                # hit: nenhuma consulta; coalescida: esperou a consulta de outra sessão
+                origem = "coalescida" if _contexto.coalescida else ("miss" if contador[0] else "hit")
+            _contexto.fetcher, _contexto.consultas = anterior
+            _contexto.coalescida = False
+            if anterior[1] is not None:
+                anterior[1][0] += contador[0]
+            registrar_metrica({
+                "tipo": "fetcher",
+                "fetcher": nome,
+                "ms": round((time.perf_counter() - inicio) * 1000, 1),
+                "consultas": contador[0],
+                "cache": origem,
+            })
+
+    wrapper.clear = fn.clear
+    return wrapper
+
+
+def versao_tabela(tabela: str) -> int:
+    """Versão atual da tabela (muda a cada gravação; útil como parte de chave de cache)."""
+    with _versoes_lock:
+        return _versoes.get(tabela, 0)
+
+
+def alterada_em(tabela: str) -> int:
+    """
+    Última gravação conhecida da tabela em ms desde a época (deste processo ou
+    publicada por outra réplica em CACHE_VERSOES_TABELA); 0 se nenhuma.
+    """
+    with _versoes_lock:
+        return max(_versoes.get(tabela, 0), _versoes_remotas.get(tabela, 0))
+
+
+def _limpar_caches(tabela: str) -> None:
+    with _versoes_lock:
+        registrados = list(_caches_por_tabela.get(tabela, ()))
+    for fn in registrados:
+        try:
+            fn.clear()
         except Exception as e:
-            # Para outros erros (ex: permissão, query inválida), não faz retry cego
-            raise
+            logger.warning(f"⚠️ Falha ao limpar cache de {tabela}: {e}")
+
+
+def invalidar_tabela(*tabelas: str) -> None:
+    """
+    Marca as tabelas como alteradas: versão nova (monotônica), limpeza dos caches
+    registrados, publicação para os outros workers do host (cache_disco) e, se
+    configurado, em CACHE_VERSOES_TABELA.
+    """
+    for tabela in tabelas:
+        with _versoes_lock:
+            # ms desde a época: comparável entre réplicas e sempre crescente aqui
+            versao = max(_versoes.get(tabela, 0) + 1, time.time_ns() // 1_000_000)
+            _versoes[tabela] = versao
+            # A própria gravação não deve voltar como "alterada em outro worker"
+            _versoes_remotas[tabela] = max(_versoes_remotas.get(tabela, 0), versao)
+        cache_disco.publicar_versao(tabela, versao)
+        _limpar_caches(tabela)
+        if CACHE_VERSOES_TABELA:
+            _publicar_versao(tabela, versao)
+
+
+def _publicar_versao(tabela: str, versao: int) -> None:
+    try:
+        supabase_execute(
+            lambda: _get_shared_client().table(CACHE_VERSOES_TABELA)
+            .upsert({"tabela": tabela, "versao": versao}, on_conflict="tabela")
+            .execute(),
+            max_retries=2,
+        )
+        with _versoes_lock:
+            _versoes_remotas[tabela] = versao
+        _fetch_versoes_remotas.clear()
+    except Exception as e:
+        logger.warning(f"⚠️ Falha ao publicar versão de {tabela}: {e}")
+
+
+@st.cache_data(ttl=CACHE_VERSOES_POLL, show_spinner=False)
+def _fetch_versoes_remotas() -> dict[str, int]:
+    resp = supabase_execute(
+        lambda: _get_shared_client().table(CACHE_VERSOES_TABELA).select("tabela, versao").execute()
+    )
+    return {r["tabela"]: int(r["versao"]) for r in (resp.data or [])}
+
+
+def sincronizar_versoes() -> None:
+    """
+    Aplica as gravações feitas por outros workers do host (versões no SQLite do
+    cache_disco, lidas a cada chamada) e por outras réplicas (via
+    CACHE_VERSOES_TABELA, lida no máximo uma vez a cada CACHE_VERSOES_POLL s):
+    tabela cuja versão publicada mudou tem os caches locais limpos.
+    """
+    remotas = cache_disco.versoes()
+    if CACHE_VERSOES_TABELA:
+        try:
+            for tabela, versao in _fetch_versoes_remotas().items():
+                remotas[tabela] = max(versao, remotas.get(tabela, 0))
+        except Exception as e:
+            logger.warning(f"⚠️ Falha ao ler versões de cache: {e}")
+    if not remotas:
+        return
+
+    alteradas = []
+    with _versoes_lock:
+        for tabela, versao in remotas.items():
+            vista = _versoes_remotas.get(tabela)
+            _versoes_remotas[tabela] = max(vista or 0, versao)
+            # Primeira leitura só define a base (caches do processo ainda são dessa época)
+            if vista is not None and versao > vista:
+                _versoes[tabela] = max(_versoes.get(tabela, 0) + 1, versao)
+                alteradas.append(tabela)
+    for tabela in alteradas:
+        logger.info(f"🔄 {tabela} alterada em outro worker/réplica: limpando caches")
+        _limpar_caches(tabela)
+
+
+
+# ============================================================
+# ♻️ Cache stale-while-revalidate
+# ============================================================
+_swr_pool = ThreadPoolExecutor(max_workers=SWR_WORKERS, thread_name_prefix="swr")
+
+
+class _EntradaSWR:
+    __slots__ = ("valor", "carregado_em", "atualizando", "falhou")
+
+    def __init__(self, valor):
+        self.valor = valor
+        self.carregado_em = time.monotonic()
+        self.atualizando = False
+        self.falhou = False
+
+
+def _avisar_desatualizado(nome: str, entrada: _EntradaSWR) -> None:
+    """Toast uma vez por sessão e fetcher enquanto a revalidação estiver falhando."""
+    try:
+        avisados = st.session_state.setdefault("_swr_avisados", set())
+        if not entrada.falhou:
+            avisados.discard(nome)
+            return
+        if nome in avisados:
+            return
+        avisados.add(nome)
+        carregado_em = entrada.carregado_em
+        minutos = int((time.monotonic() - carregado_em) // 60)
+        st.toast(f"⚠️ Sem conexão com o banco: exibindo dados de {minutos} min atrás", icon="⚠️")
+    except Exception:
+        pass
+
+
+def cache_swr(ttl: float, *, max_entradas: int = 128, disco: str | None = None):
+    """
+    Alternativa ao @st.cache_data para fetchers quentes (mesma regra de chave:
+    argumentos "_param" ficam de fora):
+
+        @depende_de("tab_app_log_etapas")
+        @cache_swr(ttl=600)
+        def _fetch_logs_etapas(_supabase, ag_ids: tuple): ...
+
+    Só a primeira chamada de uma chave espera a rede. Depois de `ttl` s, a
+    chamada devolve na hora o último valor bom e dispara a revalidação em
+    segundo plano (uma por chave). Se a revalidação falhar, o valor antigo
+    continua sendo servido (DataFrame com attrs["desatualizado"] = True e
+    toast na sessão) até uma revalidação dar certo. .clear() (invalidação
+    por gravação) descarta tudo: a próxima leitura vai ao banco.
+
+    Com `disco="nome"`, os DataFrames também vão para o cache em disco
+    (cache_disco), compartilhado pelos workers do host: num processo novo, a
+    primeira chamada de uma chave parte do valor gravado pelo processo anterior
+    (revalidado se tiver mais de `ttl` s), e cada busca/revalidação é feita
+    por um worker só; os outros usam o que ele gravou.
+    """
+    def decorador(fn):
+        assinatura = inspect.signature(fn)
+        entradas: "OrderedDict[str, _EntradaSWR]" = OrderedDict()
+        lock = threading.Lock()
+        geracao = [0]  # muda no clear(): revalidação antiga não regrava valor anterior à gravação
+
+        def _carregar(chave, args, kwargs, ger):
+            if disco:
+                valor, idade = _buscar_compartilhado(chave, args, kwargs)
+            else:
+                valor, idade = fn(*args, **kwargs), 0.0
+            with lock:
+                if geracao[0] != ger:
+                    return valor
+                entrada = entradas[chave] = _EntradaSWR(_copia(valor))
+                entrada.carregado_em -= idade
+                entradas.move_to_end(chave)
+                while len(entradas) > max_entradas:
+                    entradas.popitem(last=False)
+            return valor
+
+        def _buscar_compartilhado(chave, args, kwargs):
+            """
+            (valor, idade): se outro worker buscou esta chave há menos de `ttl` s,
+            usa o dele; senão um worker só busca e grava no disco para os demais.
+            """
+            nome = f"{disco}-{chave}"
+
+            def pronto():
+                salvo = cache_disco.carregar(nome, max_idade=ttl)
+                return None if salvo is None else (salvo[0], salvo[1]["idade_s"])
+
+            def buscar():
+                lido_em = time.time()
+                valor = fn(*args, **kwargs)
+                gravacao = cache_disco.salvar(nome, valor, tabelas=wrapper.tabelas, lido_em=lido_em)
+                if gravacao is not None:
+                    gravacao.result()
+                return valor, 0.0
+
+            return cache_disco.uma_vez(nome, pronto, buscar)
+
+        def _do_disco(chave, ger) -> _EntradaSWR | None:
+            salvo = cache_disco.carregar(f"{disco}-{chave}")
+            if salvo is None:
+                return None
+            entrada = _EntradaSWR(salvo[0])
+            entrada.carregado_em = time.monotonic() - salvo[1]["idade_s"]
+            with lock:
+                # clear() no meio da leitura: o arquivo pode ser anterior à gravação
+                if geracao[0] != ger:
+                    return None
+                return entradas.setdefault(chave, entrada)
+
+        def _revalidar(ctx, chave, args, kwargs, ger):
+            add_script_run_ctx(ctx=ctx)
+            _contexto.pagina, _contexto.fetcher, _contexto.consultas = "(segundo plano)", fn.__name__, None
+            try:
+                _carregar(chave, args, kwargs, ger)
+            except Exception as e:
+                logger.warning(f"⚠️ {fn.__name__}: revalidação falhou, mantendo último valor ({e})")
+                with lock:
+                    entrada = entradas.get(chave)
+                    if entrada is not None:
+                        entrada.falhou = True
+                        entrada.atualizando = False
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            chave = _chave_args(assinatura, args, kwargs)
+            if chave is None:
+                return fn(*args, **kwargs)
+
+            with lock:
+                ger = geracao[0]
+                entrada = entradas.get(chave)
+            if entrada is None and disco:
+                entrada = _do_disco(chave, ger)
+
+            disparar = False
+            with lock:
+                if entrada is not None:
+                    if chave in entradas:
+                        entradas.move_to_end(chave)
+                    if time.monotonic() - entrada.carregado_em >= ttl and not entrada.atualizando:
+                        entrada.atualizando = disparar = True
+
+            if entrada is None:
+                return _carregar(chave, args, kwargs, ger)
+            if disparar:
+                _swr_pool.submit(_revalidar, get_script_run_ctx(), chave, args, kwargs, ger)
+
+            valor = _copia(entrada.valor)
+            _avisar_desatualizado(fn.__name__, entrada)
+            if isinstance(valor, pd.DataFrame):
+                valor.attrs["desatualizado"] = entrada.falhou
+            return valor
+
+        def clear():
+            with lock:
+                entradas.clear()
+                geracao[0] += 1
+            if disco:
+                cache_disco.invalidar(f"{disco}-")
+
+        wrapper.clear = clear
+        # Preenchido por @depende_de: snapshots no disco são descartados quando elas mudam
+        wrapper.tabelas = ()
+        return wrapper
+    return decorador
+
+
+# ============================================================
+# 📄 Leitura paginada (evita corte silencioso no max-rows)
+# ============================================================
+def iter_pages(
+    build_query: Callable[[], Any],
+    *,
+    page_size: int = PAGE_SIZE,
+    limit: int | None = None,
+    formato: str = "json",
+    numericas: set[str] = frozenset(),
+) -> Iterator[list[dict] | pa.Table]:
+    """
+    Percorre uma consulta em janelas .range() e devolve cada página (lista de dicts).
+    Com formato="csv", cada página vem em text/csv e sai como pyarrow.Table (ver _ler_csv).
+
+    `build_query` deve retornar um builder NOVO a cada chamada, já com select/filtros
+    e um .order() estável (ex: por "id"), para que as janelas não se sobreponham:
+
+        iter_pages(lambda: supabase.table("x").select("*").order("id"))
+
+    `limit` (opcional) é o teto de linhas desejado pelo chamador.
+    """
+    start = 0
+    while True:
+        size = page_size if limit is None else min(page_size, limit - start)
+        if size <= 0:
+            return
+
+        end = start + size - 1
+        if formato == "csv":
+            resp = supabase_execute(lambda: build_query().range(start, end).csv().execute())
+            rows = _ler_csv(resp.data, numericas)
+        else:
+            resp = supabase_execute(lambda: build_query().range(start, end).execute())
+            rows = resp.data or []
+        if len(rows):
+            yield rows
+
+        # Página incompleta = fim da tabela
+        if len(rows) < size:
+            return
+        start += len(rows)
+
+
+def fetch_all(
+    build_query: Callable[[], Any],
+    *,
+    page_size: int = PAGE_SIZE,
+    limit: int | None = None,
+    esquema: str | None = None,
+    formato: str = "json",
+) -> pd.DataFrame:
+    """
+    Lê todas as páginas de `build_query` (ver iter_pages) e monta um único DataFrame
+    com colunas em minúsculas. Com `esquema` (nome da tabela em tipos.ESQUEMAS),
+    o frame já sai com os tipos compactos da tabela.
+
+    formato="csv" é para leituras grandes: as páginas vêm em text/csv e o pyarrow
+    monta as colunas sem passar por uma lista de dicts. Só as colunas numéricas
+    do `esquema` viram número; as demais chegam como texto, como no JSON. Com
+    o Postgres direto ativo (ver postgres_direto), a leitura em CSV sai de um
+    único COPY em vez das páginas do PostgREST.
+
+    Se `limit` foi atingido e ainda existiam linhas, o DataFrame sai com
+    df.attrs["truncated"] = True (use avisar_truncamento() para exibir na tela).
+    """
+    numericas = tipos.colunas_numericas(esquema) if esquema else frozenset()
+    direto = _ler_direto(build_query, numericas, limit) if formato == "csv" and postgres_direto.ativo() else None
+
+    if direto is not None:
+        paginas, truncated = direto
+    else:
+        paginas = list(iter_pages(build_query, page_size=page_size, limit=limit, formato=formato, numericas=numericas))
+        total = sum(len(p) for p in paginas)
+
+        truncated = False
+        if limit is not None and total >= limit:
+            # Sonda 1 linha além do limite para saber se o corte escondeu dados
+            resp = supabase_execute(lambda: build_query().range(limit, limit).execute())
+            truncated = bool(resp.data)
+    if truncated:
+        logger.warning(f"⚠️ Leitura truncada em {limit} linhas (existem mais registros)")
+
+    if formato == "csv":
+        df = _tabelas_para_pandas(paginas)
+    else:
+        df = pd.DataFrame([row for page in paginas for row in page])
+    if not df.empty:
+        df.columns = [c.lower() for c in df.columns]
+    if esquema:
+        df = tipos.tipar(df, esquema)
+    df.attrs["truncated"] = truncated
+    df.attrs["limit"] = limit
+    return df
+
+
+# O PostgREST monta o CSV com a saída de record do Postgres: NULL é campo vazio,
+# texto vazio é "", e aspas/barras invertidas vêm dobradas dentro de aspas.
+_CSV_PARSE = pa_csv.ParseOptions(newlines_in_values=True, escape_char="\\")
+# COPY ... (FORMAT csv): igual, mas só as aspas são dobradas
+_CSV_PARSE_COPY = pa_csv.ParseOptions(newlines_in_values=True)
+
+
+def _ler_csv(dados: str | bytes | None, numericas: set[str], parse: pa_csv.ParseOptions = _CSV_PARSE) -> pa.Table:
+    """
+    Uma página text/csv em pyarrow.Table. Colunas em `numericas` têm o tipo
+    inferido (int64/double); as demais são lidas como texto, para não virar
+    número um lote "0123" nem data um varchar que parece data.
+    """
+    if isinstance(dados, str):
+        dados = dados.encode("utf-8")
+    if not dados or not dados.strip():
+        return pa.table({})
+    fim = dados.find(b"\n")
+    colunas = (dados if fim < 0 else dados[:fim]).decode("utf-8").split(",")
+    return pa_csv.read_csv(
+        pa.py_buffer(dados),
+        parse_options=parse,
+        convert_options=pa_csv.ConvertOptions(
+            column_types={c: pa.string() for c in colunas if c.lower() not in numericas},
+            null_values=[""],
+            strings_can_be_null=True,
+            quoted_strings_can_be_null=False,
+        ),
+    )
+
+
+def _ler_direto(build_query: Callable[[], Any], numericas: set[str], limit: int | None) -> tuple[list[pa.Table], bool] | None:
+    """
+    fetch_all(formato="csv") por COPY no Postgres direto. None quando o builder
+    não tem tradução para SQL ou a conexão falhou: o chamador segue pelo PostgREST.
+    """
+    builder = build_query()
+    traduzida = postgres_direto.consulta(builder)
+    if traduzida is None:
+        return None
+    try:
+        with _medir_direto(builder.path.strip("/")) as medicao:
+            # 1 linha além do limite diz se o corte escondeu dados
+            dados = postgres_direto.copiar_csv(*traduzida, limite=None if limit is None else limit + 1)
+            medicao["bytes"] = len(dados)
+    except postgres_direto.psycopg.OperationalError as e:
+        logger.warning(f"⚠️ Postgres direto indisponível, seguindo pelo PostgREST: {e}")
+        return None
+
+    tabela = _ler_csv(dados, numericas, _CSV_PARSE_COPY)
+    truncated = limit is not None and tabela.num_rows > limit
+    if truncated:
+        tabela = tabela.slice(0, limit)
+    return ([tabela] if tabela.num_rows else []), truncated
+
 
-    # Não deve chegar aqui
-    raise last_exc if last_exc else RuntimeError("Falha desconhecida ao executar chamada Supabase")
+@contextmanager
+def _medir_direto(tabela: str):
+    """Registro "consulta" (como o de supabase_execute) para uma operação no Postgres direto."""
+    inicio = time.perf_counter()
+    medicao = {"bytes": None, "linhas": None}
+    erro = None
+    try:
+        yield medicao
+    except Exception as e:
+        erro = e
+        raise
+    finally:
+        contador = getattr(_contexto, "consultas", None)
+        if contador is not None:
+            contador[0] += 1
+        registrar_metrica({
+            "tipo": "consulta",
+            "fetcher": getattr(_contexto, "fetcher", None),
+            "tabela": tabela,
+            "ms": round((time.perf_counter() - inicio) * 1000, 1),
+            "linhas": medicao["linhas"],
+            "bytes": medicao["bytes"],
+            "retries": 0,
+            "erro": type(erro).__name__ if erro is not None else None,
+            "via": "postgres",
+        })
+
+
+def _tabelas_para_pandas(tabelas: list[pa.Table]) -> pd.DataFrame:
+    """Concatena as páginas e converte uma vez, liberando os buffers do Arrow durante a conversão."""
+    if not tabelas:
+        return pd.DataFrame()
+    try:
+        tabela = pa.concat_tables(tabelas, promote_options="permissive")
+    except TypeError:  # pyarrow < 14
+        tabela = pa.concat_tables(tabelas, promote=True)
+    tabelas.clear()
+    return tabela.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def avisar_truncamento(df: pd.DataFrame) -> None:
+    """Exibe aviso na página quando fetch_all() cortou o resultado pelo limite."""
+    if df.attrs.get("truncated"):
+        st.warning(
+            f"⚠️ Exibindo apenas os primeiros {df.attrs.get('limit')} registros. "
+            "Refine os filtros para ver o restante."
+        )
+
+
+# ============================================================
+# ⚡ Execução paralela (threads com contexto da sessão)
+# ============================================================
+def _executar_em_paralelo(fns: list[Callable[[], Any]], *, max_workers: int) -> list[tuple[Any, Exception | None]]:
+    """
+    Executa as funções em um pool limitado e devolve (resultado, erro) na mesma ordem.
+    As threads recebem o ScriptRunContext da sessão, então st.cache_data e
+    st.session_state funcionam normalmente dentro delas.
+    """
+    if len(fns) <= 1:
+        saidas = []
+        for fn in fns:
+            try:
+                saidas.append((fn(), None))
+            except Exception as e:
+                saidas.append((None, e))
+        return saidas
+
+    ctx = get_script_run_ctx()
+    prazo = getattr(_prazo, "ate", None)
+    contexto = _contexto_atual()
+
+    def _com_ctx(fn):
+        add_script_run_ctx(ctx=ctx)
+        _prazo.ate = prazo
+        _contexto.__dict__.update(contexto)
+        return fn()
+
+    saidas = []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(fns))) as pool:
+        futures = [pool.submit(_com_ctx, fn) for fn in fns]
+        for fut in futures:
+            try:
+                saidas.append((fut.result(), None))
+            except Exception as e:
+                saidas.append((None, e))
+    return saidas
+
+
+def carregar_em_paralelo(tarefas: dict[str, Callable[[], Any]], *, max_workers: int = PLANNER_WORKERS) -> dict[str, Any]:
+    """
+    Executa ao mesmo tempo as leituras independentes de início de página.
+
+        dados = carregar_em_paralelo({
+            "estudos": lambda: _fetch_estudos(supabase),
+            "kits": lambda: _fetch_kits_catalogo(supabase),
+        })
+
+    Cada tarefa normalmente é um fetcher @st.cache_data, então o cache continua
+    valendo (hit não faz requisição). A latência passa a ser a da tarefa mais
+    lenta, não a soma. Se alguma falhar, todas terminam e o primeiro erro é
+    propagado (com o nome da tarefa no log).
+    """
+    nomes = list(tarefas)
+    saidas = _executar_em_paralelo([tarefas[n] for n in nomes], max_workers=max_workers)
+
+    resultado, primeiro_erro = {}, None
+    for nome, (valor, erro) in zip(nomes, saidas):
+        if erro is not None:
+            logger.warning(f"⚠️ Falha ao carregar '{nome}': {erro}")
+            primeiro_erro = primeiro_erro or erro
+        resultado[nome] = valor
+
+    if primeiro_erro is not None:
+        raise primeiro_erro
+    return resultado
+
+
+# ============================================================
+# 🧩 Filtros .in_() em chunks paralelos
+# ============================================================
+class ChunkFetchError(RuntimeError):
+    """Falha em um ou mais chunks de fetch_in(). Guarda os erros por chunk e o resultado parcial."""
+
+    def __init__(self, tabela: str, erros: dict, parcial: pd.DataFrame):
+        self.tabela = tabela
+        self.erros = erros
+        self.parcial = parcial
+        detalhes = "; ".join(
+            f"chunk {i} ({len(chunk)} IDs, {chunk[0]}..{chunk[-1]}): {e}"
+            for i, (chunk, e) in erros.items()
+        )
+        super().__init__(f"Falha ao buscar {tabela} em {len(erros)} chunk(s): {detalhes}")
+
+
+def _fronteira_chunk(valor) -> bool:
+    """Fronteira determinística (depende só do valor), ~1 a cada IN_CHUNK_MEDIO IDs."""
+    h = (hash(valor) * 2654435761) & 0xFFFFFFFF  # hash multiplicativo (Knuth)
+    return h < (2 ** 32) // IN_CHUNK_MEDIO
+
+
+def _chunk_ids(ids) -> list[tuple]:
+    """
+    Ordena/deduplica os IDs e corta em chunks com fronteiras definidas pelo conteúdo.
+    Assim, conjuntos de IDs sobrepostos geram os mesmos chunks nas regiões em comum
+    e reaproveitam o cache de _fetch_in_chunk.
+    """
+    valores = sorted({v for v in ids if v is not None and not pd.isna(v)})
+    chunks, atual = [], []
+    for v in valores:
+        atual.append(v)
+        if _fronteira_chunk(v) or len(atual) >= IN_CHUNK_MAX:
+            chunks.append(tuple(atual))
+            atual = []
+    if atual:
+        chunks.append(tuple(atual))
+    return chunks
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _fetch_in_chunk(_supabase, tabela: str, colunas: str, coluna: str, chunk: tuple, ordem: str, formato: str = "json") -> pd.DataFrame:
+    return fetch_all(
+        lambda: _supabase.table(tabela)
+        .select(colunas)
+        .in_(coluna, list(chunk))
+        .order(coluna)
+        .order(ordem),
+        formato=formato,
+        esquema=tabela if formato == "csv" else None,
+    )
+
+
+def fetch_in(
+    supabase: Client,
+    tabela: str,
+    coluna: str,
+    ids,
+    colunas: str = "*",
+    *,
+    ordem: str = "id",
+    formato: str = "json",
+) -> pd.DataFrame:
+    """
+    Equivalente a select(colunas).in_(coluna, ids) para listas grandes de IDs.
+
+    Os IDs são divididos em chunks de tamanho seguro para URL, buscados em paralelo
+    (pool limitado a IN_CHUNK_WORKERS) e concatenados na ordem dos chunks.
+    Cada chunk é cacheado separadamente. Se algum chunk falhar, os demais ainda
+    são concluídos e é levantado ChunkFetchError com o erro de cada chunk.
+    formato="csv" lê cada chunk em CSV (ver fetch_all), com os números de
+    tipos.ESQUEMAS[tabela].
+    """
+    chunks = _chunk_ids(ids)
+    if not chunks:
+        return pd.DataFrame()
+
+    registrar_cache(_fetch_in_chunk, tabela)
+
+    saidas = _executar_em_paralelo(
+        [lambda chunk=chunk: _fetch_in_chunk(supabase, tabela, colunas, coluna, chunk, ordem, formato) for chunk in chunks],
+        max_workers=IN_CHUNK_WORKERS,
+    )
+
+    resultados: list[pd.DataFrame | None] = []
+    erros: dict[int, tuple] = {}
+    for i, (df_chunk, erro) in enumerate(saidas):
+        if erro is not None:
+            logger.warning(f"⚠️ Falha no chunk {i} de {tabela} ({len(chunks[i])} IDs): {erro}")
+            erros[i] = (chunks[i], erro)
+        resultados.append(df_chunk)
+
+    frames = [df for df in resultados if df is not None and not df.empty]
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+    if erros:
+        raise ChunkFetchError(tabela, erros, df)
+    return df
+
+
+def limpar_cache_in() -> None:
+    """Descarta o cache por chunk de fetch_in() (chamar após gravações)."""
+    _fetch_in_chunk.clear()
+
+
+# ============================================================
+# 💾 Gravação em lote (uma requisição por chunk, não por linha)
+# ============================================================
+def _lotes(rows: list[dict], chunk_size: int) -> Iterator[list[dict]]:
+    for i in range(0, len(rows), max(1, chunk_size)):
+        yield rows[i:i + chunk_size]
+
+
+def bulk_upsert(
+    supabase: Client,
+    tabela: str,
+    rows: list[dict],
+    *,
+    on_conflict: str,
+    chunk_size: int = UPSERT_CHUNK,
+) -> list[dict]:
+    """
+    INSERT ... ON CONFLICT (on_conflict) DO UPDATE para várias linhas de uma vez.
+
+    `on_conflict` lista as colunas da chave natural ("col1,col2") e precisa de uma
+    constraint UNIQUE equivalente no banco (ver supabase_schema.sql). Linhas
+    repetidas na chave ficam só com a última (o Postgres recusa atualizar a mesma
+    linha duas vezes no mesmo comando). Devolve as linhas gravadas.
+
+    Todas as linhas precisam ter o mesmo conjunto de colunas: o postgrest-py
+    manda a união das chaves em columns= e grava NULL onde a linha não tem a
+    coluna, o que apagaria valores existentes no update. Senão, ValueError.
+    """
+    colunas = {frozenset(r) for r in rows}
+    if len(colunas) > 1:
+        raise ValueError(
+            f"bulk_upsert em {tabela}: linhas com colunas diferentes ({len(colunas)} conjuntos); "
+            "separe as chamadas por conjunto de colunas"
+        )
+    chaves = [c.strip() for c in on_conflict.split(",") if c.strip()]
+    unicas = list({tuple(r.get(c) for c in chaves): r for r in rows}.values())
+
+    gravadas: list[dict] = []
+    for lote in _lotes(unicas, chunk_size):
+        resp = supabase_execute(
+            lambda lote=lote: supabase.table(tabela).upsert(lote, on_conflict=",".join(chaves)).execute()
+        )
+        gravadas.extend(resp.data or [])
+    return gravadas
+
+
+def bulk_insert(
+    supabase: Client,
+    tabela: str,
+    rows: list[dict],
+    *,
+    chunk_size: int = UPSERT_CHUNK,
+) -> list[dict]:
+    """
+    Insert de várias linhas em chunks de `chunk_size` (uma requisição por chunk).
+    Com o Postgres direto ativo e a partir de postgres_direto.COPY_MIN_LINHAS
+    linhas, vai num único COPY FROM STDIN; nesse caso não há linhas de volta.
+    """
+    if len(rows) >= postgres_direto.COPY_MIN_LINHAS and postgres_direto.ativo():
+        with _medir_direto(tabela) as medicao:
+            medicao["linhas"] = postgres_direto.carregar(tabela, rows)
+        invalidar_tabela(tabela)
+        return []
+
+    gravadas: list[dict] = []
+    for lote in _lotes(rows, chunk_size):
+        resp = supabase_execute(lambda lote=lote: supabase.table(tabela).insert(lote).execute())
+        gravadas.extend(resp.data or [])
+    return gravadas
+
+
+# ============================================================
+# 📝 Logs de agendamento (alterações de campo e eventos de etapa)
+# ============================================================
+TABLE_LOG_AGENDAMENTOS = "tab_app_log_agendamentos"
+TABLE_LOG_ETAPAS = "tab_app_log_etapas"
+
+
+def _texto_log(valor) -> str | None:
+    return str(valor) if valor is not None else None
+
+
+class LogAlteracoes:
+    """
+    Coletor dos logs de uma gravação: acumula alterações de campo e eventos de
+    etapa e grava tudo em um insert por tabela, não importa quantos campos mudaram.
+
+        logs = LogAlteracoes(supabase, usuario_id, usuario_nome)
+        logs.campos(agendamento_id, payload, valores_anteriores)
+        logs.etapa(agendamento_id, "status_medico", "Atendendo", timestamp)
+        logs.gravar()
+    """
+
+    def __init__(self, supabase: Client, usuario_id, usuario_nome: str):
+        self._supabase = supabase
+        self._usuario_id = usuario_id
+        self._usuario_nome = usuario_nome
+        self._alteracoes: list[dict] = []
+        self._etapas: list[dict] = []
+
+    def campo(self, agendamento_id: int, campo_alterado: str, valor_antigo, valor_novo) -> None:
+        self._alteracoes.append({
+            "agendamento_id": agendamento_id,
+            "data_alteracao": datetime.now(timezone.utc).isoformat(),
+            "usuario_alteracao_id": self._usuario_id,
+            "usuario_alteracao_nome": self._usuario_nome,
+            "campo_alterado": campo_alterado,
+            "valor_antigo": _texto_log(valor_antigo),
+            "valor_novo": _texto_log(valor_novo),
+        })
+
+    def campos(self, agendamento_id: int, novos: dict, anteriores: dict) -> None:
+        """Um log por campo de `novos`, com o valor antigo tirado de `anteriores`."""
+        for campo_alterado, valor_novo in novos.items():
+            self.campo(agendamento_id, campo_alterado, anteriores.get(campo_alterado), valor_novo)
+
+    def etapa(self, agendamento_id: int, nome_etapa: str, status_etapa: str, data_hora_etapa: str, *, automatico: bool = False) -> None:
+        """Evento em tab_app_log_etapas; `automatico` (preenchido pelo sistema) grava sem usuário."""
+        log = {
+            "agendamento_id": agendamento_id,
+            "nome_etapa": nome_etapa,
+            "status_etapa": status_etapa,
+            "data_hora_etapa": data_hora_etapa,
+        }
+        if not automatico:
+            log["usuario_id"] = self._usuario_id
+            log["usuario_nome"] = self._usuario_nome
+        self._etapas.append(log)
+
+    def __len__(self) -> int:
+        return len(self._alteracoes) + len(self._etapas)
+
+    def gravar(self) -> None:
+        """Um insert em lote por tabela com logs pendentes; esvazia o coletor."""
+        for tabela, logs in ((TABLE_LOG_AGENDAMENTOS, self._alteracoes), (TABLE_LOG_ETAPAS, self._etapas)):
+            if logs:
+                # Sem/com usuário na mesma requisição: colunas ausentes viram NULL
+                bulk_insert(self._supabase, tabela, logs)
+        self._alteracoes, self._etapas = [], []
 
 
 def registrar_log_agendamento(
@@ -107,18 +1531,10 @@ def registrar_log_agendamento(
     valor_antigo,
     valor_novo,
 ) -> None:
-    log = {
-        "agendamento_id": agendamento_id,
-        "data_alteracao": datetime.now(timezone.utc).isoformat(),
-        "usuario_alteracao_id": usuario_id,
-        "usuario_alteracao_nome": usuario_nome,
-        "campo_alterado": campo_alterado,
-        "valor_antigo": str(valor_antigo) if valor_antigo is not None else None,
-        "valor_novo": str(valor_novo) if valor_novo is not None else None,
-    }
-    supabase_execute(
-        lambda: supabase.table("tab_app_log_agendamentos").insert(log).execute()
-    )
+    """Log avulso de um campo (para vários campos, use LogAlteracoes)."""
+    logs = LogAlteracoes(supabase, usuario_id, usuario_nome)
+    logs.campo(agendamento_id, campo_alterado, valor_antigo, valor_novo)
+    logs.gravar()
 
 
 # ============================================================
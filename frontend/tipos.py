@@ -0,0 +1,155 @@
+# ============================================================
+# 🏷️ frontend/tipos.py
+# Tipos compactos por tabela, aplicados uma vez no fetch (fetch_all(esquema=)):
+# texto de baixa cardinalidade como category, IDs como Int32 e datas já
+# convertidas em "<coluna>_dt". Os caches guardam o frame tipado; as páginas
+# recebem o contrato de sempre via para_pagina(), com as colunas _dt prontas.
+# ============================================================
+from dataclasses import dataclass
+
+import pandas as pd
+
+
+@dataclass(frozen=True)
+class Esquema:
+    # Inteiros anuláveis (Int32): sem o float64 que o JSON gera quando há nulos
+    ids: tuple[str, ...] = ()
+    # Texto repetido (status, coordenação, médico...): category
+    categorias: tuple[str, ...] = ()
+    # Colunas de data em texto: ganham "<coluna>_dt" (datetime64; texto que não é
+    # data vira NaT). O texto fica, porque as páginas comparam e gravam a data como string.
+    datas: tuple[str, ...] = ()
+    # Demais colunas numéricas. Na leitura em CSV (fetch_all(formato="csv")) só
+    # ids e numeros viram número; o resto chega como texto, igual ao JSON.
+    numeros: tuple[str, ...] = ()
+
+
+_STATUS_ETAPAS = (
+    "status_medico", "status_enfermagem", "status_farmacia",
+    "status_espirometria", "status_nutricionista", "status_coordenacao",
+)
+
+ESQUEMAS: dict[str, Esquema] = {
+    "tab_app_agendamentos": Esquema(
+        ids=("id", "estudo_id"),
+        categorias=(
+            "tipo_visita", "visita", "medico_responsavel", "consultorio", "coordenacao",
+            "status_confirmacao", "desfecho_atendimento", "jejum", "reembolso",
+            "responsavel_agendamento_nome", *_STATUS_ETAPAS,
+        ),
+        datas=("data_visita",),
+    ),
+    # validade é varchar e nem sempre é data: validade_dt sai NaT nesses casos
+    "tab_app_farmacia_movimentacoes": Esquema(
+        categorias=("tipo_transacao", "tipo_produto", "localizacao", "responsavel"),
+        datas=("data", "validade"),
+        numeros=("id", "estudo_id", "produto_id", "quantidade"),
+    ),
+    "tab_app_log_etapas": Esquema(
+        numeros=("id", "agendamento_id"),
+    ),
+}
+
+
+def coluna_dt(coluna: str) -> str:
+    return f"{coluna}_dt"
+
+
+def _para_data(valores: pd.Series) -> pd.Series:
+    """ISO "AAAA-MM-DD" pelo caminho rápido; o que sobrar (outro formato, com hora) como em pd.to_datetime(errors="coerce")."""
+    dt = pd.to_datetime(valores, format="%Y-%m-%d", errors="coerce")
+    resto = dt.isna() & valores.notna()
+    if resto.any():
+        outros = pd.to_datetime(valores[resto], errors="coerce", format="mixed", utc=True).dt.tz_convert(None)
+        dt = dt.astype(outros.dtype)
+        dt[resto] = outros
+    return dt
+
+
+def tipar(df: pd.DataFrame, tabela: str) -> pd.DataFrame:
+    """
+    Aplica ESQUEMAS[tabela] (colunas ausentes são ignoradas). Idempotente: frame
+    já tipado volta como está, e colunas _dt já presentes só são calculadas
+    para as linhas que faltam.
+    """
+    esquema = ESQUEMAS.get(tabela)
+    if esquema is None or df.empty:
+        return df
+
+    novas = {}
+    for col in esquema.ids:
+        if col in df.columns and df[col].dtype != "Int32":
+            novas[col] = pd.to_numeric(df[col], errors="coerce").astype("Int32")
+    for col in esquema.categorias:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            novas[col] = df[col].astype("category")
+    for col in esquema.datas:
+        if col not in df.columns:
+            continue
+        dt = coluna_dt(col)
+        if dt not in df.columns:
+            novas[dt] = _para_data(df[col])
+            continue
+        faltando = df[dt].isna() & df[col].notna()
+        if faltando.any():
+            serie = df[dt].copy()
+            serie[faltando] = _para_data(df.loc[faltando, col])
+            novas[dt] = serie
+    return df.assign(**novas) if novas else df
+
+
+def concatenar(frames: list[pd.DataFrame], tabela: str) -> pd.DataFrame:
+    """
+    pd.concat de frames tipados que preserva as colunas category (une as
+    categorias de cada frame; o concat puro cairia para object).
+    """
+    frames = [tipar(f, tabela) for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame()
+    esquema = ESQUEMAS.get(tabela)
+    for col in esquema.categorias if esquema else ():
+        if not all(col in f.columns for f in frames):
+            continue
+        uniao = frames[0][col].cat.categories
+        for f in frames[1:]:
+            uniao = uniao.union(f[col].cat.categories)
+        frames = [f.assign(**{col: f[col].cat.set_categories(uniao)}) for f in frames]
+    return pd.concat(frames, ignore_index=True)
+
+
+def colunas_dt(tabela: str, colunas) -> list[str]:
+    """Colunas _dt correspondentes às colunas de data de `tabela` presentes em `colunas`."""
+    esquema = ESQUEMAS.get(tabela)
+    if esquema is None:
+        return []
+    return [coluna_dt(c) for c in esquema.datas if c in colunas]
+
+
+def colunas_numericas(tabela: str) -> set[str]:
+    """Colunas que a leitura em CSV de `tabela` converte para número (ids + numeros)."""
+    esquema = ESQUEMAS.get(tabela)
+    return set(esquema.ids + esquema.numeros) if esquema else set()
+
+
+def para_pagina(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Contrato das páginas (o mesmo de pd.DataFrame(resp.data)): category volta a
+    object com None nos vazios (aceita fillna/atribuição de valores novos) e
+    Int32 volta a int64, ou float64 se houver nulos. Colunas _dt ficam.
+    """
+    convertidas = {}
+    for col in df.columns:
+        s = df[col]
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            convertidas[col] = s.astype(object).where(s.notna(), None)
+        elif s.dtype == "Int32":
+            convertidas[col] = s.astype("float64") if s.isna().any() else s.astype("int64")
+    return df.assign(**convertidas) if convertidas else df
+
+
+def data(df: pd.DataFrame, coluna: str) -> pd.Series:
+    """`<coluna>_dt` já convertida no fetch, ou a conversão de sempre se o frame não veio tipado."""
+    dt = coluna_dt(coluna)
+    if dt in df.columns:
+        return df[dt]
+    return pd.to_datetime(df.get(coluna), errors="coerce")
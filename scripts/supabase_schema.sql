@@ -186,6 +186,312 @@ CREATE TABLE tab_app_estudos (
 CREATE INDEX idx_estudos_ativo ON tab_app_estudos(sn_ativo);
 CREATE INDEX idx_variaveis_uso ON tab_app_variaveis(uso);
 
+-- ============================================================
+-- 🔄 Versões de cache por tabela (opcional)
+-- Usada quando SUPABASE_CACHE_VERSOES_TABELA=tab_app_cache_versoes:
+-- cada réplica do app publica aqui a versão da tabela que gravou.
+-- ============================================================
+CREATE TABLE IF NOT EXISTS tab_app_cache_versoes (
+  tabela VARCHAR(255) PRIMARY KEY,
+  versao BIGINT NOT NULL,
+  dt_atualizacao TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- ============================================================
+-- 🗂️ tab_app_agendamentos: carimbo de alteração
+-- Permite ao AgendaStore (frontend/agenda_store.py) buscar só as linhas
+-- alteradas desde a última sincronização.
+-- ============================================================
+ALTER TABLE tab_app_agendamentos
+  ADD COLUMN IF NOT EXISTS dt_atualizacao TIMESTAMP WITH TIME ZONE DEFAULT NOW();
+
+CREATE INDEX IF NOT EXISTS idx_agendamentos_dt_atualizacao ON tab_app_agendamentos(dt_atualizacao);
+
+CREATE OR REPLACE FUNCTION fn_set_dt_atualizacao() RETURNS TRIGGER AS $$
+BEGIN
+  NEW.dt_atualizacao := NOW();
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_agendamentos_dt_atualizacao ON tab_app_agendamentos;
+CREATE TRIGGER trg_agendamentos_dt_atualizacao
+  BEFORE UPDATE ON tab_app_agendamentos
+  FOR EACH ROW EXECUTE FUNCTION fn_set_dt_atualizacao();
+
+-- ============================================================
+-- 🔹 TABELA: farmacia_saldos
+-- Saldo por (estudo, produto, lote, validade), mantido por trigger na mesma
+-- transação de cada insert/update/delete em tab_app_farmacia_movimentacoes.
+-- Lida por frontend/farmacia_saldos.py (lote vazio = '').
+-- ============================================================
+CREATE TABLE IF NOT EXISTS tab_app_farmacia_saldos (
+  estudo_id BIGINT,
+  produto_id BIGINT,
+  lote VARCHAR(255) NOT NULL DEFAULT '',
+  validade DATE,
+  entradas NUMERIC NOT NULL DEFAULT 0,
+  saidas NUMERIC NOT NULL DEFAULT 0,
+  saldo NUMERIC GENERATED ALWAYS AS (entradas - saidas) STORED,
+  qtd_movimentos INTEGER NOT NULL DEFAULT 0,
+  dt_atualizacao TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+  CONSTRAINT uq_farmacia_saldos_chave UNIQUE NULLS NOT DISTINCT (estudo_id, produto_id, lote, validade)
+);
+
+CREATE INDEX IF NOT EXISTS idx_farmacia_saldos_produto ON tab_app_farmacia_saldos(produto_id);
+
+-- Soma (p_sinal = 1) ou estorna (p_sinal = -1) um movimento no saldo da sua chave
+CREATE OR REPLACE FUNCTION fn_farmacia_saldo_aplicar(
+  p_estudo_id BIGINT,
+  p_produto_id BIGINT,
+  p_lote TEXT,
+  p_validade DATE,
+  p_tipo_transacao TEXT,
+  p_quantidade NUMERIC,
+  p_sinal INTEGER
+) RETURNS VOID AS $$
+DECLARE
+  v_lote TEXT := COALESCE(p_lote, '');
+  v_entradas NUMERIC := CASE WHEN p_tipo_transacao = 'Entrada' THEN COALESCE(p_quantidade, 0) * p_sinal ELSE 0 END;
+  v_saidas NUMERIC := CASE WHEN p_tipo_transacao = 'Saída' THEN COALESCE(p_quantidade, 0) * p_sinal ELSE 0 END;
+BEGIN
+  INSERT INTO tab_app_farmacia_saldos AS s (estudo_id, produto_id, lote, validade, entradas, saidas, qtd_movimentos)
+  VALUES (p_estudo_id, p_produto_id, v_lote, p_validade, v_entradas, v_saidas, p_sinal)
+  ON CONFLICT ON CONSTRAINT uq_farmacia_saldos_chave DO UPDATE SET
+    entradas = s.entradas + EXCLUDED.entradas,
+    saidas = s.saidas + EXCLUDED.saidas,
+    qtd_movimentos = s.qtd_movimentos + EXCLUDED.qtd_movimentos,
+    dt_atualizacao = NOW();
+
+  -- Chave sem nenhum movimento restante some (igual ao agrupamento antigo)
+  DELETE FROM tab_app_farmacia_saldos
+  WHERE qtd_movimentos <= 0
+    AND estudo_id IS NOT DISTINCT FROM p_estudo_id
+    AND produto_id IS NOT DISTINCT FROM p_produto_id
+    AND lote = v_lote
+    AND validade IS NOT DISTINCT FROM p_validade;
+END;
+$$ LANGUAGE plpgsql;
+
+-- validade das movimentações é varchar e nem sempre é data: texto inválido vira
+-- NULL (mesmo balde de "sem validade", como o pd.to_datetime(errors="coerce") das páginas)
+CREATE OR REPLACE FUNCTION fn_try_date(p_texto TEXT) RETURNS DATE AS $$
+BEGIN
+  RETURN NULLIF(BTRIM(p_texto), '')::DATE;
+EXCEPTION WHEN others THEN
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+CREATE OR REPLACE FUNCTION fn_farmacia_saldos_trigger() RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    PERFORM fn_farmacia_saldo_aplicar(
+      OLD.estudo_id, OLD.produto_id, OLD.lote::TEXT, fn_try_date(OLD.validade::TEXT), OLD.tipo_transacao, OLD.quantidade, -1
+    );
+  END IF;
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    PERFORM fn_farmacia_saldo_aplicar(
+      NEW.estudo_id, NEW.produto_id, NEW.lote::TEXT, fn_try_date(NEW.validade::TEXT), NEW.tipo_transacao, NEW.quantidade, 1
+    );
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_farmacia_saldos ON tab_app_farmacia_movimentacoes;
+CREATE TRIGGER trg_farmacia_saldos
+  AFTER INSERT OR UPDATE OR DELETE ON tab_app_farmacia_movimentacoes
+  FOR EACH ROW EXECUTE FUNCTION fn_farmacia_saldos_trigger();
+
+-- Reconstrói os saldos a partir do histórico (carga inicial / correção manual)
+CREATE OR REPLACE FUNCTION fn_farmacia_saldos_recalcular() RETURNS VOID AS $$
+BEGIN
+  LOCK TABLE tab_app_farmacia_movimentacoes IN SHARE MODE;
+  DELETE FROM tab_app_farmacia_saldos;
+  INSERT INTO tab_app_farmacia_saldos (estudo_id, produto_id, lote, validade, entradas, saidas, qtd_movimentos)
+  SELECT
+    estudo_id,
+    produto_id,
+    COALESCE(lote::TEXT, ''),
+    fn_try_date(validade::TEXT),
+    COALESCE(SUM(quantidade) FILTER (WHERE tipo_transacao = 'Entrada'), 0),
+    COALESCE(SUM(quantidade) FILTER (WHERE tipo_transacao = 'Saída'), 0),
+    COUNT(*)
+  FROM tab_app_farmacia_movimentacoes
+  GROUP BY 1, 2, 3, 4;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT fn_farmacia_saldos_recalcular();
+
+-- ============================================================
+-- 💾 Chaves naturais para gravação em lote (bulk_upsert)
+-- As matrizes gravam com INSERT ... ON CONFLICT (chave) DO UPDATE, que exige
+-- uma constraint UNIQUE com exatamente as colunas do on_conflict usado no app.
+-- Antes de criar cada uma: normaliza vazios e remove duplicatas (fica o maior id).
+-- ============================================================
+
+-- Modelo de Kits: (data_visita, id_estudo, kit_type, validade, lote)
+UPDATE tab_app_modelo_kits SET lote = NULL WHERE lote = '';
+
+DELETE FROM tab_app_modelo_kits a
+USING tab_app_modelo_kits b
+WHERE a.id < b.id
+  AND a.data_visita = b.data_visita
+  AND a.id_estudo = b.id_estudo
+  AND a.kit_type IS NOT DISTINCT FROM b.kit_type
+  AND a.validade IS NOT DISTINCT FROM b.validade
+  AND a.lote IS NOT DISTINCT FROM b.lote;
+
+ALTER TABLE tab_app_modelo_kits DROP CONSTRAINT IF EXISTS uq_modelo_kits_chave;
+ALTER TABLE tab_app_modelo_kits
+  ADD CONSTRAINT uq_modelo_kits_chave UNIQUE NULLS NOT DISTINCT (data_visita, id_estudo, kit_type, validade, lote);
+
+-- Modelo de AWB: (data_visita, id_estudo, laboratorio, courier, temperatura)
+UPDATE tab_app_modelo_awb SET laboratorio = NULLIF(laboratorio, ''), courier = NULLIF(courier, ''), temperatura = NULLIF(temperatura, '')
+WHERE laboratorio = '' OR courier = '' OR temperatura = '';
+
+DELETE FROM tab_app_modelo_awb a
+USING tab_app_modelo_awb b
+WHERE a.id < b.id
+  AND a.data_visita = b.data_visita
+  AND a.id_estudo = b.id_estudo
+  AND a.laboratorio IS NOT DISTINCT FROM b.laboratorio
+  AND a.courier IS NOT DISTINCT FROM b.courier
+  AND a.temperatura IS NOT DISTINCT FROM b.temperatura;
+
+ALTER TABLE tab_app_modelo_awb DROP CONSTRAINT IF EXISTS uq_modelo_awb_chave;
+ALTER TABLE tab_app_modelo_awb
+  ADD CONSTRAINT uq_modelo_awb_chave UNIQUE NULLS NOT DISTINCT (data_visita, id_estudo, laboratorio, courier, temperatura);
+
+-- Dados - Agenda: um registro por agendamento
+DELETE FROM tab_app_dados_agenda a
+USING tab_app_dados_agenda b
+WHERE a.id < b.id
+  AND a.id_agenda = b.id_agenda;
+
+ALTER TABLE tab_app_dados_agenda DROP CONSTRAINT IF EXISTS uq_dados_agenda_id_agenda;
+ALTER TABLE tab_app_dados_agenda
+  ADD CONSTRAINT uq_dados_agenda_id_agenda UNIQUE (id_agenda);
+
+-- Relação Visita x Kit grava pela chave primária (id): não precisa de constraint nova
+
+-- ============================================================
+-- 🔁 Fluxos atômicos (chamados via supabase.rpc)
+-- Cada função roda numa transação: uma requisição por clique e nada fica
+-- gravado pela metade. Wrappers tipados em backend/api/workflows.py.
+-- ============================================================
+
+-- Modelo de Kits: upsert da matriz + movimentações da farmácia
+CREATE OR REPLACE FUNCTION fn_app_gravar_dispensacao(p_linhas JSONB, p_movimentos JSONB DEFAULT '[]')
+RETURNS INTEGER AS $$
+DECLARE
+  v_qtd INTEGER;
+BEGIN
+  INSERT INTO tab_app_modelo_kits AS m (
+    data_visita, id_estudo, kit_type, validade, lote,
+    quantidade_visitas, dispensado, desfecho, responsavel, dt_atualizacao
+  )
+  SELECT
+    data_visita, id_estudo, kit_type, validade, NULLIF(lote, ''),
+    quantidade_visitas, dispensado, desfecho, responsavel, NOW()
+  FROM jsonb_populate_recordset(NULL::tab_app_modelo_kits, p_linhas)
+  ON CONFLICT ON CONSTRAINT uq_modelo_kits_chave DO UPDATE SET
+    quantidade_visitas = EXCLUDED.quantidade_visitas,
+    dispensado = EXCLUDED.dispensado,
+    desfecho = EXCLUDED.desfecho,
+    responsavel = EXCLUDED.responsavel,
+    dt_atualizacao = EXCLUDED.dt_atualizacao;
+  GET DIAGNOSTICS v_qtd = ROW_COUNT;
+
+  -- O trigger trg_farmacia_saldos atualiza os saldos na mesma transação
+  INSERT INTO tab_app_farmacia_movimentacoes (
+    data, tipo_transacao, estudo_id, produto_id, tipo_produto, quantidade, validade,
+    lote, nota, tipo_acao, consideracoes, responsavel, localizacao
+  )
+  SELECT
+    data, tipo_transacao, estudo_id, produto_id, tipo_produto, quantidade, validade,
+    lote, nota, tipo_acao, consideracoes, responsavel, localizacao
+  FROM jsonb_populate_recordset(NULL::tab_app_farmacia_movimentacoes, COALESCE(p_movimentos, '[]'));
+
+  RETURN v_qtd;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Confirmação de Agendamentos: status + log; com p_nova_data, reagenda
+-- (cópia do agendamento na nova data/horário, sem status) e loga na cópia
+CREATE OR REPLACE FUNCTION fn_app_confirmar_agendamento(
+  p_agendamento_id BIGINT,
+  p_status TEXT,
+  p_usuario_id BIGINT,
+  p_usuario_nome TEXT,
+  p_nova_data DATE DEFAULT NULL,
+  p_novo_horario TEXT DEFAULT NULL
+) RETURNS BIGINT AS $$
+DECLARE
+  v_original tab_app_agendamentos%ROWTYPE;
+  v_colunas TEXT;
+  v_novo_id BIGINT;
+BEGIN
+  SELECT * INTO v_original FROM tab_app_agendamentos WHERE id = p_agendamento_id FOR UPDATE;
+  IF NOT FOUND THEN
+    RAISE EXCEPTION 'Agendamento % não encontrado', p_agendamento_id;
+  END IF;
+
+  UPDATE tab_app_agendamentos SET status_confirmacao = p_status WHERE id = p_agendamento_id;
+
+  INSERT INTO tab_app_log_agendamentos (
+    agendamento_id, data_alteracao, usuario_alteracao_id, usuario_alteracao_nome,
+    campo_alterado, valor_antigo, valor_novo
+  ) VALUES (
+    p_agendamento_id, NOW(), p_usuario_id, p_usuario_nome,
+    'status_confirmacao', v_original.status_confirmacao::TEXT, p_status
+  );
+
+  IF p_nova_data IS NULL THEN
+    RETURN NULL;
+  END IF;
+
+  -- Copia todas as colunas, menos as preenchidas pelo banco
+  SELECT string_agg(quote_ident(attname), ', ' ORDER BY attnum) INTO v_colunas
+  FROM pg_attribute
+  WHERE attrelid = 'tab_app_agendamentos'::regclass
+    AND attnum > 0 AND NOT attisdropped AND attgenerated = ''
+    AND attname NOT IN ('id', 'data_cadastro', 'dt_atualizacao');
+
+  EXECUTE format(
+    'INSERT INTO tab_app_agendamentos (%1$s) SELECT %1$s FROM jsonb_populate_record(NULL::tab_app_agendamentos, $1) RETURNING id',
+    v_colunas
+  )
+  INTO v_novo_id
+  USING to_jsonb(v_original) || jsonb_build_object(
+    'data_visita', p_nova_data,
+    'hora_consulta', p_novo_horario,
+    'status_confirmacao', NULL
+  );
+
+  INSERT INTO tab_app_log_agendamentos (
+    agendamento_id, data_alteracao, usuario_alteracao_id, usuario_alteracao_nome,
+    campo_alterado, valor_antigo, valor_novo
+  ) VALUES (
+    v_novo_id, NOW(), p_usuario_id, p_usuario_nome,
+    'reagendamento', COALESCE(v_original.data_visita::TEXT, ''), p_nova_data::TEXT
+  );
+
+  RETURN v_novo_id;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Edição de Agendamentos: exclusão com os logs dependentes
+CREATE OR REPLACE FUNCTION fn_app_excluir_agendamento(p_agendamento_id BIGINT) RETURNS VOID AS $$
+BEGIN
+  DELETE FROM tab_app_log_etapas WHERE agendamento_id = p_agendamento_id;
+  DELETE FROM tab_app_log_agendamentos WHERE agendamento_id = p_agendamento_id;
+  DELETE FROM tab_app_agendamentos WHERE id = p_agendamento_id;
+END;
+$$ LANGUAGE plpgsql;
+
 
 -- ============================================================
 -- 📋 DADOS INICIAIS (opcional - para testes)
@@ -218,7 +524,9 @@ INSERT INTO tab_app_variaveis (grupo_destino, uso, valor) VALUES
 ('Campos Estudo', 'coordenacao', 'Coordenacao 1\nCoordenacao 2\nCoordenacao 3'),
 ('Campos Estudo', 'patrocinador', 'N/A'),
 ('Campos Estudo', 'entrada_dados_modelo', 'Corridos\nÚteis'),
-('Campos Estudo', 'resolucao_modelo', 'Corridos\nÚteis')
+('Campos Estudo', 'resolucao_modelo', 'Corridos\nÚteis'),
+-- Feriados (prazos em dias úteis do Dados - Agenda): DD/MM fixo, DD/MM/AAAA avulso, pascoa±N móvel
+('Campos Agenda', 'feriados', '01/01;25/01;pascoa-48;pascoa-47;pascoa-2;21/04;01/05;pascoa+60;09/07;07/09;12/10;02/11;15/11;20/11;25/12')
 ON CONFLICT (uso) DO NOTHING;
 
 -- ============================================================